@@ -27,10 +27,13 @@ import os
 import asyncio
 
 from message_with_channel_id import message_with_channel_id
-from database import init_database, initialize_all_members, get_user
+from database import init_database, initialize_all_members, get_user, close_database
 from voice_monitor import setup_voice_monitor
-from nickname_manager import initial_nickname_update, update_user_nickname, setup_nickname_update_event, setup_nickname_refresh
-from role_manager import initial_tier_role_update, update_tier_role
+from exp_ignore_manager import load_ignore_list
+from warning_system import load_warning_cache, setup_warning_expiry
+from market_manager import load_market_catalog, resolve_legacy_buyers
+from nickname_manager import initial_nickname_update, reconcile_member, setup_nickname_update_event, setup_nickname_refresh
+from role_manager import initial_tier_role_update, setup_role_index_events
 from level_system import set_level
 from commands.slash_commands import setup_slash_commands
 
@@ -51,7 +54,25 @@ load_dotenv()
 
 TOKEN = os.getenv("DISCORD_TOKEN")
 intents = discord.Intents.all()
-k = commands.Bot(command_prefix='!', intents=intents)
+
+
+class KBot(commands.Bot):
+    async def close(self):
+        """봇 종료 시 버퍼에 남은 EXP 반영 후 DB 연결 풀 정리"""
+        voice_monitor = getattr(self, 'voice_monitor', None)
+        if voice_monitor is not None:
+            try:
+                await voice_monitor.shutdown()
+            except Exception as e:
+                print(f"[VoiceMonitor] 종료 처리 오류: {e}")
+        try:
+            await close_database()
+        except Exception as e:
+            print(f"[Database] 연결 풀 종료 오류: {e}")
+        await super().close()
+
+
+k = KBot(command_prefix='!', intents=intents)
 
 # Slash 명령어는 on_ready에서 await setup_slash_commands(k)로 등록
 
@@ -112,9 +133,13 @@ async def on_ready():
     try:
         await init_database()
         print("[Database] Database initialized")
+        await load_ignore_list()
+        await load_warning_cache()
+        await load_market_catalog()
         print("[Database] Initializing all members...")
         result = await initialize_all_members(k.guilds)
         print(f"[Database] Members initialized: {result['created']} created, {result['skipped']} already existed")
+        await resolve_legacy_buyers(k)
     except Exception as e:
         print(f"[Database] DB 초기화 실패 — 봇은 실행되지만 DB 기능은 사용할 수 없습니다: {e}")
     
@@ -129,6 +154,9 @@ async def on_ready():
     # 처음 실행 시 모든 닉네임 즉시 업데이트
     await initial_nickname_update(k)
 
+    # 역할 생성/수정/삭제 시 티어 역할 인덱스 무효화
+    setup_role_index_events(k)
+
     # 처음 실행 시 모든 티어 역할 즉시 업데이트
     await initial_tier_role_update(k)
 
@@ -140,6 +168,10 @@ async def on_ready():
     setup_nickname_refresh(k)
     print("[NicknameManager] 1시간마다 닉네임 새로고침 활성화")
 
+    # 경고 만료 처리 (가장 이른 만료 시각에 맞춰 일괄 삭제)
+    setup_warning_expiry(k)
+    print("[WarningSystem] 경고 만료 서비스 활성화")
+
     # Slash 명령어 동기화 (Beta V2)
     try:
         from config import SLASH_SYNC_GUILD_ID
@@ -178,26 +210,18 @@ async def on_member_join(member: discord.Member):
             await set_level(user_id, guild_id, 1)
             print(f"[MemberJoin] Set level to 1 for {member.name}")
             
-            # 브론즈 티어 역할 부여 (레벨 1이면 자동으로 브론즈)
-            success, old_tier, new_tier = await update_tier_role(member, 1)
+            # 브론즈 티어 역할 부여 + 닉네임에 레벨 표시 (한 번의 요청)
+            success, old_tier, new_tier = await reconcile_member(member, 1)
             if success:
-                print(f"[MemberJoin] Added Bronze tier role to {member.name}")
-            else:
-                print(f"[MemberJoin] Failed to add tier role to {member.name}")
-            
-            # 닉네임에 레벨 표시
-            nickname_success = await update_user_nickname(member, 1)
-            if nickname_success:
-                print(f"[MemberJoin] Updated nickname for {member.name} with level 1")
+                print(f"[MemberJoin] Synced level 1 nickname and tier role for {member.name}")
             else:
-                print(f"[MemberJoin] Failed to update nickname for {member.name}")
+                print(f"[MemberJoin] Failed to sync nickname/tier role for {member.name}")
         else:
             # 이미 존재하는 사용자는 기존 레벨과 티어 유지
             print(f"[MemberJoin] Existing member rejoined: {member.name} (Level: {existing_user['level']})")
             
             # 닉네임과 티어 역할 동기화 (혹시 변경되었을 수 있으므로)
-            await update_user_nickname(member, existing_user['level'])
-            await update_tier_role(member, existing_user['level'])
+            await reconcile_member(member, existing_user['level'])
     
     except Exception as e:
         print(f"[MemberJoin] Error processing member join for {member.name}: {e}")
@@ -9,12 +9,12 @@ from level_system import (
     add_exp, set_current_exp, add_level, set_level,
     add_points, set_points, calculate_required_exp, get_user_level_info
 )
-from nickname_manager import update_user_nickname
-from role_manager import update_tier_role
+from nickname_manager import reconcile_member
 from logger import send_command_log, send_levelup_log, send_tier_upgrade_log, send_warning_log
 from warning_system import issue_warning, check_warning_restrictions, remove_warning
 from config import VOICE_CHANNEL_EXP
 from voice_channel_exp_manager import load_voice_channel_exp
+from voice_accrual import compute_accrued_exp
 
 
 from utils import has_jk_role
@@ -113,8 +113,7 @@ def admin_command(k):
         await ctx.send(embed=embed)
         
         if result['leveled_up'] and target_user:
-            await update_user_nickname(target_user, result['new_level'])
-            success, old_tier, new_tier = await update_tier_role(target_user, result['new_level'])
+            success, old_tier, new_tier = await reconcile_member(target_user, result['new_level'])
             # 티어 업그레이드 축하 메시지 전송
             if success and old_tier and new_tier and old_tier != new_tier:
                 await send_tier_upgrade_log(ctx.bot, target_user, old_tier, new_tier, result['new_level'])
@@ -188,12 +187,10 @@ def admin_command(k):
         await ctx.send(embed=embed)
         
         if target_user:
-            await update_user_nickname(target_user, result['new_level'])
-            if result['old_level'] != result['new_level']:
-                success, old_tier, new_tier = await update_tier_role(target_user, result['new_level'])
-                # 티어 업그레이드 축하 메시지 전송
-                if success and old_tier and new_tier and old_tier != new_tier:
-                    await send_tier_upgrade_log(ctx.bot, target_user, old_tier, new_tier, result['new_level'])
+            success, old_tier, new_tier = await reconcile_member(target_user, result['new_level'])
+            # 티어 업그레이드 축하 메시지 전송
+            if success and old_tier and new_tier and old_tier != new_tier:
+                await send_tier_upgrade_log(ctx.bot, target_user, old_tier, new_tier, result['new_level'])
 
     # ========== !jk레벨 명령어 그룹 ==========
     @k.group(name="jk레벨")
@@ -263,12 +260,10 @@ def admin_command(k):
         await ctx.send(embed=embed)
         
         if target_user:
-            await update_user_nickname(target_user, result['new_level'])
-            if result['old_level'] != result['new_level']:
-                success, old_tier, new_tier = await update_tier_role(target_user, result['new_level'])
-                # 티어 업그레이드 축하 메시지 전송
-                if success and old_tier and new_tier and old_tier != new_tier:
-                    await send_tier_upgrade_log(ctx.bot, target_user, old_tier, new_tier, result['new_level'])
+            success, old_tier, new_tier = await reconcile_member(target_user, result['new_level'])
+            # 티어 업그레이드 축하 메시지 전송
+            if success and old_tier and new_tier and old_tier != new_tier:
+                await send_tier_upgrade_log(ctx.bot, target_user, old_tier, new_tier, result['new_level'])
 
     @jk_level_group.command(name="set")
     @check_jk()
@@ -343,12 +338,10 @@ def admin_command(k):
         await ctx.send(embed=embed)
         
         if target_user:
-            await update_user_nickname(target_user, result['new_level'])
-            if result['old_level'] != result['new_level']:
-                success, old_tier, new_tier = await update_tier_role(target_user, result['new_level'])
-                # 티어 업그레이드 축하 메시지 전송
-                if success and old_tier and new_tier and old_tier != new_tier:
-                    await send_tier_upgrade_log(ctx.bot, target_user, old_tier, new_tier, result['new_level'])
+            success, old_tier, new_tier = await reconcile_member(target_user, result['new_level'])
+            # 티어 업그레이드 축하 메시지 전송
+            if success and old_tier and new_tier and old_tier != new_tier:
+                await send_tier_upgrade_log(ctx.bot, target_user, old_tier, new_tier, result['new_level'])
 
     # ========== !jk포인트 명령어 그룹 ==========
     @k.group(name="jk포인트")
@@ -678,6 +671,27 @@ def admin_command(k):
                 inline=True
             )
             
+            # DB 연결 풀 대기 시간
+            from database import get_pool_stats
+            pool_stats = get_pool_stats()
+            embed.add_field(
+                name="🗄️ DB 연결 풀",
+                value="\n".join(
+                    f"{role}: {s['acquires']:,}회 · 평균 대기 {s['wait_avg_ms']:.2f}ms · 최대 {s['wait_max_ms']:.1f}ms"
+                    for role, s in pool_stats.items()
+                ),
+                inline=False
+            )
+            
+            # 설정 파일 캐시 적중률
+            from config_registry import registry as config_registry
+            cfg_stats = config_registry.stats()
+            embed.add_field(
+                name="📁 설정 캐시",
+                value=f"적중 {cfg_stats['hits']:,}회 · 미스 {cfg_stats['misses']:,}회 · 적중률 {cfg_stats['hit_rate'] * 100:.1f}%",
+                inline=False
+            )
+            
             embed.set_footer(text=f"명령어 실행자: {ctx.author.display_name}")
             await ctx.send(embed=embed)
 
@@ -792,13 +806,9 @@ def admin_command(k):
                     duration_hours = duration_minutes // 60
                     duration_mins = duration_minutes % 60
                     
-                    session_exp_earned = 0
-                    check_time = join_time + timedelta(minutes=exp_interval)
-                    exp_interval_delta = timedelta(minutes=exp_interval)
-                    while check_time <= current_time:
-                        if start_h <= check_time.hour < end_h:
-                            session_exp_earned += exp_amount
-                        check_time += exp_interval_delta
+                    session_exp_earned = compute_accrued_exp(
+                        join_time, join_time, current_time, exp_interval, exp_amount, start_h, end_h
+                    )
                     
                     # 시간 표시 형식 (시간이 있으면 시간 포함, 없으면 분만)
                     if duration_hours > 0:
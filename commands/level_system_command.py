@@ -7,6 +7,13 @@ from level_ranges_manager import (
     load_level_ranges, add_level_range, remove_level_ranges_by_range,
     update_level_range, save_level_ranges
 )
+from level_recurve import recurve_all_users
+from level_simulator import (
+    DEFAULT_HOURS_SPEC, build_table, daily_exp, format_days, format_duration,
+    milestone_levels, parse_hours, project_days
+)
+from config import get_tier_roles
+from voice_channel_exp_manager import load_voice_channel_exp
 from utils import has_jk_role
 
 
@@ -25,7 +32,7 @@ def level_system_command(k):
     async def jk_level_system_group(ctx):
         """JK 레벨 시스템 설정 명령어 그룹"""
         if ctx.invoked_subcommand is None:
-            await ctx.send("❌ 사용법: `!jk레벨시스템 리스트` 또는 `!jk레벨시스템 set [n]:[m] [N] [M]` 또는 `!jk레벨시스템 remove [n]~[m]`")
+            await ctx.send("❌ 사용법: `!jk레벨시스템 리스트` 또는 `!jk레벨시스템 set [n]:[m] [N] [M]` 또는 `!jk레벨시스템 remove [n]~[m]` 또는 `!jk레벨시스템 재계산 [적용]` 또는 `!jk레벨시스템 시뮬 [시간대] [채널ID]`")
 
     @jk_level_system_group.command(name="리스트")
     @check_jk()
@@ -231,6 +238,122 @@ def level_system_command(k):
             import traceback
             traceback.print_exc()
 
+    @jk_level_system_group.command(name="재계산")
+    @check_jk()
+    async def level_system_recurve_command(ctx, mode: str = None):
+        """현재 레벨 범위 설정으로 전체 사용자 레벨/exp 재계산 (기본: 미리보기)"""
+        apply = mode == "적용"
+        if mode is not None and not apply:
+            await ctx.send("❌ 사용법: `!jk레벨시스템 재계산` (미리보기) 또는 `!jk레벨시스템 재계산 적용`")
+            return
+        
+        try:
+            if apply:
+                # 쌓여 있는 EXP를 먼저 반영해 재계산 중 total_exp가 바뀌는 사용자를 줄임
+                voice_monitor = getattr(ctx.bot, 'voice_monitor', None)
+                if voice_monitor is not None:
+                    await voice_monitor.exp_accumulator.flush()
+            
+            async with ctx.typing():
+                report = await recurve_all_users(apply=apply)
+            
+            embed = discord.Embed(
+                title="✅ 레벨 재계산 완료" if apply else "🔍 레벨 재계산 미리보기",
+                color=discord.Color.green() if apply else discord.Color.blue(),
+                timestamp=datetime.now()
+            )
+            embed.add_field(name="전체 사용자", value=f"**{report['scanned']}명**", inline=True)
+            embed.add_field(name="변경 대상", value=f"**{report['changed']}명**", inline=True)
+            embed.add_field(
+                name="레벨 변화",
+                value=f"⬆️ {report['up']}명 / ⬇️ {report['down']}명",
+                inline=True
+            )
+            if report['tiers']:
+                tier_lines = [
+                    f"{name}: ⬆️ {t['up']}명 ⬇️ {t['down']}명 (티어 승급 {t['tier_up']}, 강등 {t['tier_down']})"
+                    for name, t in report['tiers'].items()
+                ]
+                embed.add_field(name="현재 티어별 변화", value="\n".join(tier_lines)[:1024], inline=False)
+            if apply:
+                skipped = report['changed'] - report['applied']
+                embed.add_field(
+                    name="반영 결과",
+                    value=f"**{report['applied']}명** 반영" + (f" ({skipped}명은 재계산 중 EXP가 바뀌어 건너뜀)" if skipped else ""),
+                    inline=False
+                )
+                embed.set_footer(text=f"명령어 실행자: {ctx.author.display_name} | 포인트는 변경되지 않습니다")
+            else:
+                embed.set_footer(text="`!jk레벨시스템 재계산 적용`으로 반영 | 포인트는 변경되지 않습니다")
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            await ctx.send(f"❌ 오류가 발생했습니다: {e}")
+            import traceback
+            traceback.print_exc()
+
+    @jk_level_system_group.command(name="시뮬")
+    @check_jk()
+    async def level_system_simulate_command(ctx, hours_spec: str = DEFAULT_HOURS_SPEC, channel_id: int = None):
+        """현재 레벨 범위 설정으로 티어별 도달 EXP/포인트/일수 계산"""
+        try:
+            hours = parse_hours(hours_spec)
+        except ValueError as e:
+            await ctx.send(f"❌ 시간대 형식이 올바르지 않습니다: {e}\n예: `20-23`, `7,21-1`, `20-23:30`")
+            return
+        
+        try:
+            table = build_table()
+            # 티어 도달 레벨과 마지막 구간 레벨
+            levels = milestone_levels(
+                table,
+                [required for required, _ in get_tier_roles().values()] + [int(table['level'][-1])]
+            )
+            
+            settings = load_voice_channel_exp()
+            if channel_id is not None:
+                if channel_id not in settings:
+                    await ctx.send(f"❌ 채널 {channel_id}의 EXP 설정이 없습니다.")
+                    return
+                channels = [(channel_id, settings[channel_id])]
+            else:
+                channels = sorted(settings.items())
+            
+            embed = discord.Embed(
+                title="📈 레벨 도달 시뮬레이션",
+                description=f"하루 접속 시간대: **{hours_spec}** ({hours.sum() / 60:.1f}시간)",
+                color=discord.Color.blue(),
+                timestamp=datetime.now()
+            )
+            lines = [
+                f"{level}레벨: {int(table['exp'][level - 1]):,} EXP, {int(table['points'][level - 1]):,}포인트, "
+                f"{format_duration(float(table['minutes'][level - 1]))}"
+                for level in levels
+            ]
+            embed.add_field(name="누적 필요량 (기본 지급률)", value="\n".join(lines)[:1024] or "없음", inline=False)
+            
+            # 임베드 필드 수 제한 (25개) 안에서 채널별 도달 일수 표시
+            for cid, setting in channels[:20]:
+                interval, amount, start_hour, end_hour = setting
+                days = project_days(table, setting, hours)
+                channel = ctx.guild.get_channel(cid) if ctx.guild else None
+                name = channel.name if channel else str(cid)
+                value = "\n".join(f"{level}레벨: {format_days(float(days[level - 1]))}" for level in levels)
+                embed.add_field(
+                    name=f"{name} ({interval}분/{amount}EXP, {start_hour}~{end_hour}시, 하루 {daily_exp(setting, hours):,.0f}EXP)"[:256],
+                    value=value[:1024] or "없음",
+                    inline=True
+                )
+            if not channels:
+                embed.add_field(name="채널", value="voice_channel_exp.txt에 설정된 채널이 없습니다.", inline=False)
+            embed.set_footer(text=f"명령어 실행자: {ctx.author.display_name}")
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            await ctx.send(f"❌ 오류가 발생했습니다: {e}")
+            import traceback
+            traceback.print_exc()
+
     @jk_level_system_group.command(name="add")
     @check_jk()
     async def level_system_add_command(ctx, range_str: str = None, minutes: int = None, points: int = None):
@@ -243,6 +366,8 @@ def level_system_command(k):
     @level_system_set_command.error
     @level_system_add_command.error
     @level_system_remove_command.error
+    @level_system_recurve_command.error
+    @level_system_simulate_command.error
     async def level_system_command_error(ctx, error):
         if isinstance(error, commands.CheckFailure):
             await ctx.send("❌ 이 명령어는 JK 역할을 가진 사용자만 사용할 수 있습니다.")
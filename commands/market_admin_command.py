@@ -4,8 +4,9 @@ import discord
 from discord.ext import commands
 from datetime import datetime
 from market_manager import (
-    parse_market_file, save_market_file, add_market_item, clear_market_file,
-    remove_market_item, MarketItem, get_file_lock, ensure_market_dir
+    get_market_items, add_market_item, clear_market_file, remove_market_item, MarketItem,
+    get_file_lock, ensure_market_dir, export_market_file, import_market_file,
+    MARKET_FILE, MARKET_EXPORT_FILE
 )
 from utils import has_jk_role
 
@@ -32,14 +33,14 @@ class MarketClearConfirmView(discord.ui.View):
             return
         file_lock = await get_file_lock(self.filename)
         async with file_lock:
-            success = clear_market_file(self.filename)
+            success = await clear_market_file(self.filename)
             if not success:
-                await interaction.response.send_message(f"❌ `{self.filename}` 파일을 찾을 수 없습니다.", ephemeral=True)
+                await interaction.response.send_message("❌ 마켓에 등록된 물품이 없습니다.", ephemeral=True)
                 return
             self.cleared = True
             success_embed = discord.Embed(
                 title="✅ 마켓 클리어 완료",
-                description=f"**{self.filename}** 파일의 모든 내용이 삭제되었습니다.",
+                description="마켓의 모든 물품과 구매 기록이 삭제되었습니다.",
                 color=discord.Color.green(),
                 timestamp=datetime.now()
             )
@@ -67,7 +68,8 @@ def market_admin_command(k):
     async def jk_market_group(ctx):
         """JK 마켓 관리 명령어 그룹"""
         if ctx.invoked_subcommand is None:
-            await ctx.send("❌ 사용법: `!jk마켓 리스트` 또는 `!jk마켓 클리어` 또는 `!jk마켓 add`")
+            await ctx.send("❌ 사용법: `!jk마켓 리스트` 또는 `!jk마켓 클리어` 또는 `!jk마켓 add` "
+                           "또는 `!jk마켓 내보내기` 또는 `!jk마켓 가져오기`")
 
     @jk_market_group.command(name="리스트")
     @check_jk()
@@ -75,7 +77,7 @@ def market_admin_command(k):
         """마켓 파일 내용 조회"""
         ensure_market_dir()
         try:
-            items = parse_market_file("market.txt")
+            items = get_market_items("market.txt")
             if not items:
                 await ctx.send("❌ 마켓에 등록된 물품이 없습니다.")
                 return
@@ -116,11 +118,11 @@ def market_admin_command(k):
         """마켓 파일 내용 모두 비우기 (확인 절차 필요)"""
         ensure_market_dir()
         try:
-            items = parse_market_file("market.txt")
+            items = get_market_items("market.txt")
             item_count = len(items)
             embed = discord.Embed(
                 title="⚠️ 마켓 클리어 확인",
-                description="**market.txt** 파일의 모든 내용을 정말 삭제하시겠습니까?",
+                description="마켓의 모든 물품과 구매 기록을 정말 삭제하시겠습니까?",
                 color=discord.Color.red(),
                 timestamp=datetime.now()
             )
@@ -149,7 +151,7 @@ def market_admin_command(k):
         try:
             file_lock = await get_file_lock("market.txt")
             async with file_lock:
-                items = parse_market_file("market.txt")
+                items = get_market_items("market.txt")
                 target_item = None
                 for item in items:
                     if item.code.lower() == item_code.lower():
@@ -158,7 +160,7 @@ def market_admin_command(k):
                 if target_item is None:
                     await ctx.send(f"❌ 물품 코드 `{item_code}`를 찾을 수 없습니다.")
                     return
-                success = remove_market_item("market.txt", item_code)
+                success = await remove_market_item("market.txt", item_code)
                 if not success:
                     await ctx.send("❌ 물품 제거에 실패했습니다.")
                     return
@@ -223,7 +225,7 @@ def market_admin_command(k):
                     price_per_ticket=price, quantity=0, tickets_sold=0, buyers=[],
                     is_role=False, role_name=None
                 )
-                success = add_market_item("market.txt", new_item)
+                success = await add_market_item("market.txt", new_item)
                 if not success:
                     await ctx.send(f"❌ 물품 코드 `{item_code}`가 이미 존재합니다.")
                     return
@@ -272,7 +274,7 @@ def market_admin_command(k):
                     price_per_ticket=price, quantity=0, tickets_sold=0, buyers=[],
                     is_role=True, role_name=role_name
                 )
-                success = add_market_item("market.txt", new_item)
+                success = await add_market_item("market.txt", new_item)
                 if not success:
                     await ctx.send(f"❌ 물품 코드 `{item_code}`가 이미 존재합니다.")
                     return
@@ -291,11 +293,42 @@ def market_admin_command(k):
             import traceback
             traceback.print_exc()
 
+    @jk_market_group.command(name="내보내기")
+    @check_jk()
+    async def market_export_command(ctx):
+        """마켓 물품과 구매 명단을 market.txt 형식 파일로 내보내기"""
+        try:
+            count = export_market_file()
+            await ctx.send(f"✅ 마켓 물품 {count}개를 `{MARKET_EXPORT_FILE}` 파일로 내보냈습니다.")
+        except Exception as e:
+            await ctx.send(f"❌ 오류가 발생했습니다: {e}")
+            import traceback
+            traceback.print_exc()
+
+    @jk_market_group.command(name="가져오기")
+    @check_jk()
+    async def market_import_command(ctx, filename: str = MARKET_FILE):
+        """market 폴더의 market.txt 형식 파일에서 물품 가져오기 (이미 있는 코드는 건너뜀)"""
+        try:
+            file_lock = await get_file_lock("market.txt")
+            async with file_lock:
+                added, total = await import_market_file(filename)
+            if total == 0:
+                await ctx.send(f"❌ `{filename}` 파일이 없거나 물품이 없습니다.")
+                return
+            await ctx.send(f"✅ `{filename}`에서 물품 {added}개를 가져왔습니다. (파일 {total}개 중 중복 코드 {total - added}개 제외)")
+        except Exception as e:
+            await ctx.send(f"❌ 오류가 발생했습니다: {e}")
+            import traceback
+            traceback.print_exc()
+
     @market_list_command.error
     @market_clear_command.error
     @market_remove_command.error
     @market_add_ticket_command.error
     @market_add_role_command.error
+    @market_export_command.error
+    @market_import_command.error
     async def market_admin_command_error(ctx, error):
         if isinstance(error, commands.CheckFailure):
             await ctx.send("❌ 이 명령어는 JK 역할을 가진 사용자만 사용할 수 있습니다.")
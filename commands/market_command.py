@@ -2,9 +2,9 @@
 
 import discord
 from discord.ext import commands
-from database import get_user, get_or_create_user, update_user_points
+from database import get_user, get_or_create_user
 from market_manager import (
-    get_all_market_items, find_item_by_code, purchase_ticket,
+    get_all_market_items, find_item_by_code,
     ensure_market_dir, get_user_purchase_history
 )
 from logger import send_purchase_log
@@ -124,12 +124,12 @@ def market_command(k):
             user_points = 0
 
         if item.is_role:
-            if not item.can_purchase(user_name):
+            if not item.can_purchase(user_id):
                 await ctx.send(f"❌ `{item.name}` 역할을 이미 보유하고 있습니다.")
                 return
         else:
-            user_ticket_count = item.get_user_ticket_count(user_name)
-            if not item.can_purchase(user_name):
+            user_ticket_count = item.get_user_ticket_count(user_id)
+            if not item.can_purchase(user_id):
                 await ctx.send(
                     f"❌ `{item.name}`은(는) 한 사람당 최대 {item.max_purchase}개까지만 구매할 수 있습니다.\n"
                     f"현재 구매한 티켓: {user_ticket_count}개"
@@ -144,7 +144,7 @@ def market_command(k):
             )
             return
 
-        user_ticket_count = item.get_user_ticket_count(user_name) if not item.is_role else 0
+        user_ticket_count = item.get_user_ticket_count(user_id) if not item.is_role else 0
 
         if item.is_role:
             embed = discord.Embed(
@@ -211,7 +211,7 @@ def market_command(k):
 
         ensure_market_dir()
         user_name = ctx.author.display_name
-        user_purchases = get_user_purchase_history(user_name)
+        user_purchases = get_user_purchase_history(ctx.author.id)
 
         if not user_purchases:
             embed = discord.Embed(
@@ -281,129 +281,102 @@ class PurchaseConfirmView(discord.ui.View):
             await interaction.response.send_message("❌ 본인만 구매할 수 있습니다.", ephemeral=True)
             return
 
+        # 대기열 처리와 역할 부여가 상호작용 응답 제한(3초)을 넘을 수 있으므로 먼저 응답을 미룸
+        await interaction.response.defer()
+
         user = await get_user(self.user_id, self.guild_id)
         if user is None:
-            await interaction.response.send_message("❌ 사용자 정보를 찾을 수 없습니다.", ephemeral=True)
+            await interaction.followup.send("❌ 사용자 정보를 찾을 수 없습니다.", ephemeral=True)
             return
         try:
             current_points = int(user.get('points') or 0)
         except (TypeError, ValueError):
             current_points = 0
         if current_points < self.price:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f"❌ 포인트가 부족합니다.\n필요: {self.price:,}, 보유: {current_points:,}",
                 ephemeral=True
             )
             return
 
-        from market_manager import get_file_lock, purchase_ticket, find_item_by_code
-        file_lock = await get_file_lock(self.filename)
+        from market_manager import refund_ticket, find_item_by_code
+        from market_queue import submit_purchase, describe_failure
 
-        async with file_lock:
-            result = find_item_by_code(self.item.code)
-            if result is None:
-                await interaction.response.send_message("❌ 물품을 찾을 수 없습니다.", ephemeral=True)
+        result = find_item_by_code(self.item.code)
+        if result is None:
+            await interaction.followup.send("❌ 물품을 찾을 수 없습니다.", ephemeral=True)
+            return
+        _, updated_item = result
+
+        member = None
+        role = None
+        if updated_item.is_role:
+            guild = interaction.guild
+            member = guild.get_member(self.user_id)
+            if member is None:
+                await interaction.followup.send("❌ 사용자를 찾을 수 없습니다.", ephemeral=True)
+                return
+            role = discord.utils.get(guild.roles, name=updated_item.role_name)
+            if role is None:
+                await interaction.followup.send(f"❌ 역할 '{updated_item.role_name}'을(를) 찾을 수 없습니다.", ephemeral=True)
                 return
-            _, updated_item = result
-
-            if updated_item.is_role:
-                if not updated_item.can_purchase(self.user_name):
-                    await interaction.response.send_message(
-                        f"❌ 이미 {updated_item.role_name} 역할을 보유하고 있습니다.",
-                        ephemeral=True
-                    )
-                    return
-            else:
-                user_ticket_count = updated_item.get_user_ticket_count(self.user_name)
-                if not updated_item.can_purchase(self.user_name):
-                    await interaction.response.send_message(
-                        f"❌ 최대 구매 가능 수를 초과했습니다.\n현재: {user_ticket_count}개 / 최대: {updated_item.max_purchase}개",
-                        ephemeral=True
-                    )
-                    return
 
-            if not updated_item.is_available():
-                await interaction.response.send_message("❌ 품절되었습니다.", ephemeral=True)
+        # 수량·1인당 제한 검증, 포인트 차감, 티켓 기록은 물품별 대기열 워커가 한 번에 처리
+        purchase = await submit_purchase(updated_item.code, self.user_id, self.guild_id, self.user_name)
+        if not purchase.ok:
+            await interaction.followup.send(describe_failure(purchase, updated_item), ephemeral=True)
+            return
+        ticket_id, new_points = purchase.ticket_id, purchase.points
+
+        if updated_item.is_role:
+            try:
+                await member.add_roles(role, reason=f"마켓에서 {updated_item.role_name} 역할 구매")
+            except discord.Forbidden:
+                await refund_ticket(updated_item, ticket_id, self.user_id)
+                await interaction.followup.send("❌ 역할을 부여할 권한이 없습니다.", ephemeral=True)
+                return
+            except Exception as e:
+                await refund_ticket(updated_item, ticket_id, self.user_id)
+                await interaction.followup.send(f"❌ 역할 부여 중 오류가 발생했습니다: {e}", ephemeral=True)
                 return
 
-            new_points = current_points - self.price
-            await update_user_points(self.user_id, self.guild_id, new_points)
-
-            if updated_item.is_role:
-                guild = interaction.guild
-                member = guild.get_member(self.user_id)
-                if member is None:
-                    await update_user_points(self.user_id, self.guild_id, current_points)
-                    await interaction.response.send_message("❌ 사용자를 찾을 수 없습니다.", ephemeral=True)
-                    return
-                role = discord.utils.get(guild.roles, name=updated_item.role_name)
-                if role is None:
-                    await update_user_points(self.user_id, self.guild_id, current_points)
-                    await interaction.response.send_message(f"❌ 역할 '{updated_item.role_name}'을(를) 찾을 수 없습니다.", ephemeral=True)
-                    return
-                try:
-                    await member.add_roles(role, reason=f"마켓에서 {updated_item.role_name} 역할 구매")
-                except discord.Forbidden:
-                    await update_user_points(self.user_id, self.guild_id, current_points)
-                    await interaction.response.send_message("❌ 역할을 부여할 권한이 없습니다.", ephemeral=True)
-                    return
-                except Exception as e:
-                    await update_user_points(self.user_id, self.guild_id, current_points)
-                    await interaction.response.send_message(f"❌ 역할 부여 중 오류가 발생했습니다: {e}", ephemeral=True)
-                    return
-
-                success = purchase_ticket(self.filename, self.item.code, self.user_name)
-                if not success:
-                    await update_user_points(self.user_id, self.guild_id, current_points)
-                    try:
-                        await member.remove_roles(role, reason="구매 처리 실패로 인한 역할 제거")
-                    except Exception:
-                        pass
-                    await interaction.response.send_message("❌ 구매 처리 중 오류가 발생했습니다.", ephemeral=True)
-                    return
-
-                self.purchased = True
-                success_embed = discord.Embed(
-                    title="✅ 구매 완료",
-                    description=f"**{updated_item.role_name}** 역할을 구매했습니다!",
-                    color=discord.Color.green()
-                )
-                success_embed.add_field(name="구매 정보", value=(
-                    f"**물품 코드:** {self.item.code}\n"
-                    f"**역할 이름:** {updated_item.role_name}\n"
-                    f"**가격:** {self.price:,} 포인트\n"
-                    f"**구매 후 포인트:** {new_points:,}"
-                ), inline=False)
-                await interaction.response.edit_message(embed=success_embed, view=None)
-                await send_purchase_log(
-                    interaction.client, interaction.user,
-                    updated_item.role_name, self.item.code, self.price, new_points, 1, 1
-                )
-            else:
-                success = purchase_ticket(self.filename, self.item.code, self.user_name)
-                if not success:
-                    await update_user_points(self.user_id, self.guild_id, current_points)
-                    await interaction.response.send_message("❌ 구매 처리 중 오류가 발생했습니다.", ephemeral=True)
-                    return
-                self.purchased = True
-                user_ticket_count = updated_item.get_user_ticket_count(self.user_name)
-                success_embed = discord.Embed(
-                    title="✅ 구매 완료",
-                    description=f"**{updated_item.name}** 티켓을 구매했습니다!",
-                    color=discord.Color.green()
-                )
-                success_embed.add_field(name="구매 정보", value=(
-                    f"**물품 코드:** {self.item.code}\n"
-                    f"**티켓 가격:** {self.price:,} 포인트\n"
-                    f"**구매 후 포인트:** {new_points:,}\n"
-                    f"**보유 티켓:** {user_ticket_count + 1}개 / {updated_item.max_purchase}개"
-                ), inline=False)
-                await interaction.response.edit_message(embed=success_embed, view=None)
-                await send_purchase_log(
-                    interaction.client, interaction.user,
-                    self.item.name, self.item.code, self.price, new_points,
-                    user_ticket_count + 1, updated_item.max_purchase
-                )
+            self.purchased = True
+            success_embed = discord.Embed(
+                title="✅ 구매 완료",
+                description=f"**{updated_item.role_name}** 역할을 구매했습니다!",
+                color=discord.Color.green()
+            )
+            success_embed.add_field(name="구매 정보", value=(
+                f"**물품 코드:** {self.item.code}\n"
+                f"**역할 이름:** {updated_item.role_name}\n"
+                f"**가격:** {self.price:,} 포인트\n"
+                f"**구매 후 포인트:** {new_points:,}"
+            ), inline=False)
+            await interaction.edit_original_response(embed=success_embed, view=None)
+            await send_purchase_log(
+                interaction.client, interaction.user,
+                updated_item.role_name, self.item.code, self.price, new_points, 1, 1
+            )
+        else:
+            self.purchased = True
+            user_ticket_count = purchase.ticket_count
+            success_embed = discord.Embed(
+                title="✅ 구매 완료",
+                description=f"**{updated_item.name}** 티켓을 구매했습니다!",
+                color=discord.Color.green()
+            )
+            success_embed.add_field(name="구매 정보", value=(
+                f"**물품 코드:** {self.item.code}\n"
+                f"**티켓 가격:** {self.price:,} 포인트\n"
+                f"**구매 후 포인트:** {new_points:,}\n"
+                f"**보유 티켓:** {user_ticket_count}개 / {updated_item.max_purchase}개"
+            ), inline=False)
+            await interaction.edit_original_response(embed=success_embed, view=None)
+            await send_purchase_log(
+                interaction.client, interaction.user,
+                self.item.name, self.item.code, self.price, new_points,
+                user_ticket_count, updated_item.max_purchase
+            )
 
     @discord.ui.button(label="❌ 취소", style=discord.ButtonStyle.red)
     async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
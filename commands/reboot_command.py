@@ -4,8 +4,7 @@ import asyncio
 import discord
 from discord.ext import commands
 from datetime import datetime
-from database import get_all_users_for_nickname_refresh
-from role_manager import update_tier_role
+from tier_reconciler import reconcile_tier_roles
 from utils import has_jk_role
 
 
@@ -67,71 +66,28 @@ def reboot_command(k):
             await ctx.send("🔄 티어 시스템 재설정을 시작합니다...")
             
             # 진행 상황 메시지
-            status_msg = await ctx.send("⏳ 사용자 조회 중...")
+            status_msg = await ctx.send("⏳ 사용자 조회 및 티어 역할 비교 중...")
             
-            # 모든 사용자 조회
-            users = await get_all_users_for_nickname_refresh()
-            total_users = len(users)
+            # 진행 상황 업데이트 (10명마다)
+            async def report_progress(stats):
+                if stats['done'] % 10 == 0 or stats['done'] == stats['planned']:
+                    await status_msg.edit(
+                        content=f"🔄 변경이 필요한 {stats['planned']}명의 티어 재설정 중...\n"
+                               f"⏳ 진행 중: {stats['done']}/{stats['planned']} ({stats['updated']}명 업데이트, {stats['failed']}명 실패)"
+                    )
+            
+            # 역할별 멤버 집합과 DB 레벨을 비교해 바뀌어야 할 멤버만 처리 (축하 메시지는 보내지 않음 - 재설정이므로)
+            stats = await reconcile_tier_roles(ctx.bot, progress=report_progress)
+            total_users = stats['checked']
             
             if total_users == 0:
                 await status_msg.edit(content="❌ 재설정할 사용자가 없습니다.")
                 return
             
-            await status_msg.edit(
-                content=f"🔄 총 {total_users}명의 사용자 티어 재설정 중...\n"
-                       f"⏳ 진행 중: 0/{total_users}"
-            )
-            
-            # 통계
-            updated_count = 0
-            failed_count = 0
-            skipped_count = 0
-            tier_changes = {}  # {티어_이름: 변경_횟수}
-            
-            # 각 사용자 처리
-            for idx, user_data in enumerate(users, 1):
-                user_id = user_data['user_id']
-                guild_id = user_data['guild_id']
-                level = user_data['level']
-                
-                # 진행 상황 업데이트 (10명마다)
-                if idx % 10 == 0 or idx == total_users:
-                    await status_msg.edit(
-                        content=f"🔄 총 {total_users}명의 사용자 티어 재설정 중...\n"
-                               f"⏳ 진행 중: {idx}/{total_users} ({updated_count}명 업데이트, {failed_count}명 실패, {skipped_count}명 스킵)"
-                    )
-                
-                # 서버 조회
-                guild = ctx.bot.get_guild(guild_id)
-                if guild is None:
-                    skipped_count += 1
-                    continue
-                
-                # 멤버 조회
-                member = guild.get_member(user_id)
-                if member is None:
-                    skipped_count += 1
-                    continue
-                
-                # 티어 역할 업데이트 (축하 메시지는 보내지 않음 - 재설정이므로)
-                success, old_tier, new_tier = await update_tier_role(member, level)
-                
-                if success:
-                    if old_tier != new_tier:
-                        # 티어 변경 발생
-                        updated_count += 1
-                        if new_tier:
-                            if new_tier not in tier_changes:
-                                tier_changes[new_tier] = 0
-                            tier_changes[new_tier] += 1
-                    else:
-                        # 티어 변경 없음
-                        skipped_count += 1
-                else:
-                    failed_count += 1
-                
-                # API 레이트 리밋 방지를 위해 약간의 딜레이
-                await asyncio.sleep(0.1)
+            updated_count = stats['updated']
+            failed_count = stats['failed']
+            skipped_count = total_users - stats['planned']
+            tier_changes = stats['tier_changes']  # {티어_이름: 변경_횟수}
             
             # 완료 메시지
             result_lines = [
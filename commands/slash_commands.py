@@ -22,14 +22,14 @@ from database import (
     get_market_enabled, get_user, get_or_create_user,
     set_market_enabled,
     add_server_fee, remove_server_fee, get_server_fee_balance,
-    get_all_users_for_nickname_refresh,
+    get_pool_stats,
 )
 from market_manager import (
-    get_all_market_items, find_item_by_code, purchase_ticket,
+    get_all_market_items, find_item_by_code, find_item_by_id, refund_ticket,
     get_user_purchase_history, ensure_market_dir, get_file_lock,
-    parse_market_file, add_market_item, clear_market_file, remove_market_item, MarketItem,
+    get_market_items, add_market_item, clear_market_file, remove_market_item, MarketItem,
+    export_market_file, import_market_file, MARKET_FILE, MARKET_EXPORT_FILE,
 )
-from database import update_user_points
 import os
 from study_manager import (
     add_member_to_study, remove_member_from_study,
@@ -38,8 +38,11 @@ from study_manager import (
     read_study_file, create_study, delete_study, get_study_file_path,
     list_all_studies,
 )
-from nickname_manager import update_user_nickname
-from role_manager import update_tier_role, get_tier_for_level
+from nickname_manager import reconcile_member
+from role_manager import get_tier_for_level
+from tier_reconciler import reconcile_tier_roles
+from market_draw import draw_item, MAX_SEED
+from market_queue import submit_purchase, describe_failure, get_item_lock
 from logger import send_command_log, send_levelup_log, send_tier_upgrade_log, send_warning_log, send_purchase_log
 from warning_system import issue_warning, check_warning_restrictions, remove_warning
 from voice_channel_exp_manager import (
@@ -47,6 +50,8 @@ from voice_channel_exp_manager import (
     DEFAULT_START_HOUR, DEFAULT_END_HOUR,
 )
 from exp_ignore_manager import toggle_ignore as exp_ignore_toggle
+from voice_accrual import compute_accrued_exp
+from config_registry import registry as config_registry
 from level_ranges_manager import load_level_ranges, add_level_range, remove_level_ranges_by_range, update_level_range
 from tier_roles_manager import load_tier_roles, add_tier_role, remove_tier_role
 from config import VOICE_CHANNEL_EXP
@@ -243,11 +248,11 @@ async def setup_slash_commands(bot: discord.Client):
         user_points = int(user.get("points") or 0)
 
         if item.is_role:
-            if not item.can_purchase(user_name):
+            if not item.can_purchase(user_id):
                 await interaction.response.send_message(f"❌ `{item.name}` 역할을 이미 보유하고 있습니다.", ephemeral=True)
                 return
         else:
-            uc = item.get_user_ticket_count(user_name)
+            uc = item.get_user_ticket_count(user_id)
             if uc >= item.max_purchase:
                 await interaction.response.send_message(
                     f"❌ 한 사람당 최대 {item.max_purchase}개까지만 구매할 수 있습니다. (현재: {uc}개)",
@@ -273,26 +278,26 @@ async def setup_slash_commands(bot: discord.Client):
             if not role:
                 await interaction.response.send_message(f"❌ 역할 '{item.role_name}'을 찾을 수 없습니다.", ephemeral=True)
                 return
+
+        # 대기열 처리와 역할 부여가 상호작용 응답 제한(3초)을 넘을 수 있으므로 먼저 응답을 미룸
+        await interaction.response.defer(thinking=True)
+        # 수량·1인당 제한 검증, 포인트 차감, 티켓 기록은 물품별 대기열 워커가 한 번에 처리
+        purchase = await submit_purchase(item.code, user_id, guild_id, user_name)
+        if not purchase.ok:
+            await interaction.followup.send(describe_failure(purchase, item), ephemeral=True)
+            return
+        ticket_id, new_points = purchase.ticket_id, purchase.points
+        if item.is_role:
             try:
                 await member.add_roles(role, reason=f"마켓에서 {item.role_name} 역할 구매")
             except discord.Forbidden:
-                await interaction.response.send_message("❌ 역할을 부여할 권한이 없습니다.", ephemeral=True)
+                await refund_ticket(item, ticket_id, user_id)
+                await interaction.followup.send("❌ 역할을 부여할 권한이 없습니다.", ephemeral=True)
+                return
+            except discord.HTTPException as e:
+                await refund_ticket(item, ticket_id, user_id)
+                await interaction.followup.send(f"❌ 역할 부여 중 오류가 발생했습니다: {e}", ephemeral=True)
                 return
-
-        new_points = user_points - item.price_per_ticket
-        file_lock = await get_file_lock(filename)
-        async with file_lock:
-            await update_user_points(user_id, guild_id, new_points)
-            success = purchase_ticket(filename, item.code, user_name)
-        if not success:
-            await update_user_points(user_id, guild_id, user_points)
-            if item.is_role and member and role:
-                try:
-                    await member.remove_roles(role, reason="구매 처리 실패")
-                except Exception:
-                    pass
-            await interaction.response.send_message("❌ 구매 처리 중 오류가 발생했습니다.", ephemeral=True)
-            return
 
         embed = discord.Embed(title="✅ 구매 완료", color=discord.Color.green())
         if item.is_role:
@@ -300,11 +305,11 @@ async def setup_slash_commands(bot: discord.Client):
             embed.add_field(name="구매 정보", value=f"**물품 코드:** {item.code}\n**가격:** {item.price_per_ticket:,} 포인트\n**구매 후 포인트:** {new_points:,}", inline=False)
             await send_purchase_log(interaction.client, interaction.user, item.role_name, item.code, item.price_per_ticket, new_points, 1, 1)
         else:
-            uc = item.get_user_ticket_count(user_name)
+            uc = purchase.ticket_count
             embed.description = f"**{item.name}** 티켓을 구매했습니다!"
             embed.add_field(name="구매 정보", value=f"**물품 코드:** {item.code}\n**티켓 가격:** {item.price_per_ticket:,} 포인트\n**구매 후 포인트:** {new_points:,}\n**보유 티켓:** {uc}개 / {item.max_purchase}개", inline=False)
             await send_purchase_log(interaction.client, interaction.user, item.name, item.code, item.price_per_ticket, new_points, uc, item.max_purchase)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
 
     @bot.tree.command(name="티켓목록", description="내가 구매한 티켓 목록을 조회합니다")
     async def slash_ticket_list(interaction: discord.Interaction):
@@ -328,7 +333,7 @@ async def setup_slash_commands(bot: discord.Client):
                 return
 
         user_name = interaction.user.display_name
-        user_purchases = get_user_purchase_history(user_name)
+        user_purchases = get_user_purchase_history(interaction.user.id)
         if not user_purchases:
             embed = discord.Embed(title="🎫 티켓 목록", description="구매한 티켓이 없습니다.", color=discord.Color.orange())
             await interaction.response.send_message(embed=embed)
@@ -412,8 +417,9 @@ async def setup_slash_commands(bot: discord.Client):
         embed.add_field(name="현재 레벨", value=str(result['new_level']), inline=True)
         await interaction.response.send_message(embed=embed)
         if result['leveled_up']:
-            await update_user_nickname(user, result['new_level'])
-            await update_tier_role(user, result['new_level'])
+            success, old_tier, new_tier = await reconcile_member(user, result['new_level'])
+            if success and old_tier and new_tier and old_tier != new_tier:
+                await send_tier_upgrade_log(interaction.client, user, old_tier, new_tier, result['new_level'])
 
     @exp_group.command(name="set", description="현재 레벨의 경험치 진행률 설정")
     @app_commands.describe(user="대상 사용자", amount="설정할 EXP 수치 (0 이상)")
@@ -434,9 +440,9 @@ async def setup_slash_commands(bot: discord.Client):
         if result['old_level'] != result['new_level']:
             embed.add_field(name="레벨 변화", value=f"**{result['old_level']}** → **{result['new_level']}**", inline=True)
         await interaction.response.send_message(embed=embed)
-        await update_user_nickname(user, result['new_level'])
-        if result['old_level'] != result['new_level']:
-            await update_tier_role(user, result['new_level'])
+        success, old_tier, new_tier = await reconcile_member(user, result['new_level'])
+        if success and old_tier and new_tier and old_tier != new_tier:
+            await send_tier_upgrade_log(interaction.client, user, old_tier, new_tier, result['new_level'])
 
     @exp_group.command(name="ignore", description="EXP 지급 제외/해제 (토글)")
     @app_commands.describe(user="EXP 지급 제외할 사용자 (이미 제외된 경우 다시 지급받도록 해제)")
@@ -445,7 +451,7 @@ async def setup_slash_commands(bot: discord.Client):
             await interaction.response.send_message("❌ JK 역할이 필요합니다.", ephemeral=True)
             return
         guild_id = interaction.guild.id
-        now_ignored = exp_ignore_toggle(guild_id, user.id)
+        now_ignored = await exp_ignore_toggle(guild_id, user.id)
         if now_ignored:
             await send_command_log(interaction.client, interaction.user, "/jk exp ignore", target_user=user, details="EXP 지급 제외")
             await interaction.response.send_message(f"✅ **{user.display_name}**님은 이제 EXP 지급 대상에서 **제외**됩니다. (다시 받게 하려면 같은 명령을 한 번 더 사용하세요)")
@@ -469,8 +475,9 @@ async def setup_slash_commands(bot: discord.Client):
         embed.add_field(name="추가된 레벨", value=f"+{levels}", inline=True)
         embed.add_field(name="이전/새 레벨", value=f"**{result['old_level']}** → **{result['new_level']}**", inline=True)
         await interaction.response.send_message(embed=embed)
-        await update_user_nickname(user, result['new_level'])
-        await update_tier_role(user, result['new_level'])
+        success, old_tier, new_tier = await reconcile_member(user, result['new_level'])
+        if success and old_tier and new_tier and old_tier != new_tier:
+            await send_tier_upgrade_log(interaction.client, user, old_tier, new_tier, result['new_level'])
 
     @level_group.command(name="set", description="레벨 직접 설정")
     @app_commands.describe(user="대상 사용자", target_level="목표 레벨", award_points="레벨 상승 시 포인트 지급 여부")
@@ -490,8 +497,9 @@ async def setup_slash_commands(bot: discord.Client):
         if result.get('points_earned', 0) != 0:
             embed.add_field(name="포인트", value=f"+{result['points_earned']} (총 {result['new_points']:,})", inline=True)
         await interaction.response.send_message(embed=embed)
-        await update_user_nickname(user, result['new_level'])
-        await update_tier_role(user, result['new_level'])
+        success, old_tier, new_tier = await reconcile_member(user, result['new_level'])
+        if success and old_tier and new_tier and old_tier != new_tier:
+            await send_tier_upgrade_log(interaction.client, user, old_tier, new_tier, result['new_level'])
 
     points_group = app_commands.Group(name="points", description="포인트 관리", parent=jk_group)
 
@@ -625,13 +633,13 @@ async def setup_slash_commands(bot: discord.Client):
         await send_command_log(interaction.client, interaction.user, "/jk market toggle", details=f"마켓 {status}")
         await interaction.response.send_message(f"✅ 마켓이 **{status}**되었습니다.")
 
-    @market_group.command(name="list", description="마켓 파일(market.txt) 내용 조회")
+    @market_group.command(name="list", description="마켓 물품 목록 조회")
     async def jk_market_list(interaction: discord.Interaction):
         if not _check_jk(interaction):
             await interaction.response.send_message("❌ JK 역할이 필요합니다.", ephemeral=True)
             return
         ensure_market_dir()
-        items = parse_market_file("market.txt")
+        items = get_market_items("market.txt")
         if not items:
             await interaction.response.send_message("❌ 마켓에 등록된 물품이 없습니다.")
             return
@@ -639,22 +647,22 @@ async def setup_slash_commands(bot: discord.Client):
         for i, item in enumerate(items, 1):
             t = "역할" if item.is_role else "티켓"
             lines.append(f"{i}. [{t}] {item.code} - {item.name} (가격: {item.price_per_ticket:,}P)")
-        embed = discord.Embed(title="📋 마켓 목록 (market.txt)", description="\n".join(lines), color=discord.Color.blue())
+        embed = discord.Embed(title="📋 마켓 목록", description="\n".join(lines), color=discord.Color.blue())
         await interaction.response.send_message(embed=embed)
 
-    @market_group.command(name="clear", description="마켓 파일 전체 삭제 (확인 후 실행)")
+    @market_group.command(name="clear", description="마켓 물품과 구매 기록 전체 삭제")
     async def jk_market_clear(interaction: discord.Interaction):
         if not _check_jk(interaction):
             await interaction.response.send_message("❌ JK 역할이 필요합니다.", ephemeral=True)
             return
         file_lock = await get_file_lock("market.txt")
         async with file_lock:
-            ok = clear_market_file("market.txt")
+            ok = await clear_market_file("market.txt")
         if not ok:
-            await interaction.response.send_message("❌ market.txt 파일을 찾을 수 없습니다.")
+            await interaction.response.send_message("❌ 마켓에 등록된 물품이 없습니다.")
             return
-        await send_command_log(interaction.client, interaction.user, "/jk market clear", details="마켓 파일 전체 삭제")
-        await interaction.response.send_message("✅ 마켓(market.txt) 내용이 모두 삭제되었습니다.")
+        await send_command_log(interaction.client, interaction.user, "/jk market clear", details="마켓 전체 삭제")
+        await interaction.response.send_message("✅ 마켓 물품과 구매 기록이 모두 삭제되었습니다.")
 
     @market_group.command(name="remove", description="마켓에서 물품 코드로 제거")
     @app_commands.describe(code="물품 코드")
@@ -664,7 +672,7 @@ async def setup_slash_commands(bot: discord.Client):
             return
         file_lock = await get_file_lock("market.txt")
         async with file_lock:
-            ok = remove_market_item("market.txt", code)
+            ok = await remove_market_item("market.txt", code)
         if not ok:
             await interaction.response.send_message(f"❌ 물품 코드 `{code}`를 찾을 수 없습니다.")
             return
@@ -683,7 +691,7 @@ async def setup_slash_commands(bot: discord.Client):
         file_lock = await get_file_lock("market.txt")
         async with file_lock:
             item = MarketItem(name=name, code=code, draw_count=draw_count, max_purchase=max_purchase, price_per_ticket=price, quantity=0, tickets_sold=0, buyers=[], is_role=False, role_name=None)
-            ok = add_market_item("market.txt", item)
+            ok = await add_market_item("market.txt", item)
         if not ok:
             await interaction.response.send_message(f"❌ 물품 코드 `{code}`가 이미 존재합니다.", ephemeral=True)
             return
@@ -702,13 +710,86 @@ async def setup_slash_commands(bot: discord.Client):
         file_lock = await get_file_lock("market.txt")
         async with file_lock:
             item = MarketItem(name=f"역할: {role_name}", code=code, draw_count=1, max_purchase=1, price_per_ticket=price, quantity=0, tickets_sold=0, buyers=[], is_role=True, role_name=role_name)
-            ok = add_market_item("market.txt", item)
+            ok = await add_market_item("market.txt", item)
         if not ok:
             await interaction.response.send_message(f"❌ 물품 코드 `{code}`가 이미 존재합니다.", ephemeral=True)
             return
         await send_command_log(interaction.client, interaction.user, "/jk market add_role", details=f"역할 {role_name} ({code}), 가격 {price:,}P")
         await interaction.response.send_message(f"✅ 역할 **{role_name}** (`{code}`) 추가 완료. 가격 {price:,}P")
 
+    @market_group.command(name="draw", description="티켓 물품 추첨 (구매한 티켓 수만큼 당첨 확률)")
+    @app_commands.describe(code="물품 코드", seed="추첨 시드 (같은 구매 현황에서 결과 재현용, 비우면 자동 생성)")
+    async def jk_market_draw(interaction: discord.Interaction, code: str, seed: int = None):
+        if not _check_jk(interaction):
+            await interaction.response.send_message("❌ JK 역할이 필요합니다.", ephemeral=True)
+            return
+        if seed is not None and not 0 <= seed < MAX_SEED:
+            await interaction.response.send_message(f"❌ 시드는 0 이상 {MAX_SEED:,} 미만이어야 합니다.", ephemeral=True)
+            return
+        result = find_item_by_code(code)
+        if result is None:
+            await interaction.response.send_message(f"❌ 물품 코드 `{code}`를 찾을 수 없습니다.", ephemeral=True)
+            return
+        filename, item = result
+        if item.is_role:
+            await interaction.response.send_message("❌ 역할 물품은 추첨할 수 없습니다.", ephemeral=True)
+            return
+        # 커밋됐지만 아직 메모리에 반영되지 않은 구매가 없도록 물품 구매 락 → 마켓 락 순서로 잡음
+        async with get_item_lock(item.code):
+            file_lock = await get_file_lock(filename)
+            async with file_lock:
+                # 기다리는 동안 카탈로그가 다시 로드됐을 수 있으므로 현재 물품으로 추첨
+                item = find_item_by_id(item.item_id)
+                draw = await draw_item(item, seed=seed, drawn_by=interaction.user.id) if item is not None else None
+        if draw is None:
+            await interaction.response.send_message(f"❌ 물품 코드 `{code}`를 찾을 수 없습니다.", ephemeral=True)
+            return
+        if not draw['winners']:
+            await interaction.response.send_message(f"❌ `{item.code}` 티켓을 구매한 사용자가 없습니다.", ephemeral=True)
+            return
+        lines = []
+        for i, winner in enumerate(draw['winners'], 1):
+            who = f"<@{winner['user_id']}>" if winner['user_id'] else f"@{winner['name']}"
+            lines.append(f"{i}. {who} (티켓 {winner['tickets']}장)")
+        embed = discord.Embed(
+            title=f"🎉 {item.name} 추첨 결과",
+            description="\n".join(lines),
+            color=discord.Color.gold()
+        )
+        embed.add_field(name="추첨 정보", value=(
+            f"**물품 코드:** {item.code}\n"
+            f"**뽑는 인원:** {item.draw_count}명\n"
+            f"**참여:** {draw['pool_size']}명 / 티켓 {draw['total_tickets']}장"
+        ), inline=False)
+        embed.set_footer(text=f"추첨 #{draw['draw_id']} · seed {draw['seed']}")
+        await send_command_log(interaction.client, interaction.user, "/jk market draw",
+                               details=f"{item.code} 추첨 #{draw['draw_id']} (seed {draw['seed']})")
+        await interaction.response.send_message(embed=embed)
+
+    @market_group.command(name="export", description="마켓을 market.txt 형식 파일로 내보내기")
+    async def jk_market_export(interaction: discord.Interaction):
+        if not _check_jk(interaction):
+            await interaction.response.send_message("❌ JK 역할이 필요합니다.", ephemeral=True)
+            return
+        count = export_market_file()
+        await send_command_log(interaction.client, interaction.user, "/jk market export", details=f"물품 {count}개")
+        await interaction.response.send_message(f"✅ 마켓 물품 {count}개를 `{MARKET_EXPORT_FILE}` 파일로 내보냈습니다.")
+
+    @market_group.command(name="import", description="market 폴더의 market.txt 형식 파일에서 물품 가져오기")
+    @app_commands.describe(filename="가져올 파일 이름 (기본: market.txt)")
+    async def jk_market_import(interaction: discord.Interaction, filename: str = MARKET_FILE):
+        if not _check_jk(interaction):
+            await interaction.response.send_message("❌ JK 역할이 필요합니다.", ephemeral=True)
+            return
+        file_lock = await get_file_lock("market.txt")
+        async with file_lock:
+            added, total = await import_market_file(filename)
+        if total == 0:
+            await interaction.response.send_message(f"❌ `{filename}` 파일이 없거나 물품이 없습니다.", ephemeral=True)
+            return
+        await send_command_log(interaction.client, interaction.user, "/jk market import", details=f"{filename}: {added}/{total}개")
+        await interaction.response.send_message(f"✅ `{filename}`에서 물품 {added}개를 가져왔습니다. (파일 {total}개 중 중복 코드 {total - added}개 제외)")
+
     study_group = app_commands.Group(name="study", description="스터디 관리", parent=jk_group)
 
     @study_group.command(name="add", description="스터디에 멤버 추가")
@@ -1109,21 +1190,9 @@ async def setup_slash_commands(bot: discord.Client):
             await interaction.response.send_message("❌ JK 역할이 필요합니다.", ephemeral=True)
             return
         await interaction.response.send_message("🔄 티어 시스템 재설정 중...")
-        users = await get_all_users_for_nickname_refresh()
-        updated = 0
-        for u in users:
-            guild = interaction.guild if u['guild_id'] == interaction.guild.id else interaction.client.get_guild(u['guild_id'])
-            if not guild:
-                continue
-            member = guild.get_member(u['user_id'])
-            if not member:
-                continue
-            success, old_t, new_t = await update_tier_role(member, u['level'])
-            if success and old_t != new_t:
-                updated += 1
-            await asyncio.sleep(0.05)
-        await send_command_log(interaction.client, interaction.user, "/jk reboot", details=f"{len(users)}명 중 {updated}명 티어 변경")
-        await interaction.followup.send(f"✅ 완료. {len(users)}명 중 {updated}명 티어 변경됨.")
+        stats = await reconcile_tier_roles(interaction.client)
+        await send_command_log(interaction.client, interaction.user, "/jk reboot", details=f"{stats['checked']}명 중 {stats['updated']}명 티어 변경")
+        await interaction.followup.send(f"✅ 완료. {stats['checked']}명 중 {stats['updated']}명 티어 변경됨." + (f" ({stats['failed']}명 실패)" if stats['failed'] else ""))
 
     debug_group = app_commands.Group(name="debug", description="디버그/상태 조회", parent=jk_group)
 
@@ -1137,6 +1206,18 @@ async def setup_slash_commands(bot: discord.Client):
         embed = discord.Embed(title="💻 시스템 리소스", color=discord.Color.blue())
         embed.add_field(name="CPU", value=f"{cpu:.1f}%", inline=True)
         embed.add_field(name="RAM", value=f"{mem.used / (1024**3):.2f} GB / {mem.total / (1024**3):.2f} GB", inline=True)
+        pool = get_pool_stats()
+        pool_lines = [
+            f"{role}: {s['acquires']:,}회 · 평균 대기 {s['wait_avg_ms']:.2f}ms · 최대 {s['wait_max_ms']:.1f}ms"
+            for role, s in pool.items()
+        ]
+        embed.add_field(name="DB 연결 풀", value="\n".join(pool_lines), inline=False)
+        cfg = config_registry.stats()
+        embed.add_field(
+            name="설정 캐시",
+            value=f"적중 {cfg['hits']:,}회 · 미스 {cfg['misses']:,}회 · 적중률 {cfg['hit_rate'] * 100:.1f}%",
+            inline=False,
+        )
         await interaction.response.send_message(embed=embed)
 
     @debug_group.command(name="exp", description="현재 시간대·각 보이스 채널별 경험치 활성화 여부")
@@ -1207,14 +1288,10 @@ async def setup_slash_commands(bot: discord.Client):
                 sess = active_sessions.get(member.id)
                 if sess and sess.get('channel_id') == channel_id:
                     join_t = sess['join_time']
-                    dur = datetime.now() - join_t
+                    now = datetime.now()
+                    dur = now - join_t
                     dur_m = int(dur.total_seconds() / 60)
-                    earned = 0
-                    t = join_t + timedelta(minutes=interval_min)
-                    while t <= datetime.now():
-                        if start_h <= t.hour < end_h:
-                            earned += exp_amt
-                        t += timedelta(minutes=interval_min)
+                    earned = compute_accrued_exp(join_t, join_t, now, interval_min, exp_amt, start_h, end_h)
                     lines.append(f"{member.display_name}: {dur_m}분 / {earned}exp")
                 else:
                     lines.append(f"{member.display_name}: 0분 / 0exp")
@@ -8,6 +8,10 @@ EXP_PER_MINUTE = 1  # 1분당 1 exp (기본값, voice_channel_exp.txt에 설정
 # 하위 호환성을 위해 빈 딕셔너리로 유지합니다.
 VOICE_CHANNEL_EXP = {}
 
+# 설정 파일(level_ranges.txt, tier_roles.txt, voice_channel_exp.txt) 변경 확인 간격 (초 단위)
+# 이 간격 안에서는 메모리 캐시를 그대로 사용하고, 지나면 파일 mtime/크기만 확인
+CONFIG_RECHECK_INTERVAL = 5
+
 # 레벨업 설정
 # 각 구간별로 1레벨업에 필요한 시간(분)과 포인트를 직접 지정
 # 형식: (시작레벨, 끝레벨): (레벨업_시간_분, 레벨업_포인트)
@@ -58,9 +62,23 @@ LEVEL_RANGES = get_level_ranges()
 # 닉네임 설정
 NICKNAME_FORMAT = "[Lv.{level}] {original_nickname}"  # 레벨 표시 형식
 NICKNAME_REFRESH_INTERVAL = 3600  # 1시간 (초 단위)
+# 티어 역할 일괄 동기화 속도 (초당 역할 변경 요청 수, 순간 최대 TIER_SYNC_BURST개)
+TIER_SYNC_RATE = 5
+TIER_SYNC_BURST = 5
+# 마켓 구매 대기열 (물품별 워커가 모인 구매를 한 트랜잭션으로 처리)
+MARKET_PURCHASE_TIMEOUT = 2.0  # 대기열에서 처리 시작을 기다리는 제한 (초, 넘으면 구매하지 않음)
+MARKET_PURCHASE_WRITE_TIMEOUT = 30.0  # 처리가 시작된 구매의 DB 반영을 기다리는 제한 (초)
+MARKET_PURCHASE_BATCH = 50  # 한 번에 처리할 최대 구매 수
 
 # 음성채널 체크 주기
 VOICE_CHECK_INTERVAL = 60  # 1분마다 exp 체크 (초 단위)
+VOICE_SCHEDULER_RESOLUTION = 5  # 음성 EXP 지급 시점 묶음 단위 (초 단위, 같은 슬롯 사용자는 한 번에 처리)
+EXP_FLUSH_INTERVAL = 10  # 음성 EXP 버퍼를 DB에 일괄 반영하는 주기 (초 단위)
+# 음성 EXP 적립 방식
+# "tick": 지급 주기마다 스케줄러가 깨어나 지급
+# "lazy": 입장 시각 기준으로 경과 시간만큼 한 번에 계산 (퇴장·레벨 조회·주기적 정산 시점)
+VOICE_EXP_ACCRUAL_MODE = "tick"
+VOICE_SESSION_CHECKPOINT_INTERVAL = 60  # 음성 세션 체크포인트 주기 (초 단위, lazy 모드 정산 포함)
 
 # Slash 명령어 동기화 (개발 시 길드 ID 지정하면 빠른 반영, None이면 글로벌 동기화)
 SLASH_SYNC_GUILD_ID = None  # 예: 1234567890123456789
@@ -0,0 +1,109 @@
+# config_registry.py - 설정 txt 파일 메모리 캐시 (mtime+size 검증)
+
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class _Entry:
+    __slots__ = ('path', 'loader', 'value', 'signature', 'checked_at', 'version', 'loaded')
+
+    def __init__(self, path: str, loader: Callable[[], Any]):
+        self.path = path
+        self.loader = loader
+        self.value = None
+        self.signature: Optional[Tuple[int, int]] = None
+        self.checked_at = 0.0
+        self.version = 0
+        self.loaded = False
+
+
+class ConfigRegistry:
+    """
+    설정 파일을 한 번만 파싱해 메모리에 보관
+    - recheck_interval(초)이 지나면 os.stat 한 번으로 (mtime, size)를 비교해 바뀌었을 때만 다시 파싱
+    - 저장 함수는 invalidate(name)로 즉시 무효화
+    - version(name)은 다시 파싱할 때마다 증가 (파생 캐시 무효화용)
+    """
+
+    def __init__(self, recheck_interval: Optional[float] = None):
+        # None이면 첫 조회 때 config.CONFIG_RECHECK_INTERVAL 사용 (config 로드 중 순환 import 방지)
+        self.recheck_interval = recheck_interval
+        self._entries: Dict[str, _Entry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name: str, path: str, loader: Callable[[], Any]):
+        """설정 파일 등록. loader는 파일을 파싱해 값을 반환하는 함수"""
+        self._entries[name] = _Entry(path, loader)
+
+    def _interval(self) -> float:
+        if self.recheck_interval is None:
+            from config import CONFIG_RECHECK_INTERVAL
+            self.recheck_interval = CONFIG_RECHECK_INTERVAL
+        return self.recheck_interval
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self, name: str) -> Tuple[_Entry, bool]:
+        """Returns: (항목, 이번에 다시 파싱했는지)"""
+        entry = self._entries[name]
+        now = time.monotonic()
+        if entry.loaded and now - entry.checked_at < self._interval():
+            return entry, False
+        signature = self._stat(entry.path)
+        entry.checked_at = now
+        if entry.loaded and signature is not None and signature == entry.signature:
+            return entry, False
+        entry.value = entry.loader()
+        # loader가 파일을 새로 만들 수 있으므로 파싱 후 다시 stat
+        entry.signature = self._stat(entry.path)
+        entry.version += 1
+        entry.loaded = True
+        return entry, True
+
+    def _lookup(self, name: str) -> Any:
+        # 적중/미스는 값을 돌려줄 때만 집계 (version 확인은 제외)
+        entry, reloaded = self._refresh(name)
+        if reloaded:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry.value
+
+    def get(self, name: str) -> Any:
+        """설정 값의 복사본 (호출자가 수정해도 캐시에 영향 없음)"""
+        return dict(self._lookup(name))
+
+    def peek(self, name: str) -> Any:
+        """캐시된 설정 값 자체 (읽기 전용으로만 사용)"""
+        return self._lookup(name)
+
+    def version(self, name: str) -> int:
+        """설정 값 버전 (파일이 다시 파싱될 때마다 증가)"""
+        return self._refresh(name)[0].version
+
+    def invalidate(self, name: Optional[str] = None):
+        """다음 조회 시 다시 파싱 (name이 None이면 전체)"""
+        targets = self._entries.values() if name is None else [self._entries[name]]
+        for entry in targets:
+            entry.loaded = False
+
+    def stats(self) -> dict:
+        """캐시 적중/미스 횟수 (get/peek 조회 기준)"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0,
+            'files': {name: entry.version for name, entry in self._entries.items()},
+        }
+
+
+registry = ConfigRegistry()
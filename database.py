@@ -1,26 +1,201 @@
 # database.py - 데이터베이스 관리 (SQLite)
 
 import os
+import time
+import asyncio
 import sqlite3
 import aiosqlite
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional, List
 
+import leaderboard_index
+
 # SQLite DB 경로 (.env 또는 기본값 k_bot.db)
 DB_PATH = os.getenv("SQLITE_DB", "k_bot.db")
+# 읽기 전용 연결 수 (쓰기 연결은 항상 1개)
+DB_POOL_READERS = int(os.getenv("SQLITE_POOL_READERS", "2"))
 
 
-async def _get_connection():
-    """SQLite 연결 생성 (row_factory=Row로 dict처럼 접근 가능)"""
-    conn = await aiosqlite.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+class _PooledConnection:
+    """풀에서 빌린 연결. close()는 실제로 닫지 않고 풀에 반납 (기존 호출 코드 호환)"""
 
+    def __init__(self, pool, conn, is_writer: bool):
+        self._pool = pool
+        self._conn = conn
+        self._is_writer = is_writer
+        self._released = False
 
-async def init_database():
-    """데이터베이스 초기화 및 테이블 생성"""
-    conn = await _get_connection()
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    async def close(self):
+        """풀에 반납 (커밋되지 않은 변경은 롤백)"""
+        if self._released:
+            return
+        self._released = True
+        await self._pool._release(self._conn, self._is_writer)
+
+
+class _ConnectionPool:
+    """
+    장기 유지 SQLite 연결 풀 (쓰기 1개 + 읽기 N개, 각 연결은 자체 aiosqlite 워커 스레드)
+    WAL 모드로 열어 읽기 연결이 쓰기 트랜잭션에 막히지 않도록 함
+    """
+
+    def __init__(self, path: str, readers: int):
+        self.path = path
+        self.reader_count = max(1, readers)
+        self._writer = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: Optional[asyncio.Queue] = None
+        self._all_readers: list = []
+        self._open_lock = asyncio.Lock()
+        self._stats = {
+            'writer': {'acquires': 0, 'wait_total': 0.0, 'wait_max': 0.0},
+            'reader': {'acquires': 0, 'wait_total': 0.0, 'wait_max': 0.0},
+        }
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, read_only: bool):
+        """SQLite 연결 생성 (row_factory=Row로 dict처럼 접근 가능)"""
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA synchronous=NORMAL")
+        await conn.execute("PRAGMA busy_timeout=5000")
+        if read_only:
+            await conn.execute("PRAGMA query_only=1")
+        return conn
+
+    async def open(self):
+        """연결 풀 시작 (이미 열려 있으면 무시)"""
+        async with self._open_lock:
+            if self.is_open:
+                return
+            writer = await self._connect(read_only=False)
+            readers = asyncio.Queue()
+            all_readers = []
+            try:
+                for _ in range(self.reader_count):
+                    conn = await self._connect(read_only=True)
+                    all_readers.append(conn)
+                    readers.put_nowait(conn)
+            except Exception:
+                for conn in all_readers:
+                    await conn.close()
+                await writer.close()
+                raise
+            self._readers = readers
+            self._all_readers = all_readers
+            self._writer = writer
+            print(f"[Database] Connection pool opened (writer 1, readers {self.reader_count})")
+
+    async def close(self):
+        """연결 풀 종료 (사용 중인 쓰기 트랜잭션이 끝날 때까지 대기)"""
+        async with self._open_lock:
+            if not self.is_open:
+                return
+            async with self._writer_lock:
+                writer, self._writer = self._writer, None
+                await writer.close()
+            for conn in self._all_readers:
+                await conn.close()
+            self._all_readers = []
+            self._readers = None
+            print("[Database] Connection pool closed")
+
+    def _record_wait(self, role: str, waited: float):
+        s = self._stats[role]
+        s['acquires'] += 1
+        s['wait_total'] += waited
+        if waited > s['wait_max']:
+            s['wait_max'] = waited
+
+    async def acquire_writer(self) -> _PooledConnection:
+        if not self.is_open:
+            await self.open()
+        started = time.perf_counter()
+        await self._writer_lock.acquire()
+        if self._writer is None:
+            self._writer_lock.release()
+            raise RuntimeError("Connection pool is closed")
+        self._record_wait('writer', time.perf_counter() - started)
+        return _PooledConnection(self, self._writer, True)
+
+    async def acquire_reader(self) -> _PooledConnection:
+        if not self.is_open:
+            await self.open()
+        started = time.perf_counter()
+        conn = await self._readers.get()
+        self._record_wait('reader', time.perf_counter() - started)
+        return _PooledConnection(self, conn, False)
+
+    async def _release(self, conn, is_writer: bool):
+        if is_writer:
+            try:
+                if conn.in_transaction:
+                    await conn.rollback()
+            finally:
+                self._writer_lock.release()
+        else:
+            if conn in self._all_readers:
+                self._readers.put_nowait(conn)
+
+    def stats(self) -> dict:
+        """역할별 대기 시간 통계 (ms)"""
+        result = {}
+        for role, s in self._stats.items():
+            acquires = s['acquires']
+            result[role] = {
+                'acquires': acquires,
+                'wait_avg_ms': (s['wait_total'] / acquires * 1000) if acquires else 0.0,
+                'wait_max_ms': s['wait_max'] * 1000,
+                'wait_total_ms': s['wait_total'] * 1000,
+            }
+        return result
+
+
+_pool = _ConnectionPool(DB_PATH, DB_POOL_READERS)
+
+
+@asynccontextmanager
+async def _write_connection():
+    """쓰기 연결 (단일 연결을 직렬화해서 사용, 호출자가 commit)"""
+    conn = await _pool.acquire_writer()
     try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+@asynccontextmanager
+async def _read_connection():
+    """읽기 전용 연결"""
+    conn = await _pool.acquire_reader()
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+async def close_database():
+    """연결 풀 종료 (봇 종료 시 호출)"""
+    await _pool.close()
+
+
+def get_pool_stats() -> dict:
+    """연결 풀 대기 시간 통계 반환 {'writer': {...}, 'reader': {...}}"""
+    return _pool.stats()
+
+
+async def init_database():
+    """데이터베이스 초기화, 테이블 생성 및 연결 풀 시작"""
+    await _pool.open()
+    async with _write_connection() as conn:
         await conn.executescript("""
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER NOT NULL,
@@ -42,7 +217,8 @@ async def init_database():
                 channel_id INTEGER NOT NULL,
                 join_time TEXT NOT NULL,
                 leave_time TEXT,
-                exp_earned INTEGER DEFAULT 0
+                exp_earned INTEGER DEFAULT 0,
+                checkpoint_time TEXT
             );
 
             CREATE TABLE IF NOT EXISTS guild_settings (
@@ -74,10 +250,68 @@ async def init_database():
             );
             CREATE INDEX IF NOT EXISTS idx_server_fees_guild_id ON server_fees (guild_id);
             CREATE INDEX IF NOT EXISTS idx_server_fees_created_at ON server_fees (created_at);
+
+            CREATE TABLE IF NOT EXISTS migrations (
+                name TEXT PRIMARY KEY,
+                applied_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS exp_ignore (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, user_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS market_items (
+                item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT NOT NULL COLLATE NOCASE,
+                name TEXT NOT NULL,
+                is_role INTEGER NOT NULL DEFAULT 0,
+                role_name TEXT,
+                draw_count INTEGER NOT NULL DEFAULT 1,
+                max_purchase INTEGER NOT NULL DEFAULT 1,
+                price INTEGER NOT NULL DEFAULT 0,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                tickets_sold INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_market_items_code ON market_items (code);
+
+            CREATE TABLE IF NOT EXISTS market_tickets (
+                ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_id INTEGER NOT NULL,
+                user_id INTEGER,
+                guild_id INTEGER,
+                user_name TEXT NOT NULL,
+                price INTEGER NOT NULL DEFAULT 0,
+                purchased_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_market_tickets_item_user ON market_tickets (item_id, user_id);
+
+            CREATE TABLE IF NOT EXISTS market_draws (
+                draw_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_id INTEGER NOT NULL,
+                item_code TEXT NOT NULL,
+                seed TEXT NOT NULL,
+                draw_count INTEGER NOT NULL,
+                pool_size INTEGER NOT NULL,
+                total_tickets INTEGER NOT NULL,
+                pool TEXT NOT NULL,
+                winners TEXT NOT NULL,
+                drawn_by INTEGER,
+                drawn_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_market_draws_item ON market_draws (item_id);
         """)
+        # 기존 DB 마이그레이션: 음성 세션 체크포인트 컬럼
+        cursor = await conn.execute("PRAGMA table_info(voice_sessions)")
+        columns = {row['name'] for row in await cursor.fetchall()}
+        if 'checkpoint_time' not in columns:
+            await conn.execute("ALTER TABLE voice_sessions ADD COLUMN checkpoint_time TEXT")
+        await conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_voice_sessions_open ON voice_sessions (guild_id) WHERE leave_time IS NULL"
+        )
         await conn.commit()
-    finally:
-        await conn.close()
 
 
 def _dt(val):
@@ -91,22 +325,18 @@ def _dt(val):
 
 async def get_user(user_id: int, guild_id: int) -> Optional[dict]:
     """사용자 데이터 조회"""
-    conn = await _get_connection()
-    try:
+    async with _read_connection() as conn:
         cursor = await conn.execute(
             "SELECT * FROM users WHERE user_id = ? AND guild_id = ?",
             (user_id, guild_id)
         )
         row = await cursor.fetchone()
         return dict(row) if row else None
-    finally:
-        await conn.close()
 
 
 async def create_user(user_id: int, guild_id: int) -> dict:
     """새 사용자 생성"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         now = _dt(datetime.now())
         await conn.execute(
             """INSERT INTO users 
@@ -115,8 +345,7 @@ async def create_user(user_id: int, guild_id: int) -> dict:
             (user_id, guild_id, now)
         )
         await conn.commit()
-    finally:
-        await conn.close()
+    leaderboard_index.note_user(guild_id, user_id)
     return (await get_user(user_id, guild_id))
 
 
@@ -131,27 +360,24 @@ async def get_or_create_user(user_id: int, guild_id: int) -> dict:
 async def update_user_exp(user_id: int, guild_id: int, exp: int, total_exp: int, cursor=None):
     """사용자 exp 업데이트 (cursor가 있으면 트랜잭션 내 실행, 호출자가 commit)"""
     if cursor is None:
-        conn = await _get_connection()
-        try:
+        async with _write_connection() as conn:
             await conn.execute(
                 "UPDATE users SET exp = ?, total_exp = ? WHERE user_id = ? AND guild_id = ?",
                 (exp, total_exp, user_id, guild_id)
             )
             await conn.commit()
-        finally:
-            await conn.close()
     else:
         await cursor.execute(
             "UPDATE users SET exp = ?, total_exp = ? WHERE user_id = ? AND guild_id = ?",
             (exp, total_exp, user_id, guild_id)
         )
+    leaderboard_index.note_user(guild_id, user_id, exp=exp, total_exp=total_exp)
 
 
 async def update_user_level(user_id: int, guild_id: int, level: int, exp: int, points: int, total_exp: int, cursor=None):
     """사용자 레벨, exp, 포인트, 총 exp 업데이트 (cursor가 있으면 트랜잭션 내 실행, 호출자가 commit)"""
     if cursor is None:
-        conn = await _get_connection()
-        try:
+        async with _write_connection() as conn:
             await conn.execute(
                 """UPDATE users 
                    SET level = ?, exp = ?, points = ?, total_exp = ?
@@ -159,8 +385,6 @@ async def update_user_level(user_id: int, guild_id: int, level: int, exp: int, p
                 (level, exp, points, total_exp, user_id, guild_id)
             )
             await conn.commit()
-        finally:
-            await conn.close()
     else:
         await cursor.execute(
             """UPDATE users 
@@ -168,51 +392,43 @@ async def update_user_level(user_id: int, guild_id: int, level: int, exp: int, p
                WHERE user_id = ? AND guild_id = ?""",
             (level, exp, points, total_exp, user_id, guild_id)
         )
+    leaderboard_index.note_user(guild_id, user_id, level=level, exp=exp, points=points, total_exp=total_exp)
 
 
 async def update_user_points(user_id: int, guild_id: int, points: int):
     """사용자 포인트 업데이트"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         await conn.execute(
             "UPDATE users SET points = ? WHERE user_id = ? AND guild_id = ?",
             (points, user_id, guild_id)
         )
         await conn.commit()
-    finally:
-        await conn.close()
+    leaderboard_index.note_user(guild_id, user_id, points=points)
 
 
 async def update_last_voice_join(user_id: int, guild_id: int):
     """마지막 음성채널 입장 시간 업데이트"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         await conn.execute(
             "UPDATE users SET last_voice_join = ? WHERE user_id = ? AND guild_id = ?",
             (_dt(datetime.now()), user_id, guild_id)
         )
         await conn.commit()
-    finally:
-        await conn.close()
 
 
 async def update_last_nickname_update(user_id: int, guild_id: int):
     """마지막 닉네임 업데이트 시간 기록"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         await conn.execute(
             "UPDATE users SET last_nickname_update = ? WHERE user_id = ? AND guild_id = ?",
             (_dt(datetime.now()), user_id, guild_id)
         )
         await conn.commit()
-    finally:
-        await conn.close()
 
 
 async def create_voice_session(user_id: int, guild_id: int, channel_id: int) -> int:
     """음성 세션 생성"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         cursor = await conn.execute(
             """INSERT INTO voice_sessions (user_id, guild_id, channel_id, join_time)
                VALUES (?, ?, ?, ?)""",
@@ -221,14 +437,11 @@ async def create_voice_session(user_id: int, guild_id: int, channel_id: int) ->
         session_id = cursor.lastrowid
         await conn.commit()
         return session_id
-    finally:
-        await conn.close()
 
 
 async def end_voice_session(session_id: int, exp_earned: int):
     """음성 세션 종료"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         await conn.execute(
             """UPDATE voice_sessions 
                SET leave_time = ?, exp_earned = ?
@@ -236,98 +449,103 @@ async def end_voice_session(session_id: int, exp_earned: int):
             (_dt(datetime.now()), exp_earned, session_id)
         )
         await conn.commit()
-    finally:
-        await conn.close()
 
 
-async def get_leaderboard_by_points(guild_id: int, limit: int = 10) -> List[dict]:
-    """포인트 기준 리더보드"""
-    conn = await _get_connection()
-    try:
-        cursor = await conn.execute(
-            """SELECT user_id, level, exp, points, total_exp
-               FROM users
-               WHERE guild_id = ?
-               ORDER BY points DESC, level DESC, total_exp DESC
-               LIMIT ?""",
-            (guild_id, limit)
+async def checkpoint_voice_sessions(checkpoints: List[tuple]):
+    """
+    진행 중인 음성 세션 상태 일괄 저장 (한 트랜잭션)
+    checkpoints: [(session_id, exp_earned), ...]
+    """
+    if not checkpoints:
+        return
+    now = _dt(datetime.now())
+    async with _write_connection() as conn:
+        await conn.executemany(
+            """UPDATE voice_sessions
+               SET exp_earned = ?, checkpoint_time = ?
+               WHERE session_id = ? AND leave_time IS NULL""",
+            [(exp_earned, now, session_id) for session_id, exp_earned in checkpoints]
         )
-        rows = await cursor.fetchall()
-        return [dict(r) for r in rows]
-    finally:
-        await conn.close()
+        await conn.commit()
 
 
-async def get_leaderboard_by_level(guild_id: int, limit: int = 10) -> List[dict]:
-    """레벨 기준 리더보드"""
-    conn = await _get_connection()
-    try:
+async def get_open_voice_sessions() -> List[dict]:
+    """종료 기록이 없는 음성 세션 목록 (재시작 복구용)"""
+    async with _read_connection() as conn:
         cursor = await conn.execute(
-            """SELECT user_id, level, exp, points, total_exp
-               FROM users
-               WHERE guild_id = ?
-               ORDER BY level DESC, exp DESC, points DESC
-               LIMIT ?""",
-            (guild_id, limit)
+            """SELECT session_id, user_id, guild_id, channel_id, join_time, exp_earned, checkpoint_time
+               FROM voice_sessions WHERE leave_time IS NULL"""
         )
-        rows = await cursor.fetchall()
-        return [dict(r) for r in rows]
-    finally:
-        await conn.close()
+        return [dict(row) for row in await cursor.fetchall()]
 
 
-async def get_user_rank_by_points(user_id: int, guild_id: int) -> int:
-    """사용자의 포인트 기준 순위"""
-    conn = await _get_connection()
-    try:
+async def close_dangling_voice_sessions(keep_session_ids: List[int]) -> int:
+    """
+    keep_session_ids를 제외한 미종료 세션을 한 번에 종료 (퇴장 시각 = 마지막 체크포인트, 없으면 입장 시각)
+    Returns: 종료된 세션 수
+    """
+    placeholders = ",".join("?" * len(keep_session_ids))
+    exclude = f" AND session_id NOT IN ({placeholders})" if keep_session_ids else ""
+    async with _write_connection() as conn:
         cursor = await conn.execute(
-            """SELECT COUNT(*) + 1 as rank
-               FROM users
-               WHERE guild_id = ? AND (
-                   points > (SELECT points FROM users WHERE user_id = ? AND guild_id = ?)
-                   OR (points = (SELECT points FROM users WHERE user_id = ? AND guild_id = ?)
-                       AND level > (SELECT level FROM users WHERE user_id = ? AND guild_id = ?))
-                   OR (points = (SELECT points FROM users WHERE user_id = ? AND guild_id = ?)
-                       AND level = (SELECT level FROM users WHERE user_id = ? AND guild_id = ?)
-                       AND total_exp > (SELECT total_exp FROM users WHERE user_id = ? AND guild_id = ?))
-               )""",
-            (guild_id, user_id, guild_id, user_id, guild_id, user_id, guild_id,
-             user_id, guild_id, user_id, guild_id, user_id, guild_id)
+            f"""UPDATE voice_sessions
+                SET leave_time = COALESCE(checkpoint_time, join_time)
+                WHERE leave_time IS NULL{exclude}""",
+            list(keep_session_ids)
         )
-        row = await cursor.fetchone()
-        return row[0] if row else 1
-    finally:
-        await conn.close()
+        await conn.commit()
+        return cursor.rowcount
+
+
+_leaderboard_load_lock = asyncio.Lock()
+
+
+async def _get_leaderboard(guild_id: int) -> leaderboard_index.GuildLeaderboard:
+    """길드 순위 인덱스 (처음 조회 시 DB에서 한 번 로드, 이후 쓰기 시 증분 갱신)"""
+    board = leaderboard_index.get_loaded(guild_id)
+    if board is not None:
+        return board
+    async with _leaderboard_load_lock:
+        board = leaderboard_index.get_loaded(guild_id)
+        if board is not None:
+            return board
+        leaderboard_index.begin_load(guild_id)
+        try:
+            async with _read_connection() as conn:
+                cursor = await conn.execute(
+                    "SELECT user_id, level, exp, points, total_exp FROM users WHERE guild_id = ?",
+                    (guild_id,)
+                )
+                rows = {r[0]: (r[1], r[2], r[3], r[4]) for r in await cursor.fetchall()}
+        except Exception:
+            leaderboard_index.abort_load(guild_id)
+            raise
+        return leaderboard_index.finish_load(guild_id, rows)
+
+
+async def get_leaderboard_by_points(guild_id: int, limit: int = 10) -> List[dict]:
+    """포인트 기준 리더보드 (points DESC, level DESC, total_exp DESC)"""
+    return (await _get_leaderboard(guild_id)).top_by_points(limit)
+
+
+async def get_leaderboard_by_level(guild_id: int, limit: int = 10) -> List[dict]:
+    """레벨 기준 리더보드 (level DESC, exp DESC, points DESC)"""
+    return (await _get_leaderboard(guild_id)).top_by_level(limit)
+
+
+async def get_user_rank_by_points(user_id: int, guild_id: int) -> int:
+    """사용자의 포인트 기준 순위 (동점은 같은 순위)"""
+    return (await _get_leaderboard(guild_id)).rank_by_points(user_id)
 
 
 async def get_user_rank_by_level(user_id: int, guild_id: int) -> int:
-    """사용자의 레벨 기준 순위"""
-    conn = await _get_connection()
-    try:
-        cursor = await conn.execute(
-            """SELECT COUNT(*) + 1 as rank
-               FROM users
-               WHERE guild_id = ? AND (
-                   level > (SELECT level FROM users WHERE user_id = ? AND guild_id = ?)
-                   OR (level = (SELECT level FROM users WHERE user_id = ? AND guild_id = ?)
-                       AND exp > (SELECT exp FROM users WHERE user_id = ? AND guild_id = ?))
-                   OR (level = (SELECT level FROM users WHERE user_id = ? AND guild_id = ?)
-                       AND exp = (SELECT exp FROM users WHERE user_id = ? AND guild_id = ?)
-                       AND points > (SELECT points FROM users WHERE user_id = ? AND guild_id = ?))
-               )""",
-            (guild_id, user_id, guild_id, user_id, guild_id, user_id, guild_id,
-             user_id, guild_id, user_id, guild_id, user_id, guild_id)
-        )
-        row = await cursor.fetchone()
-        return row[0] if row else 1
-    finally:
-        await conn.close()
+    """사용자의 레벨 기준 순위 (동점은 같은 순위)"""
+    return (await _get_leaderboard(guild_id)).rank_by_level(user_id)
 
 
 async def get_all_users_for_nickname_refresh(guild_id: Optional[int] = None) -> List[dict]:
     """닉네임 새로고침을 위한 모든 사용자 조회"""
-    conn = await _get_connection()
-    try:
+    async with _read_connection() as conn:
         if guild_id:
             cursor = await conn.execute(
                 "SELECT user_id, guild_id, level FROM users WHERE guild_id = ?",
@@ -337,56 +555,102 @@ async def get_all_users_for_nickname_refresh(guild_id: Optional[int] = None) ->
             cursor = await conn.execute("SELECT user_id, guild_id, level FROM users")
         rows = await cursor.fetchall()
         return [dict(r) for r in rows]
-    finally:
-        await conn.close()
+
+
+async def get_users_exp_chunk(after_rowid: int = 0, limit: int = 5000) -> List[tuple]:
+    """
+    users 테이블을 rowid 순으로 나눠 조회 (전체 재계산용 스트리밍)
+    Returns: [(rowid, user_id, guild_id, level, exp, total_exp), ...] - 마지막 rowid를 다음 after_rowid로 전달
+    """
+    async with _read_connection() as conn:
+        cursor = await conn.execute(
+            """SELECT rowid, user_id, guild_id, level, exp, total_exp FROM users
+               WHERE rowid > ? ORDER BY rowid LIMIT ?""",
+            (after_rowid, limit)
+        )
+        rows = await cursor.fetchall()
+    return [tuple(r) for r in rows]
+
+
+async def apply_user_level_changes(changes: List[tuple]) -> int:
+    """
+    (user_id, guild_id, level, exp, expected_total_exp) 목록을 한 트랜잭션으로 반영
+    조회 이후 total_exp가 바뀐 사용자는 건너뜀 (그 사이 EXP 지급이 이미 레벨을 다시 계산함)
+    Returns: 실제로 갱신된 행 수
+    """
+    if not changes:
+        return 0
+    async with _write_connection() as conn:
+        before = conn.total_changes
+        await conn.executemany(
+            """UPDATE users SET level = ?, exp = ?
+               WHERE user_id = ? AND guild_id = ? AND total_exp = ?""",
+            [(level, exp, user_id, guild_id, total_exp)
+             for user_id, guild_id, level, exp, total_exp in changes]
+        )
+        updated = conn.total_changes - before
+        await conn.commit()
+    for guild_id in {change[1] for change in changes}:
+        leaderboard_index.invalidate(guild_id)
+    return updated
 
 
 async def initialize_all_members(guilds) -> dict:
     """
     모든 서버의 모든 멤버를 데이터베이스에 초기화
+    INSERT OR IGNORE를 executemany로 한 트랜잭션에서 실행 (멤버 수와 관계없이 연결·커밋 1회)
     Returns: {'created': int, 'skipped': int}
     """
-    created = 0
-    skipped = 0
+    pairs = []
+    guild_ids = []
     for guild in guilds:
         if guild is None:
             continue
         try:
-            for member in guild.members:
-                if member.bot:
-                    continue
-                user = await get_user(member.id, guild.id)
-                if user is None:
-                    await create_user(member.id, guild.id)
-                    created += 1
-                else:
-                    skipped += 1
+            pairs.extend((member.id, guild.id) for member in guild.members if not member.bot)
+            guild_ids.append(guild.id)
         except Exception as e:
             print(f"[Database] Error initializing members for {guild.name}: {e}")
-    return {'created': created, 'skipped': skipped}
+    if not pairs:
+        return {'created': 0, 'skipped': 0}
+    
+    now = _dt(datetime.now())
+    async with _write_connection() as conn:
+        before = conn.total_changes
+        await conn.executemany(
+            """INSERT OR IGNORE INTO users 
+               (user_id, guild_id, level, exp, points, total_exp, last_nickname_update)
+               VALUES (?, ?, 1, 0, 0, 0, ?)""",
+            [(user_id, guild_id, now) for user_id, guild_id in pairs]
+        )
+        created = conn.total_changes - before
+        await conn.commit()
+    
+    if created:
+        # 새로 추가된 사용자를 순위 인덱스에 반영하도록 다음 조회 시 다시 로드
+        for guild_id in guild_ids:
+            leaderboard_index.invalidate(guild_id)
+    return {'created': created, 'skipped': len(pairs) - created}
 
 
 async def get_market_enabled(guild_id: int) -> bool:
     """마켓 활성화 상태 조회 (기본값: True)"""
-    conn = await _get_connection()
-    try:
+    async with _read_connection() as conn:
         cursor = await conn.execute(
             "SELECT market_enabled FROM guild_settings WHERE guild_id = ?",
             (guild_id,)
         )
         row = await cursor.fetchone()
-        if row is None:
-            await set_market_enabled(guild_id, True)
-            return True
-        return bool(row[0])
-    finally:
-        await conn.close()
+    # 읽기 연결을 반납한 뒤 기본값 기록 (풀 연결 중첩 점유 방지)
+    if row is None:
+        await set_market_enabled(guild_id, True)
+        return True
+    return bool(row[0])
 
 
 async def set_market_enabled(guild_id: int, enabled: bool):
     """마켓 활성화 상태 설정"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         await conn.execute(
             """INSERT INTO guild_settings (guild_id, market_enabled)
                VALUES (?, ?)
@@ -394,17 +658,288 @@ async def set_market_enabled(guild_id: int, enabled: bool):
             (guild_id, 1 if enabled else 0, 1 if enabled else 0)
         )
         await conn.commit()
-    finally:
-        await conn.close()
+
+
+# ========== 일회성 마이그레이션 기록 ==========
+
+async def is_migration_applied(name: str) -> bool:
+    """일회성 마이그레이션(예전 파일 → DB)이 이미 실행됐는지 여부"""
+    async with _read_connection() as conn:
+        cursor = await conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,))
+        return await cursor.fetchone() is not None
+
+
+async def mark_migration_applied(name: str):
+    """일회성 마이그레이션 완료 기록 (원본 파일은 그대로 둠)"""
+    async with _write_connection() as conn:
+        await conn.execute(
+            "INSERT OR IGNORE INTO migrations (name, applied_at) VALUES (?, ?)",
+            (name, _dt(datetime.now()))
+        )
+        await conn.commit()
+
+
+# ========== EXP 지급 제외 ==========
+
+async def get_all_exp_ignores() -> List[tuple]:
+    """EXP 지급 제외 목록 전체 [(guild_id, user_id), ...]"""
+    async with _read_connection() as conn:
+        cursor = await conn.execute("SELECT guild_id, user_id FROM exp_ignore")
+        return [(row[0], row[1]) for row in await cursor.fetchall()]
+
+
+async def set_exp_ignored(guild_id: int, user_id: int, ignored: bool):
+    """EXP 지급 제외 설정/해제"""
+    async with _write_connection() as conn:
+        if ignored:
+            await conn.execute(
+                "INSERT OR IGNORE INTO exp_ignore (guild_id, user_id) VALUES (?, ?)",
+                (guild_id, user_id)
+            )
+        else:
+            await conn.execute(
+                "DELETE FROM exp_ignore WHERE guild_id = ? AND user_id = ?",
+                (guild_id, user_id)
+            )
+        await conn.commit()
+
+
+async def import_exp_ignores(pairs: List[tuple]) -> int:
+    """EXP 지급 제외 목록 일괄 추가 (마이그레이션용). Returns: 새로 추가된 수"""
+    if not pairs:
+        return 0
+    async with _write_connection() as conn:
+        before = conn.total_changes
+        await conn.executemany(
+            "INSERT OR IGNORE INTO exp_ignore (guild_id, user_id) VALUES (?, ?)",
+            pairs
+        )
+        added = conn.total_changes - before
+        await conn.commit()
+        return added
+
+
+# ========== 마켓 함수들 ==========
+
+async def get_market_rows() -> tuple:
+    """
+    마켓 물품과 티켓 전체 조회 (시작 시 메모리 카탈로그 로드용)
+    Returns: (물품 dict 목록 [item_id 순], 티켓 (item_id, user_id, user_name) 목록 [구매 순])
+    """
+    async with _read_connection() as conn:
+        cursor = await conn.execute(
+            """SELECT item_id, code, name, is_role, role_name, draw_count, max_purchase,
+                      price, quantity, tickets_sold
+               FROM market_items ORDER BY item_id"""
+        )
+        items = [dict(row) for row in await cursor.fetchall()]
+        cursor = await conn.execute(
+            "SELECT item_id, user_id, user_name FROM market_tickets ORDER BY ticket_id"
+        )
+        tickets = [tuple(row) for row in await cursor.fetchall()]
+        return items, tickets
+
+
+async def insert_market_item(code: str, name: str, is_role: bool, role_name: Optional[str],
+                             draw_count: int, max_purchase: int, price: int, quantity: int) -> Optional[int]:
+    """마켓 물품 추가. Returns: item_id (같은 코드가 이미 있으면 None)"""
+    async with _write_connection() as conn:
+        cursor = await conn.execute(
+            """INSERT OR IGNORE INTO market_items
+               (code, name, is_role, role_name, draw_count, max_purchase, price, quantity, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (code, name, int(is_role), role_name, draw_count, max_purchase, price, quantity,
+             _dt(datetime.now()))
+        )
+        item_id = cursor.lastrowid if cursor.rowcount > 0 else None
+        await conn.commit()
+        return item_id
+
+
+async def delete_market_item(item_id: int) -> bool:
+    """마켓 물품과 해당 티켓 삭제"""
+    async with _write_connection() as conn:
+        await conn.execute("DELETE FROM market_tickets WHERE item_id = ?", (item_id,))
+        cursor = await conn.execute("DELETE FROM market_items WHERE item_id = ?", (item_id,))
+        await conn.commit()
+        return cursor.rowcount > 0
+
+
+async def clear_market_items() -> int:
+    """마켓 물품과 티켓 전체 삭제. Returns: 삭제된 물품 수"""
+    async with _write_connection() as conn:
+        await conn.execute("DELETE FROM market_tickets")
+        cursor = await conn.execute("DELETE FROM market_items")
+        await conn.commit()
+        return cursor.rowcount
+
+
+async def import_market_items(items: List[dict]) -> int:
+    """
+    market.txt에서 읽은 물품과 구매자 명단 일괄 추가 (한 트랜잭션, 이미 있는 코드는 건너뜀)
+    items: [{'code', 'name', 'is_role', 'role_name', 'draw_count', 'max_purchase', 'price',
+             'quantity', 'tickets_sold', 'buyers': [이름, ...]}, ...]
+    예전 파일에는 user_id가 없으므로 티켓은 이름만 기록
+    Returns: 새로 추가된 물품 수
+    """
+    now = _dt(datetime.now())
+    added = 0
+    async with _write_connection() as conn:
+        for item in items:
+            cursor = await conn.execute(
+                """INSERT OR IGNORE INTO market_items
+                   (code, name, is_role, role_name, draw_count, max_purchase, price, quantity,
+                    tickets_sold, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (item['code'], item['name'], int(item['is_role']), item['role_name'], item['draw_count'],
+                 item['max_purchase'], item['price'], item['quantity'], item['tickets_sold'], now)
+            )
+            if cursor.rowcount == 0:
+                continue
+            item_id = cursor.lastrowid
+            await conn.executemany(
+                """INSERT INTO market_tickets (item_id, user_name, price, purchased_at)
+                   VALUES (?, ?, ?, ?)""",
+                [(item_id, name, item['price'], now) for name in item['buyers']]
+            )
+            added += 1
+        await conn.commit()
+    return added
+
+
+async def assign_legacy_market_tickets(assignments: List[tuple]) -> int:
+    """
+    이름만 있는 티켓(user_id 없음)에 사용자 연결 (한 트랜잭션)
+    assignments: [(user_id, guild_id, item_id, user_name), ...]
+    Returns: 연결된 티켓 수
+    """
+    if not assignments:
+        return 0
+    async with _write_connection() as conn:
+        before = conn.total_changes
+        await conn.executemany(
+            """UPDATE market_tickets SET user_id = ?, guild_id = ?
+               WHERE item_id = ? AND user_name = ? AND user_id IS NULL""",
+            assignments
+        )
+        updated = conn.total_changes - before
+        await conn.commit()
+        return updated
+
+
+async def purchase_market_tickets(item_id: int, purchases: List[tuple]) -> Optional[List[Optional[tuple]]]:
+    """
+    같은 물품 티켓 여러 장 구매 (한 트랜잭션, 커밋 1회)
+    사용자마다 조건부 INSERT로 티켓 기록 → 포인트 차감 → 판매 수 증가
+    INSERT 조건: 남은 수량(quantity 0은 무제한), 1인당 구매 수(역할은 1장), 포인트 >= 가격
+    (메모리 검증과 별개로 DB에서 다시 확인하므로 카탈로그 재로드 중이거나 다른 프로세스가 있어도 초과 판매 없음)
+    purchases: [(user_id, guild_id, user_name, price), ...]
+    Returns: 입력 순서대로 (ticket_id, 차감 후 포인트), 조건을 만족하지 못하면 None
+             물품이 이미 삭제됐으면 아무것도 바꾸지 않고 None
+    """
+    if not purchases:
+        return []
+    now = _dt(datetime.now())
+    results: List[Optional[tuple]] = []
+    async with _write_connection() as conn:
+        cursor = await conn.execute("SELECT 1 FROM market_items WHERE item_id = ?", (item_id,))
+        if await cursor.fetchone() is None:
+            return None
+        for user_id, guild_id, user_name, price in purchases:
+            cursor = await conn.execute(
+                """INSERT INTO market_tickets (item_id, user_id, guild_id, user_name, price, purchased_at)
+                   SELECT m.item_id, ?, ?, ?, ?, ? FROM market_items m
+                   WHERE m.item_id = ?
+                     AND (m.quantity = 0 OR m.tickets_sold < m.quantity)
+                     AND (SELECT COUNT(*) FROM market_tickets t
+                          WHERE t.item_id = m.item_id AND t.user_id = ?)
+                         < CASE WHEN m.is_role THEN 1 ELSE m.max_purchase END
+                     AND EXISTS (SELECT 1 FROM users u
+                                 WHERE u.user_id = ? AND u.guild_id = ? AND u.points >= ?)""",
+                (user_id, guild_id, user_name, price, now, item_id, user_id, user_id, guild_id, price)
+            )
+            if cursor.rowcount != 1:
+                results.append(None)
+                continue
+            ticket_id = cursor.lastrowid
+            await conn.execute(
+                "UPDATE users SET points = points - ? WHERE user_id = ? AND guild_id = ?",
+                (price, user_id, guild_id)
+            )
+            # 다음 사용자의 수량 조건에 반영되도록 한 장씩 증가
+            await conn.execute(
+                "UPDATE market_items SET tickets_sold = tickets_sold + 1 WHERE item_id = ?",
+                (item_id,)
+            )
+            cursor = await conn.execute(
+                "SELECT points FROM users WHERE user_id = ? AND guild_id = ?",
+                (user_id, guild_id)
+            )
+            results.append((ticket_id, (await cursor.fetchone())[0]))
+        await conn.commit()
+    for (user_id, guild_id, _, _), result in zip(purchases, results):
+        if result is not None:
+            leaderboard_index.note_user(guild_id, user_id, points=result[1])
+    return results
+
+
+async def refund_market_ticket(ticket_id: int) -> Optional[int]:
+    """
+    구매 취소 (역할 지급 실패 등): 티켓 삭제 → 판매 수 감소 → 포인트 환불 (한 트랜잭션)
+    Returns: 환불 후 포인트 (티켓이 없으면 None)
+    """
+    async with _write_connection() as conn:
+        cursor = await conn.execute(
+            "SELECT item_id, user_id, guild_id, price FROM market_tickets WHERE ticket_id = ?",
+            (ticket_id,)
+        )
+        row = await cursor.fetchone()
+        if row is None or row['user_id'] is None:
+            return None
+        item_id, user_id, guild_id, price = row['item_id'], row['user_id'], row['guild_id'], row['price']
+        await conn.execute("DELETE FROM market_tickets WHERE ticket_id = ?", (ticket_id,))
+        await conn.execute(
+            "UPDATE market_items SET tickets_sold = MAX(tickets_sold - 1, 0) WHERE item_id = ?",
+            (item_id,)
+        )
+        await conn.execute(
+            "UPDATE users SET points = points + ? WHERE user_id = ? AND guild_id = ?",
+            (price, user_id, guild_id)
+        )
+        cursor = await conn.execute(
+            "SELECT points FROM users WHERE user_id = ? AND guild_id = ?",
+            (user_id, guild_id)
+        )
+        points_row = await cursor.fetchone()
+        await conn.commit()
+    if points_row is None:
+        return None
+    leaderboard_index.note_user(guild_id, user_id, points=points_row[0])
+    return points_row[0]
+
+
+async def insert_market_draw(item_id: int, item_code: str, seed: str, draw_count: int, pool_size: int,
+                             total_tickets: int, pool: str, winners: str, drawn_by: Optional[int]) -> int:
+    """추첨 기록 저장 (pool/winners는 JSON 문자열). Returns: draw_id"""
+    async with _write_connection() as conn:
+        cursor = await conn.execute(
+            """INSERT INTO market_draws
+               (item_id, item_code, seed, draw_count, pool_size, total_tickets, pool, winners, drawn_by, drawn_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (item_id, item_code, seed, draw_count, pool_size, total_tickets, pool, winners, drawn_by,
+             _dt(datetime.now()))
+        )
+        draw_id = cursor.lastrowid
+        await conn.commit()
+        return draw_id
 
 
 # ========== 경고 시스템 함수들 ==========
 
-async def add_warning(user_id: int, guild_id: int, reason: str, issued_by: int, warning_count: int = 1):
-    """경고 추가"""
+async def add_warning(user_id: int, guild_id: int, reason: str, issued_by: int, warning_count: int = 1) -> datetime:
+    """경고 추가. Returns: 만료 시각"""
     from datetime import timedelta
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         issued_at = datetime.now()
         expires_at = issued_at + timedelta(days=7)
         for _ in range(warning_count):
@@ -414,30 +949,40 @@ async def add_warning(user_id: int, guild_id: int, reason: str, issued_by: int,
                 (user_id, guild_id, reason, _dt(issued_at), issued_by, _dt(expires_at))
             )
         await conn.commit()
-    finally:
-        await conn.close()
+    return expires_at
 
 
 async def get_active_warning_count(user_id: int, guild_id: int) -> int:
-    """활성 경고 수 조회"""
-    conn = await _get_connection()
-    try:
+    """활성(만료되지 않은) 경고 수 조회"""
+    async with _read_connection() as conn:
         cursor = await conn.execute(
             """SELECT COUNT(*) as count
                FROM warnings
-               WHERE user_id = ? AND guild_id = ?""",
-            (user_id, guild_id)
+               WHERE user_id = ? AND guild_id = ? AND expires_at > ?""",
+            (user_id, guild_id, _dt(datetime.now()))
         )
         row = await cursor.fetchone()
         return row[0] if row else 0
-    finally:
-        await conn.close()
+
+
+async def get_active_warning_expiries(user_id: Optional[int] = None, guild_id: Optional[int] = None) -> List[tuple]:
+    """
+    활성 경고의 만료 시각 목록 (user_id/guild_id 생략 시 전체, 경고 캐시 로드용)
+    Returns: [(guild_id, user_id, expires_at: datetime), ...]
+    """
+    query = "SELECT guild_id, user_id, expires_at FROM warnings WHERE expires_at > ?"
+    params = [_dt(datetime.now())]
+    if user_id is not None and guild_id is not None:
+        query += " AND user_id = ? AND guild_id = ?"
+        params += [user_id, guild_id]
+    async with _read_connection() as conn:
+        cursor = await conn.execute(query, params)
+        return [(r[0], r[1], datetime.fromisoformat(r[2])) for r in await cursor.fetchall()]
 
 
 async def get_all_warnings(user_id: int, guild_id: int) -> List[dict]:
     """사용자의 모든 경고 조회"""
-    conn = await _get_connection()
-    try:
+    async with _read_connection() as conn:
         cursor = await conn.execute(
             """SELECT warning_id, reason, issued_at, issued_by, expires_at
                FROM warnings
@@ -447,35 +992,54 @@ async def get_all_warnings(user_id: int, guild_id: int) -> List[dict]:
         )
         rows = await cursor.fetchall()
         return [dict(r) for r in rows]
-    finally:
-        await conn.close()
 
 
-async def remove_expired_warnings():
-    """만료된 경고 삭제 (7일이 지난 경고)"""
-    conn = await _get_connection()
-    try:
-        cursor = await conn.execute(
-            "DELETE FROM warnings WHERE expires_at <= ?",
-            (_dt(datetime.now()),)
-        )
-        rowcount = cursor.rowcount
+async def get_next_warning_expiry() -> Optional[datetime]:
+    """가장 먼저 만료되는 경고의 만료 시각 (idx_warnings_expires 사용, 없으면 None)"""
+    async with _read_connection() as conn:
+        cursor = await conn.execute("SELECT MIN(expires_at) FROM warnings")
+        row = await cursor.fetchone()
+    return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+
+async def pop_expired_warnings() -> List[tuple]:
+    """
+    만료된 경고를 한 번에 삭제
+    Returns: 삭제된 경고의 [(guild_id, user_id), ...] (경고 1개당 1개)
+    """
+    now = _dt(datetime.now())
+    async with _write_connection() as conn:
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            cursor = await conn.execute(
+                "DELETE FROM warnings WHERE expires_at <= ? RETURNING guild_id, user_id",
+                (now,)
+            )
+            expired = [(r[0], r[1]) for r in await cursor.fetchall()]
+        else:
+            cursor = await conn.execute(
+                "SELECT guild_id, user_id FROM warnings WHERE expires_at <= ?",
+                (now,)
+            )
+            expired = [(r[0], r[1]) for r in await cursor.fetchall()]
+            await conn.execute("DELETE FROM warnings WHERE expires_at <= ?", (now,))
         await conn.commit()
-        return rowcount
-    finally:
-        await conn.close()
+        return expired
+
+
+async def remove_expired_warnings():
+    """만료된 경고 삭제 (7일이 지난 경고). Returns: 삭제된 수"""
+    return len(await pop_expired_warnings())
 
 
 async def remove_warnings(user_id: int, guild_id: int, count: int) -> int:
     """활성 경고 삭제 (가장 오래된 경고부터). SQLite는 같은 테이블 수정+서브쿼리 제한으로 두 단계 실행."""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         cur = await conn.execute(
             """SELECT warning_id FROM warnings
-               WHERE user_id = ? AND guild_id = ?
+               WHERE user_id = ? AND guild_id = ? AND expires_at > ?
                ORDER BY issued_at ASC
                LIMIT ?""",
-            (user_id, guild_id, count)
+            (user_id, guild_id, _dt(datetime.now()), count)
         )
         ids = [row[0] for row in await cur.fetchall()]
         if not ids:
@@ -488,44 +1052,35 @@ async def remove_warnings(user_id: int, guild_id: int, count: int) -> int:
         rowcount = cur2.rowcount
         await conn.commit()
         return rowcount
-    finally:
-        await conn.close()
 
 
 # ========== 서버비 시스템 함수들 ==========
 
 async def add_server_fee(user_id: Optional[int], guild_id: int, amount: int, reason: str, created_by: int):
     """서버비 추가 기록"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         await conn.execute(
             """INSERT INTO server_fees (user_id, guild_id, amount, reason, transaction_type, created_at, created_by)
                VALUES (?, ?, ?, ?, 'add', ?, ?)""",
             (user_id, guild_id, amount, reason, _dt(datetime.now()), created_by)
         )
         await conn.commit()
-    finally:
-        await conn.close()
 
 
 async def remove_server_fee(guild_id: int, amount: int, reason: str, created_by: int):
     """서버비 사용 기록"""
-    conn = await _get_connection()
-    try:
+    async with _write_connection() as conn:
         await conn.execute(
             """INSERT INTO server_fees (user_id, guild_id, amount, reason, transaction_type, created_at, created_by)
                VALUES (NULL, ?, ?, ?, 'remove', ?, ?)""",
             (guild_id, amount, reason, _dt(datetime.now()), created_by)
         )
         await conn.commit()
-    finally:
-        await conn.close()
 
 
 async def get_server_fee_balance(guild_id: int) -> int:
     """서버비 잔액 조회"""
-    conn = await _get_connection()
-    try:
+    async with _read_connection() as conn:
         cursor = await conn.execute(
             """SELECT 
                    COALESCE(SUM(CASE WHEN transaction_type = 'add' THEN amount ELSE 0 END), 0) -
@@ -536,14 +1091,11 @@ async def get_server_fee_balance(guild_id: int) -> int:
         )
         row = await cursor.fetchone()
         return row[0] if row else 0
-    finally:
-        await conn.close()
 
 
 async def get_server_fee_history(guild_id: int, limit: int = 20) -> List[dict]:
     """서버비 기록 조회 (최근 기록부터)"""
-    conn = await _get_connection()
-    try:
+    async with _read_connection() as conn:
         cursor = await conn.execute(
             """SELECT fee_id, user_id, amount, reason, transaction_type, created_at, created_by
                FROM server_fees
@@ -554,12 +1106,13 @@ async def get_server_fee_history(guild_id: int, limit: int = 20) -> List[dict]:
         )
         rows = await cursor.fetchall()
         return [dict(r) for r in rows]
-    finally:
-        await conn.close()
 
 
 # ========== 트랜잭션 지원 (level_system add_exp용) ==========
 
 async def get_mysql_connection():
-    """트랜잭션용 DB 연결 반환 (호출자가 commit/rollback/close 책임). SQLite 사용 시에도 이름 유지."""
-    return await _get_connection()
+    """
+    트랜잭션용 DB 연결 반환 (호출자가 commit/rollback/close 책임). SQLite 사용 시에도 이름 유지.
+    풀의 쓰기 연결을 점유하므로 close()로 반드시 반납해야 함
+    """
+    return await _pool.acquire_writer()
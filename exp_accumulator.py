@@ -0,0 +1,89 @@
+# exp_accumulator.py - EXP 지급 버퍼 (일정 주기마다 한 트랜잭션으로 일괄 반영)
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import EXP_FLUSH_INTERVAL
+from level_system import flush_exp_deltas
+
+
+class ExpAccumulator:
+    """
+    (guild_id, user_id)별 EXP 증가분을 메모리에 모아 두었다가 주기적으로 한 번에 DB에 반영
+    레벨업은 누적분 전체를 기준으로 계산하므로 건별 지급과 결과가 같고,
+    on_level_up(result, context)은 커밋이 끝난 뒤 호출됨
+    """
+
+    def __init__(self, flush_interval: float = EXP_FLUSH_INTERVAL,
+                 on_level_up: Optional[Callable[[dict, Any], Awaitable[None]]] = None):
+        self.flush_interval = flush_interval
+        self.on_level_up = on_level_up
+        self._pending: Dict[Tuple[int, int], int] = {}
+        self._context: Dict[Tuple[int, int], Any] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, guild_id: int, user_id: int, amount: int, context: Any = None):
+        """EXP 증가분 버퍼에 추가 (I/O 없음). context는 레벨업 콜백에 전달 (예: discord.Member)"""
+        key = (guild_id, user_id)
+        self._pending[key] = self._pending.get(key, 0) + amount
+        if context is not None:
+            self._context[key] = context
+
+    def pending_exp(self, guild_id: int, user_id: int) -> int:
+        """아직 DB에 반영되지 않은 EXP"""
+        return self._pending.get((guild_id, user_id), 0)
+
+    def start(self):
+        """주기적 flush 작업 시작"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[ExpAccumulator] flush 오류: {e}")
+
+    async def flush(self) -> list:
+        """
+        버퍼를 비우고 한 트랜잭션으로 반영. 실패하면 버퍼에 되돌려 다음 주기에 재시도
+        Returns: 사용자별 결과 리스트
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return []
+            deltas, self._pending = self._pending, {}
+            contexts, self._context = self._context, {}
+            try:
+                results = await flush_exp_deltas(deltas)
+            except Exception:
+                for key, amount in deltas.items():
+                    self._pending[key] = self._pending.get(key, 0) + amount
+                for key, context in contexts.items():
+                    self._context.setdefault(key, context)
+                raise
+
+        if self.on_level_up is not None:
+            for result in results:
+                if not result['leveled_up']:
+                    continue
+                context = contexts.get((result['guild_id'], result['user_id']))
+                try:
+                    await self.on_level_up(result, context)
+                except Exception as e:
+                    print(f"[ExpAccumulator] 레벨업 처리 오류: {result['user_id']} - {e}")
+        return results
+
+    async def close(self):
+        """주기 작업 중지 후 남은 버퍼 강제 반영 (종료 시 호출)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
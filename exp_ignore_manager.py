@@ -1,65 +1,108 @@
 # exp_ignore_manager.py - EXP 지급 제외 사용자 목록 관리 (길드별)
 
+import asyncio
 import json
 import os
-from typing import Dict, Set
+from typing import Dict, FrozenSet, List, Optional
 
+from database import (
+    get_all_exp_ignores, set_exp_ignored, import_exp_ignores,
+    is_migration_applied, mark_migration_applied,
+)
+
+# 예전 버전의 저장 파일 (시작 시 한 번 DB로 옮김, git에 포함된 파일이므로 지우거나 이름을 바꾸지 않음)
 EXP_IGNORE_FILE = "exp_ignore.json"
+_MIGRATION_NAME = "exp_ignore_json"
+
+# {guild_id: frozenset(user_id)} - EXP 지급 시점마다 조회하므로 메모리에만 두고 I/O 없이 확인
+_ignored: Dict[int, FrozenSet[int]] = {}
+_toggle_lock = asyncio.Lock()
+
+# 제외 상태가 바뀌기 직전에 호출되는 훅: hook(guild_id, user_id) (lazy 음성 EXP 정산 등, 동기 함수)
+_toggle_hook = None
+
+
+def set_toggle_hook(hook):
+    """toggle_ignore가 메모리 상태를 바꾸기 직전에 실행할 훅 등록 (None이면 해제)"""
+    global _toggle_hook
+    _toggle_hook = hook
 
 
-def _load_raw() -> Dict[str, list]:
-    """파일에서 {guild_id: [user_id, ...]} 로드 (키는 문자열)"""
-    if not os.path.exists(EXP_IGNORE_FILE):
-        return {}
+def _read_legacy_file() -> Optional[List[tuple]]:
+    """exp_ignore.json의 {guild_id: [user_id, ...]} → [(guild_id, user_id), ...] (읽기/형식 오류면 None)"""
     try:
         with open(EXP_IGNORE_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
-        return data if isinstance(data, dict) else {}
     except Exception as e:
         print(f"[ExpIgnoreManager] 로드 오류: {e}")
-        return {}
+        return None
+    if not isinstance(data, dict):
+        print(f"[ExpIgnoreManager] 로드 오류: {EXP_IGNORE_FILE} 형식이 올바르지 않습니다 (객체가 아님)")
+        return None
+    pairs = []
+    for key, user_ids in data.items():
+        if not str(key).isdigit() or not isinstance(user_ids, list):
+            continue
+        for uid in user_ids:
+            if isinstance(uid, (int, str)) and str(uid).isdigit():
+                pairs.append((int(key), int(uid)))
+    return pairs
 
 
-def _save_raw(data: Dict[str, list]):
-    """파일에 저장"""
-    try:
-        with open(EXP_IGNORE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"[ExpIgnoreManager] 저장 오류: {e}")
+async def _migrate_legacy_file():
+    """exp_ignore.json이 있으면 DB로 가져옴 (완료 여부는 DB에 기록, 한 번만 실행됨)"""
+    if not os.path.exists(EXP_IGNORE_FILE) or await is_migration_applied(_MIGRATION_NAME):
+        return
+    if os.path.exists(EXP_IGNORE_FILE + ".migrated"):
+        # 예전 버전이 이미 옮기고 이름을 바꾼 뒤 git으로 원본이 복원된 경우 (다시 가져오면 해제한 사용자가 되살아남)
+        await mark_migration_applied(_MIGRATION_NAME)
+        return
+    pairs = _read_legacy_file()
+    if pairs is None:
+        # 손상되거나 쓰다 만 파일은 그대로 두고 다음 시작 때 다시 시도
+        print(f"[ExpIgnoreManager] ⚠️ {EXP_IGNORE_FILE}을(를) 읽지 못해 마이그레이션을 건너뜁니다. 파일을 확인해주세요.")
+        return
+    added = await import_exp_ignores(pairs)
+    await mark_migration_applied(_MIGRATION_NAME)
+    print(f"[ExpIgnoreManager] {EXP_IGNORE_FILE} → DB 마이그레이션 완료 ({added}/{len(pairs)}명)")
+
+
+async def load_ignore_list():
+    """시작 시 호출: DB의 EXP 지급 제외 목록을 메모리로 로드"""
+    global _ignored
+    await _migrate_legacy_file()
+    grouped: Dict[int, set] = {}
+    for guild_id, user_id in await get_all_exp_ignores():
+        grouped.setdefault(guild_id, set()).add(user_id)
+    _ignored = {guild_id: frozenset(user_ids) for guild_id, user_ids in grouped.items()}
+    print(f"[ExpIgnoreManager] EXP 지급 제외 {sum(len(s) for s in _ignored.values())}명 로드")
 
 
-def get_ignored_set(guild_id: int) -> Set[int]:
+def get_ignored_set(guild_id: int) -> FrozenSet[int]:
     """해당 길드에서 EXP 지급 제외된 user_id 집합 반환"""
-    raw = _load_raw()
-    key = str(guild_id)
-    if key not in raw or not isinstance(raw[key], list):
-        return set()
-    return set(int(uid) for uid in raw[key] if isinstance(uid, (int, str)) and str(uid).isdigit())
+    return _ignored.get(guild_id, frozenset())
 
 
 def is_ignored(guild_id: int, user_id: int) -> bool:
     """해당 길드에서 해당 사용자가 EXP 제외인지 여부"""
-    return user_id in get_ignored_set(guild_id)
+    ignored = _ignored.get(guild_id)
+    return ignored is not None and user_id in ignored
 
 
-def toggle_ignore(guild_id: int, user_id: int) -> bool:
+async def toggle_ignore(guild_id: int, user_id: int) -> bool:
     """
-    EXP 지급 제외 토글.
+    EXP 지급 제외 토글 (DB 반영 성공 후 메모리 갱신)
     Returns: True = 이제 제외됨(지급 안 함), False = 이제 지급받음(제외 해제)
     """
-    raw = _load_raw()
-    key = str(guild_id)
-    if key not in raw:
-        raw[key] = []
-    current = set(int(uid) for uid in raw[key] if isinstance(uid, (int, str)) and str(uid).isdigit())
-    if user_id in current:
-        current.discard(user_id)
-        raw[key] = sorted(current)
-        _save_raw(raw)
-        return False  # 이제 지급받음
-    else:
-        current.add(user_id)
-        raw[key] = sorted(current)
-        _save_raw(raw)
-        return True  # 이제 제외됨
+    async with _toggle_lock:
+        current = _ignored.get(guild_id, frozenset())
+        now_ignored = user_id not in current
+        await set_exp_ignored(guild_id, user_id, now_ignored)
+        # 바뀌기 전 상태로 지금까지의 EXP를 정산해 변경이 이전 시간에 소급되지 않도록 함
+        if _toggle_hook is not None:
+            _toggle_hook(guild_id, user_id)
+        if now_ignored:
+            _ignored[guild_id] = current | {user_id}
+        else:
+            _ignored[guild_id] = current - {user_id}
+        return now_ignored
@@ -0,0 +1,223 @@
+# leaderboard_index.py - 길드별 순위 인덱스 (메모리, 증분 갱신)
+
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+# users 테이블 기본값 (새 사용자)
+_DEFAULT_ROW = (1, 0, 0, 0)  # (level, exp, points, total_exp)
+
+
+class _SortedKeys:
+    """
+    정렬된 키 목록을 크기 제한 버킷으로 나눠 보관 (버킷별 최댓값은 bisect, 버킷 크기 합은 Fenwick 트리)
+    - 추가/삭제: 버킷 찾기 O(log n) + 버킷 안 insort/del O(LOAD)
+    - 순위(bisect_left): 버킷 찾기 + Fenwick 누적합 O(log n)
+    버킷 분할·제거 시에만 Fenwick 트리를 다시 만듦
+    """
+
+    LOAD = 256  # 버킷 크기 기준 (2배를 넘으면 분할)
+
+    def __init__(self, keys: list):
+        keys = sorted(keys)
+        self._buckets = [keys[i:i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(keys)
+        self._rebuild_tree()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _rebuild_tree(self):
+        tree = [0] * (len(self._buckets) + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, index: int, delta: int):
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, index: int) -> int:
+        """버킷 0..index-1의 키 수"""
+        total = 0
+        i = index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, key: tuple):
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._rebuild_tree()
+            return
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+        bucket = self._buckets[i]
+        insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        self._len += 1
+        if len(bucket) > 2 * self.LOAD:
+            self._buckets[i:i + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            self._maxes[i:i + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def discard(self, key: tuple):
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return
+        bucket = self._buckets[i]
+        j = bisect_left(bucket, key)
+        if j == len(bucket) or bucket[j] != key:
+            return
+        del bucket[j]
+        self._len -= 1
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+            self._rebuild_tree()
+
+    def bisect_left(self, key: tuple) -> int:
+        """key보다 작은 키 수"""
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return self._len
+        return self._prefix(i) + bisect_left(self._buckets[i], key)
+
+    def head(self, limit: int) -> list:
+        """앞에서부터 limit개"""
+        result = []
+        for bucket in self._buckets:
+            if len(result) >= limit:
+                break
+            result.extend(bucket[:limit - len(result)])
+        return result
+
+
+class GuildLeaderboard:
+    """
+    한 길드의 사용자 순위를 정렬 키 목록(_SortedKeys) 두 개로 유지 (갱신·순위 조회 모두 O(log n))
+    - 포인트 순위: points DESC, level DESC, total_exp DESC (database.get_user_rank_by_points와 동일한 키)
+    - 레벨 순위: level DESC, exp DESC, points DESC (database.get_user_rank_by_level과 동일한 키)
+    내림차순을 음수 키로 오름차순 정렬해 bisect로 순위를 구함 (동점은 같은 순위)
+    """
+
+    def __init__(self, rows: Dict[int, Tuple[int, int, int, int]]):
+        self.rows = dict(rows)  # {user_id: (level, exp, points, total_exp)}
+        self.by_points = _SortedKeys([self._points_key(uid, row) for uid, row in self.rows.items()])
+        self.by_level = _SortedKeys([self._level_key(uid, row) for uid, row in self.rows.items()])
+
+    @staticmethod
+    def _points_key(user_id: int, row: tuple) -> tuple:
+        level, _, points, total_exp = row
+        return (-points, -level, -total_exp, user_id)
+
+    @staticmethod
+    def _level_key(user_id: int, row: tuple) -> tuple:
+        level, exp, points, _ = row
+        return (-level, -exp, -points, user_id)
+
+    def update(self, user_id: int, level: Optional[int] = None, exp: Optional[int] = None,
+               points: Optional[int] = None, total_exp: Optional[int] = None):
+        """사용자 값 갱신 (None인 항목은 기존 값 유지, 없는 사용자는 기본값에서 시작)"""
+        old = self.rows.get(user_id)
+        base = old if old is not None else _DEFAULT_ROW
+        new = (
+            base[0] if level is None else level,
+            base[1] if exp is None else exp,
+            base[2] if points is None else points,
+            base[3] if total_exp is None else total_exp,
+        )
+        if old == new:
+            return
+        if old is not None:
+            self.by_points.discard(self._points_key(user_id, old))
+            self.by_level.discard(self._level_key(user_id, old))
+        self.rows[user_id] = new
+        self.by_points.add(self._points_key(user_id, new))
+        self.by_level.add(self._level_key(user_id, new))
+
+    def _entry(self, user_id: int) -> dict:
+        level, exp, points, total_exp = self.rows[user_id]
+        return {'user_id': user_id, 'level': level, 'exp': exp, 'points': points, 'total_exp': total_exp}
+
+    def top_by_points(self, limit: int) -> List[dict]:
+        return [self._entry(key[3]) for key in self.by_points.head(limit)]
+
+    def top_by_level(self, limit: int) -> List[dict]:
+        return [self._entry(key[3]) for key in self.by_level.head(limit)]
+
+    def rank_by_points(self, user_id: int) -> int:
+        """자신보다 키가 큰 사용자 수 + 1 (없는 사용자는 1)"""
+        row = self.rows.get(user_id)
+        if row is None:
+            return 1
+        return self.by_points.bisect_left(self._points_key(user_id, row)[:3]) + 1
+
+    def rank_by_level(self, user_id: int) -> int:
+        row = self.rows.get(user_id)
+        if row is None:
+            return 1
+        return self.by_level.bisect_left(self._level_key(user_id, row)[:3]) + 1
+
+
+_guilds: Dict[int, GuildLeaderboard] = {}
+# 로드 중인 길드: 그 사이 들어온 갱신을 모아 두었다가 로드 후 적용
+_loading: Dict[int, list] = {}
+
+
+def get_loaded(guild_id: int) -> Optional[GuildLeaderboard]:
+    """로드된 길드 인덱스 (없으면 None)"""
+    return _guilds.get(guild_id)
+
+
+def begin_load(guild_id: int):
+    """DB에서 길드 사용자 조회 직전에 호출"""
+    _loading.setdefault(guild_id, [])
+
+
+def finish_load(guild_id: int, rows: Dict[int, Tuple[int, int, int, int]]) -> GuildLeaderboard:
+    """조회 결과로 인덱스 생성, 조회 중 들어온 갱신 적용"""
+    board = GuildLeaderboard(rows)
+    for user_id, fields in _loading.pop(guild_id, []):
+        board.update(user_id, **fields)
+    _guilds[guild_id] = board
+    return board
+
+
+def abort_load(guild_id: int):
+    """조회 실패 시 호출"""
+    _loading.pop(guild_id, None)
+
+
+def note_user(guild_id: int, user_id: int, **fields):
+    """
+    users 테이블 쓰기 후 호출 (level, exp, points, total_exp 중 바뀐 값만 전달)
+    아직 로드되지 않은 길드는 무시 (처음 조회할 때 DB에서 로드)
+    """
+    board = _guilds.get(guild_id)
+    if board is not None:
+        board.update(user_id, **fields)
+    elif guild_id in _loading:
+        _loading[guild_id].append((user_id, fields))
+
+
+def invalidate(guild_id: Optional[int] = None):
+    """인덱스 폐기 (다음 조회 시 DB에서 다시 로드, guild_id가 None이면 전체)"""
+    if guild_id is None:
+        _guilds.clear()
+    else:
+        _guilds.pop(guild_id, None)
@@ -0,0 +1,132 @@
+# level_curve.py - 레벨 곡선 사전 계산 테이블
+
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+# 레벨 계산 상한 (level_system의 기존 무한 루프 방지 값과 동일)
+MAX_LEVEL = 1000
+# 설정 구간이 하나도 없을 때 사용하는 기본 구간 값 (레벨업_시간_분, 레벨업_포인트)
+DEFAULT_RANGE_VALUE = (10, 10)
+
+
+class LevelCurve:
+    """
+    레벨 구간 설정으로부터 한 번만 만드는 누적합 테이블
+    - required[n]: n레벨 → n+1레벨에 필요한 exp
+    - exp_cum[n]: 1레벨에서 n레벨에 도달하기까지 필요한 총 exp
+    - points_cum[n]: 1~n레벨 레벨업 포인트 합계
+    테이블 밖 레벨은 마지막 구간 값으로 선형 외삽
+    """
+
+    def __init__(self, level_ranges: Dict[Tuple[int, int], Tuple[int, int]], exp_per_minute: float = 1):
+        self.level_ranges = dict(level_ranges)
+        self.exp_per_minute = exp_per_minute
+
+        if level_ranges:
+            last_range = max(level_ranges.keys(), key=lambda x: x[1])
+            fallback = level_ranges[last_range]
+            max_end = max(end for _, end in level_ranges.keys())
+        else:
+            fallback = DEFAULT_RANGE_VALUE
+            max_end = 0
+        # 모든 설정 구간 + 계산 상한 이후 한 칸까지 테이블로 보관
+        self.size = max(MAX_LEVEL, max_end) + 1
+
+        minutes_by_level: List[int] = [fallback[0]] * (self.size + 1)
+        points_by_level: List[int] = [fallback[1]] * (self.size + 1)
+        # 기존 get_level_range와 같이 dict 순서상 먼저 나온 구간이 우선
+        assigned = [False] * (self.size + 1)
+        for (start, end), (minutes, points) in level_ranges.items():
+            for level in range(max(start, 1), min(end, self.size) + 1):
+                if not assigned[level]:
+                    minutes_by_level[level] = minutes
+                    points_by_level[level] = points
+                    assigned[level] = True
+
+        self.tail_minutes = fallback[0]
+        self.tail_required = int(fallback[0] * exp_per_minute)
+        self.tail_points = fallback[1]
+        self.minutes = [0] + minutes_by_level[1:]
+        self.required = [0] + [int(m * exp_per_minute) for m in minutes_by_level[1:]]
+        self.points = [0] + points_by_level[1:]
+
+        self.exp_cum = [0] * (self.size + 2)
+        for level in range(1, self.size + 1):
+            self.exp_cum[level + 1] = self.exp_cum[level] + self.required[level]
+        self.points_cum = [0] * (self.size + 1)
+        for level in range(1, self.size + 1):
+            self.points_cum[level] = self.points_cum[level - 1] + self.points[level]
+
+    def get_level_range(self, level: int) -> Tuple[int, int]:
+        """레벨의 (레벨업_시간_분, 레벨업_포인트)"""
+        if 1 <= level <= self.size:
+            return (self.minutes[level], self.points[level])
+        if level < 1:
+            return self.get_level_range(1)
+        return (self.tail_minutes, self.tail_points)
+
+    def required_exp(self, level: int) -> int:
+        """level → level+1에 필요한 exp"""
+        if level < 1:
+            level = 1
+        if level <= self.size:
+            return self.required[level]
+        return self.tail_required
+
+    def points_for_level(self, level: int) -> int:
+        """level에 도달할 때 지급되는 포인트"""
+        if level < 1:
+            level = 1
+        if level <= self.size:
+            return self.points[level]
+        return self.tail_points
+
+    def total_exp_for_level(self, level: int) -> int:
+        """1레벨에서 level에 도달하기까지 필요한 총 exp - O(1)"""
+        if level <= 1:
+            return 0
+        if level <= self.size + 1:
+            return self.exp_cum[level]
+        return self.exp_cum[self.size + 1] + (level - self.size - 1) * self.tail_required
+
+    def points_between(self, from_level: int, to_level: int) -> int:
+        """from_level+1 ~ to_level 레벨업 포인트 합계 - O(1) (from_level >= to_level이면 0)"""
+        if to_level <= from_level:
+            return 0
+        return self._points_upto(to_level) - self._points_upto(from_level)
+
+    def _points_upto(self, level: int) -> int:
+        if level < 1:
+            return 0
+        if level <= self.size:
+            return self.points_cum[level]
+        return self.points_cum[self.size] + (level - self.size) * self.tail_points
+
+    def level_from_total_exp(self, total_exp: int) -> Tuple[int, int]:
+        """
+        총 exp로부터 (레벨, 현재 레벨 exp) 계산 - O(log n)
+        MAX_LEVEL 이상은 계산하지 않음 (기존 동작과 동일)
+        """
+        if total_exp < 0:
+            return (1, 0)
+        if total_exp >= self.exp_cum[MAX_LEVEL + 1]:
+            return (MAX_LEVEL, total_exp - self.exp_cum[MAX_LEVEL + 1])
+        # exp_cum[1..MAX_LEVEL] 중 total_exp 이하인 마지막 레벨
+        level = bisect_right(self.exp_cum, total_exp, 1, MAX_LEVEL + 1) - 1
+        return (level, total_exp - self.exp_cum[level])
+
+
+_curve: Optional[LevelCurve] = None
+_curve_version = -1
+
+
+def get_level_curve() -> LevelCurve:
+    """현재 레벨 구간 설정의 LevelCurve (설정 파일 버전이 바뀌면 재생성)"""
+    global _curve, _curve_version
+    from level_ranges_manager import level_ranges_version
+    version = level_ranges_version()
+    if _curve is None or version != _curve_version:
+        from config import EXP_PER_MINUTE, get_level_ranges
+        _curve = LevelCurve(get_level_ranges(), EXP_PER_MINUTE)
+        _curve_version = version
+    return _curve
@@ -4,7 +4,10 @@ import os
 from typing import Dict, Tuple, Optional
 from pathlib import Path
 
+from config_registry import registry
+
 LEVEL_RANGES_FILE = "level_ranges.txt"
+_REGISTRY_KEY = "level_ranges"
 
 
 def ensure_file():
@@ -27,11 +30,8 @@ def ensure_file():
             print(f"[LevelRangesManager] 파일 초기화 오류: {e}")
 
 
-def load_level_ranges() -> Dict[Tuple[int, int], Tuple[int, int]]:
-    """
-    level_ranges.txt 파일에서 설정 로드
-    Returns: {(시작레벨, 끝레벨): (레벨업_시간_분, 레벨업_포인트)}
-    """
+def _read_level_ranges() -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """level_ranges.txt 파싱 (config_registry에서 파일이 바뀌었을 때만 호출)"""
     ensure_file()
     
     result = {}
@@ -72,6 +72,22 @@ def load_level_ranges() -> Dict[Tuple[int, int], Tuple[int, int]]:
     return result
 
 
+registry.register(_REGISTRY_KEY, LEVEL_RANGES_FILE, _read_level_ranges)
+
+
+def load_level_ranges() -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """
+    level_ranges.txt 설정 조회 (메모리 캐시, 파일 변경 시 자동 재로드)
+    Returns: {(시작레벨, 끝레벨): (레벨업_시간_분, 레벨업_포인트)}
+    """
+    return registry.get(_REGISTRY_KEY)
+
+
+def level_ranges_version() -> int:
+    """레벨 범위 설정 버전 (파일이 다시 로드될 때마다 증가)"""
+    return registry.version(_REGISTRY_KEY)
+
+
 def save_level_ranges(level_ranges: Dict[Tuple[int, int], Tuple[int, int]]):
     """
     level_ranges.txt 파일에 설정 저장
@@ -90,6 +106,9 @@ def save_level_ranges(level_ranges: Dict[Tuple[int, int], Tuple[int, int]]):
     except Exception as e:
         print(f"[LevelRangesManager] 파일 쓰기 오류: {e}")
         raise
+    finally:
+        # 캐시 무효화 (레벨 곡선 테이블도 버전이 바뀌어 다음 조회 시 재생성)
+        registry.invalidate(_REGISTRY_KEY)
 
 
 def add_level_range(start: int, end: int, minutes: int, points: int) -> bool:
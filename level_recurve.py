@@ -0,0 +1,101 @@
+# level_recurve.py - 레벨 구간 변경 후 전체 사용자 레벨/exp 재계산
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import get_tier_roles
+from database import get_users_exp_chunk, apply_user_level_changes
+from level_curve import LevelCurve, MAX_LEVEL, get_level_curve
+
+# 한 번에 읽고 한 트랜잭션으로 반영하는 사용자 수
+RECURVE_CHUNK_SIZE = 5000
+NO_TIER = "티어 없음"
+
+
+def levels_from_total_exp(curve: LevelCurve, total_exp: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    LevelCurve.level_from_total_exp의 배열 버전
+    Returns: (레벨 배열, 현재 레벨 exp 배열)
+    """
+    total_exp = np.asarray(total_exp, dtype=np.int64)
+    exp_cum = np.asarray(curve.exp_cum, dtype=np.int64)
+    # exp_cum[1..MAX_LEVEL] 중 total_exp 이하인 개수 = 레벨 (exp_cum[1] = 0이므로 최소 1)
+    levels = np.searchsorted(exp_cum[1:MAX_LEVEL + 1], total_exp, side='right')
+    exps = total_exp - exp_cum[levels]
+    capped = total_exp >= exp_cum[MAX_LEVEL + 1]
+    exps = np.where(capped, total_exp - exp_cum[MAX_LEVEL + 1], exps)
+    negative = total_exp < 0
+    levels = np.where(negative, 1, levels)
+    exps = np.where(negative, 0, exps)
+    return levels, exps
+
+
+def _tier_index(thresholds: np.ndarray, levels: np.ndarray) -> np.ndarray:
+    """레벨 → 티어 번호 (도달 레벨 오름차순 기준, -1 = 티어 없음)"""
+    return np.searchsorted(thresholds, levels, side='right') - 1
+
+
+async def recurve_all_users(apply: bool = False, chunk_size: int = RECURVE_CHUNK_SIZE,
+                            curve: Optional[LevelCurve] = None) -> dict:
+    """
+    모든 사용자의 level/exp를 total_exp와 현재 레벨 곡선으로 다시 계산
+    apply=False면 DB를 바꾸지 않고 결과만 집계 (dry-run)
+    포인트는 이미 지급·사용된 재화이므로 그대로 둠
+    Returns: {
+        'scanned': 전체 사용자 수, 'changed': 레벨/exp가 달라지는 사용자 수,
+        'up': 레벨 상승, 'down': 레벨 하락, 'applied': 실제 반영 수 (dry-run이면 0),
+        'tiers': {현재 티어: {'up', 'down', 'tier_up', 'tier_down'}}
+    }
+    """
+    curve = curve or get_level_curve()
+    tier_items = sorted(get_tier_roles().items(), key=lambda x: x[1][0])
+    tier_names = [name for name, _ in tier_items]
+    thresholds = np.array([required for _, (required, _) in tier_items], dtype=np.int64)
+
+    report = {'scanned': 0, 'changed': 0, 'up': 0, 'down': 0, 'applied': 0, 'tiers': {}}
+    tiers: Dict[str, dict] = report['tiers']
+
+    after_rowid = 0
+    while True:
+        rows = await get_users_exp_chunk(after_rowid, chunk_size)
+        if not rows:
+            break
+        after_rowid = rows[-1][0]
+        report['scanned'] += len(rows)
+
+        data = np.array([row[3:] for row in rows], dtype=np.int64)
+        old_levels, old_exps, totals = data[:, 0], data[:, 1], data[:, 2]
+        new_levels, new_exps = levels_from_total_exp(curve, totals)
+
+        changed = np.nonzero((new_levels != old_levels) | (new_exps != old_exps))[0]
+        if changed.size == 0:
+            continue
+        report['changed'] += int(changed.size)
+
+        old_tiers = _tier_index(thresholds, old_levels[changed])
+        new_tiers = _tier_index(thresholds, new_levels[changed])
+        delta = np.sign(new_levels[changed] - old_levels[changed])
+        tier_delta = np.sign(new_tiers - old_tiers)
+        report['up'] += int((delta > 0).sum())
+        report['down'] += int((delta < 0).sum())
+        for tier_idx in np.unique(old_tiers):
+            mask = old_tiers == tier_idx
+            name = tier_names[tier_idx] if tier_idx >= 0 else NO_TIER
+            entry = tiers.setdefault(name, {'up': 0, 'down': 0, 'tier_up': 0, 'tier_down': 0})
+            entry['up'] += int((delta[mask] > 0).sum())
+            entry['down'] += int((delta[mask] < 0).sum())
+            entry['tier_up'] += int((tier_delta[mask] > 0).sum())
+            entry['tier_down'] += int((tier_delta[mask] < 0).sum())
+
+        if apply:
+            changes = [
+                (rows[i][1], rows[i][2], int(new_levels[i]), int(new_exps[i]), int(totals[i]))
+                for i in changed.tolist()
+            ]
+            report['applied'] += await apply_user_level_changes(changes)
+
+    if apply:
+        print(f"[LevelRecurve] {report['scanned']}명 중 {report['applied']}명 재계산 반영 "
+              f"(상승 {report['up']}, 하락 {report['down']})")
+    return report
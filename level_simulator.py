@@ -0,0 +1,116 @@
+# level_simulator.py - 레벨 곡선 시뮬레이터 (레벨별 누적 시간/EXP/포인트, 채널별 도달 일수 예측)
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from level_curve import LevelCurve, MAX_LEVEL, get_level_curve
+
+# 기본 하루 접속 시간대 (20시~23시, 3시간)
+DEFAULT_HOURS_SPEC = "20-23"
+# 설정 구간이 없을 때 표에 포함할 최대 레벨
+DEFAULT_TABLE_LEVEL = 100
+
+
+def parse_hours(spec: str) -> np.ndarray:
+    """
+    하루 접속 시간대 문자열 → 시간대별 접속 분 배열 (길이 24)
+    형식: "20-23" (20시~22시 59분), "7,12-13,21-1" (자정 넘김 가능), "20-23:30" (시간당 30분씩)
+    시작과 종료가 같은 구간 ("9-9")은 모호하므로 ValueError (하루 전체는 "0-24")
+    """
+    minutes = np.zeros(24, dtype=np.float64)
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        per_hour = 60.0
+        if ':' in part:
+            part, per_hour_str = part.split(':', 1)
+            per_hour = float(per_hour_str)
+            if not 0 <= per_hour <= 60:
+                raise ValueError(f"시간당 접속 분은 0~60이어야 합니다: {per_hour_str}")
+        if '-' in part:
+            start_str, end_str = part.split('-', 1)
+            start, end = int(start_str), int(end_str)
+        else:
+            start = int(part)
+            end = start + 1
+        if not (0 <= start <= 23 and 0 <= end <= 24):
+            raise ValueError(f"시간은 0~24 사이여야 합니다: {part}")
+        if start == end:
+            raise ValueError(f"시작 시와 종료 시가 같습니다 (한 시간만이면 \"{start}\"처럼 입력): {part}")
+        hours = np.arange(start, end if end > start else end + 24) % 24
+        minutes[hours] = per_hour
+    return minutes
+
+
+def build_table(curve: Optional[LevelCurve] = None, max_level: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    1~max_level 각 레벨에 도달하기까지의 누적 값 (1레벨 = 0)
+    Returns: {'level', 'minutes', 'exp', 'points'} - 기본 지급률(EXP_PER_MINUTE) 기준 분, 총 exp, 누적 포인트
+    """
+    curve = curve or get_level_curve()
+    if max_level is None:
+        ends = [end for _, end in curve.level_ranges.keys()]
+        max_level = max(ends) if ends else DEFAULT_TABLE_LEVEL
+    max_level = max(1, min(max_level, MAX_LEVEL))
+
+    # n레벨 도달 = 1~n-1레벨 레벨업 합계, 포인트는 2~n레벨 도달 시 지급된 합계
+    minutes = np.asarray(curve.minutes[1:max_level], dtype=np.int64)
+    required = np.asarray(curve.required[1:max_level], dtype=np.int64)
+    points = np.asarray(curve.points[2:max_level + 1], dtype=np.int64)
+    zero = np.zeros(1, dtype=np.int64)
+    return {
+        'level': np.arange(1, max_level + 1),
+        'minutes': np.concatenate([zero, np.cumsum(minutes)]),
+        'exp': np.concatenate([zero, np.cumsum(required)]),
+        'points': np.concatenate([zero, np.cumsum(points)]),
+    }
+
+
+def daily_exp(setting: Tuple[int, int, int, int], hours: np.ndarray) -> float:
+    """
+    채널 설정 (지급_주기_분, 지급_경험치, 시작_시, 종료_시)에서 하루 평균 획득 EXP
+    지급 시간대 안의 접속 분 × 지급_경험치 / 지급_주기_분
+    """
+    interval, amount, start_hour, end_hour = setting
+    if interval <= 0 or start_hour >= end_hour:
+        return 0.0
+    return float(hours[start_hour:end_hour].sum()) * amount / interval
+
+
+def project_days(table: Dict[str, np.ndarray], setting: Tuple[int, int, int, int],
+                 hours: np.ndarray) -> np.ndarray:
+    """각 레벨 도달까지 걸리는 일수 (EXP를 얻을 수 없으면 inf)"""
+    rate = daily_exp(setting, hours)
+    if rate <= 0:
+        return np.full(table['exp'].shape, np.inf)
+    return table['exp'] / rate
+
+
+def milestone_levels(table: Dict[str, np.ndarray], levels: Optional[Iterable[int]] = None) -> List[int]:
+    """표에 있는 레벨만 남긴 오름차순 목록 (기본: 10레벨 단위)"""
+    max_level = int(table['level'][-1])
+    if levels is None:
+        levels = range(10, max_level + 1, 10)
+    return sorted({level for level in levels if 1 <= level <= max_level})
+
+
+def format_duration(minutes: float) -> str:
+    """분을 읽기 쉬운 형식으로 변환"""
+    if minutes < 60:
+        return f"{minutes:.1f}분"
+    elif minutes < 1440:  # 24시간
+        hours = minutes / 60
+        return f"{hours:.1f}시간 ({minutes:.0f}분)"
+    else:
+        days = minutes / 1440
+        hours = (minutes % 1440) / 60
+        return f"{days:.1f}일 ({hours:.1f}시간)"
+
+
+def format_days(days: float) -> str:
+    """도달 일수 표시 (inf면 불가)"""
+    if not np.isfinite(days):
+        return "불가"
+    return f"{days:,.1f}일"
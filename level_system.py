@@ -1,29 +1,33 @@
 # level_system.py - 레벨 시스템 로직
 
-from config import EXP_PER_MINUTE, get_level_ranges
+import sqlite3
+
 from database import (
-    get_or_create_user, update_user_exp, update_user_level, update_user_points,
+    get_or_create_user, update_user_level, update_user_points,
 )
+from level_curve import get_level_curve
+import leaderboard_index
+
+# UPSERT ... RETURNING 지원 여부 (SQLite 3.35+)
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# 레벨 조회 직전에 호출되는 훅: async hook(user_id, guild_id) (음성 세션 EXP 정산 등)
+_level_query_hook = None
+
+
+def set_level_query_hook(hook):
+    """get_user_level_info 호출 전에 실행할 훅 등록 (None이면 해제)"""
+    global _level_query_hook
+    _level_query_hook = hook
 
 
 def get_level_range(level: int) -> tuple:
     """
     레벨에 해당하는 구간 정보 반환
-    Returns: (레벨업_시간_분, 레벨업_포인트) 또는 None
+    Returns: (레벨업_시간_분, 레벨업_포인트)
+    설정에 없는 레벨은 마지막 구간의 값 사용
     """
-    level_ranges = get_level_ranges()  # 동적으로 로드
-    
-    for (start, end), (minutes, points) in level_ranges.items():
-        if start <= level <= end:
-            return (minutes, points)
-    
-    # 설정에 없는 레벨은 마지막 구간의 값 사용
-    if level_ranges:
-        last_range = max(level_ranges.keys(), key=lambda x: x[1])
-        return level_ranges[last_range]
-    
-    # 기본값
-    return (10, 10)
+    return get_level_curve().get_level_range(level)
 
 
 def calculate_required_exp(level: int) -> int:
@@ -31,46 +35,32 @@ def calculate_required_exp(level: int) -> int:
     레벨업에 필요한 exp 계산
     레벨업 시간(분) * EXP_PER_MINUTE
     """
-    if level < 1:
-        level = 1
-    
-    minutes, _ = get_level_range(level)
-    return int(minutes * EXP_PER_MINUTE)
+    return get_level_curve().required_exp(level)
 
 
 def get_points_for_level(level: int) -> int:
     """레벨에 해당하는 레벨업 시 지급되는 포인트 반환"""
-    _, points = get_level_range(level)
-    return points
+    return get_level_curve().points_for_level(level)
 
 
 def calculate_level_from_total_exp(total_exp: int) -> tuple[int, int]:
     """
-    총 exp로부터 현재 레벨과 남은 exp 계산
+    총 exp로부터 현재 레벨과 남은 exp 계산 (레벨 1000 이상은 계산하지 않음)
     Returns: (level, current_exp)
     """
-    if total_exp < 0:
-        return (1, 0)
-    
-    level = 1
-    exp_needed = 0
-    
-    while True:
-        required = calculate_required_exp(level)
-        if exp_needed + required > total_exp:
-            current_exp = total_exp - exp_needed
-            return (level, current_exp)
-        exp_needed += required
-        level += 1
-        
-        # 무한 루프 방지 (레벨 1000 이상은 계산하지 않음)
-        if level > 1000:
-            return (1000, total_exp - exp_needed)
+    return get_level_curve().level_from_total_exp(total_exp)
+
+
+def calculate_total_exp_for_level(level: int) -> int:
+    """1레벨에서 해당 레벨에 도달하기까지 필요한 총 exp"""
+    return get_level_curve().total_exp_for_level(level)
 
 
 async def add_exp(user_id: int, guild_id: int, exp_to_add: int, use_transaction: bool = False) -> dict:
     """
-    사용자에게 exp 추가
+    사용자에게 exp 추가 (쓰기 연결 하나에서 원자적으로 처리)
+    UPSERT ... RETURNING으로 total_exp를 증분 반영한 뒤, 반환된 총 exp로 레벨 재계산
+    동시에 여러 곳에서 지급해도 누락 없음 (SQLite 3.35 미만은 INSERT OR IGNORE + UPDATE + SELECT)
     Args:
         use_transaction: True면 트랜잭션 모드 (커밋하지 않음, 호출자가 커밋/롤백 처리)
     Returns: {
@@ -81,59 +71,65 @@ async def add_exp(user_id: int, guild_id: int, exp_to_add: int, use_transaction:
         'new_points': int,
         'db': DB connection (use_transaction=True일 때만, commit/rollback/close 책임)
     }
+    use_transaction=True면 순위 인덱스(leaderboard_index)를 갱신하지 않으므로 커밋 후 호출자가 반영
     """
     from datetime import datetime
-    from database import get_mysql_connection, get_or_create_user
+    from database import get_mysql_connection
     
-    conn = None
-    cursor = None
-    
-    if use_transaction:
-        conn = await get_mysql_connection()
+    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:26]
+    conn = await get_mysql_connection()
+    try:
         cursor = await conn.cursor()  # aiosqlite: cursor()는 비동기(await 필요)
-
-        try:
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:26]
+        if _HAS_RETURNING:
             await cursor.execute(
-                "SELECT level, exp, points, total_exp FROM users WHERE user_id = ? AND guild_id = ?",
+                """INSERT INTO users 
+                   (user_id, guild_id, level, exp, points, total_exp, last_nickname_update)
+                   VALUES (?, ?, 1, 0, 0, ?, ?)
+                   ON CONFLICT(user_id, guild_id) DO UPDATE SET total_exp = total_exp + excluded.total_exp
+                   RETURNING level, points, total_exp""",
+                (user_id, guild_id, exp_to_add, now_str)
+            )
+        else:
+            await cursor.execute(
+                """INSERT OR IGNORE INTO users 
+                   (user_id, guild_id, level, exp, points, total_exp, last_nickname_update)
+                   VALUES (?, ?, 1, 0, 0, 0, ?)""",
+                (user_id, guild_id, now_str)
+            )
+            await cursor.execute(
+                "UPDATE users SET total_exp = total_exp + ? WHERE user_id = ? AND guild_id = ?",
+                (exp_to_add, user_id, guild_id)
+            )
+            await cursor.execute(
+                "SELECT level, points, total_exp FROM users WHERE user_id = ? AND guild_id = ?",
                 (user_id, guild_id)
             )
-            row = await cursor.fetchone()
-            if row is None:
-                await cursor.execute(
-                    """INSERT INTO users 
-                       (user_id, guild_id, level, exp, points, total_exp, last_nickname_update)
-                       VALUES (?, ?, 1, 0, 0, 0, ?)""",
-                    (user_id, guild_id, now_str)
-                )
-                user = {'level': 1, 'exp': 0, 'points': 0, 'total_exp': 0}
-            else:
-                user = {'level': row[0], 'exp': row[1], 'points': row[2], 'total_exp': row[3]}
-        except Exception as e:
-            await conn.rollback()
-            await conn.close()
-            raise e
-    else:
-        user = await get_or_create_user(user_id, guild_id)
-    
-    current_level = user['level']
-    current_exp = user['exp']
-    current_total_exp = user['total_exp']
-    current_points = user['points']
-    
-    new_total_exp = current_total_exp + exp_to_add
-    new_level, new_exp = calculate_level_from_total_exp(new_total_exp)
-    leveled_up = new_level > current_level
-    points_earned = 0
-    
-    if leveled_up:
-        for level in range(current_level + 1, new_level + 1):
-            points_earned += get_points_for_level(level)
-        new_points = current_points + points_earned
-        await update_user_level(user_id, guild_id, new_level, new_exp, new_points, new_total_exp, cursor=cursor)
-    else:
-        await update_user_exp(user_id, guild_id, new_exp, new_total_exp, cursor=cursor)
-        new_points = current_points
+        current_level, current_points, new_total_exp = await cursor.fetchone()
+        
+        curve = get_level_curve()
+        new_level, new_exp = curve.level_from_total_exp(new_total_exp)
+        leveled_up = new_level > current_level
+        points_earned = 0
+        
+        if leveled_up:
+            points_earned = curve.points_between(current_level, new_level)
+            await cursor.execute(
+                """UPDATE users SET level = ?, exp = ?, points = points + ?
+                   WHERE user_id = ? AND guild_id = ?""",
+                (new_level, new_exp, points_earned, user_id, guild_id)
+            )
+        else:
+            await cursor.execute(
+                "UPDATE users SET exp = ? WHERE user_id = ? AND guild_id = ?",
+                (new_exp, user_id, guild_id)
+            )
+        
+        if not use_transaction:
+            await conn.commit()
+    except Exception:
+        await conn.rollback()
+        await conn.close()
+        raise
     
     result = {
         'leveled_up': leveled_up,
@@ -141,18 +137,150 @@ async def add_exp(user_id: int, guild_id: int, exp_to_add: int, use_transaction:
         'new_level': new_level,
         'new_exp': new_exp,
         'points_earned': points_earned,
-        'new_points': new_points,
-        'old_total_exp': current_total_exp,
+        'new_points': current_points + points_earned,
+        'old_total_exp': new_total_exp - exp_to_add,
         'new_total_exp': new_total_exp,
-        'required_exp': calculate_required_exp(new_level)
+        'required_exp': curve.required_exp(new_level)
     }
     
     if use_transaction:
+        # 아직 커밋 전이므로 순위 인덱스는 호출자가 커밋한 뒤 leaderboard_index.note_user로 반영
         result['db'] = conn
+    else:
+        await conn.close()
+        leaderboard_index.note_user(
+            guild_id, user_id,
+            level=new_level if leveled_up else current_level,
+            exp=new_exp, points=result['new_points'], total_exp=new_total_exp
+        )
     
     return result
 
 
+async def _apply_exp_deltas(cursor, guild_id: int, deltas: dict) -> list:
+    """
+    한 길드의 {user_id: 추가_exp}를 트랜잭션 안에서 일괄 반영 (호출자가 commit/rollback)
+    없는 사용자는 생성, 조회는 IN 절, 갱신은 executemany 한 번
+    Returns: add_exp와 같은 형식의 결과 dict 리스트 (user_id, guild_id 포함)
+    """
+    from datetime import datetime
+    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:26]
+    user_ids = list(deltas.keys())
+    
+    await cursor.executemany(
+        """INSERT OR IGNORE INTO users 
+           (user_id, guild_id, level, exp, points, total_exp, last_nickname_update)
+           VALUES (?, ?, 1, 0, 0, 0, ?)""",
+        [(user_id, guild_id, now_str) for user_id in user_ids]
+    )
+    
+    rows = {}
+    # SQLite 바인딩 변수 수 제한을 넘지 않도록 나눠서 조회
+    for i in range(0, len(user_ids), 500):
+        chunk = user_ids[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        await cursor.execute(
+            f"""SELECT user_id, level, exp, points, total_exp FROM users
+                WHERE guild_id = ? AND user_id IN ({placeholders})""",
+            (guild_id, *chunk)
+        )
+        for row in await cursor.fetchall():
+            rows[row[0]] = row
+    
+    curve = get_level_curve()
+    results = []
+    params = []
+    for user_id, exp_to_add in deltas.items():
+        _, current_level, _, current_points, current_total_exp = rows[user_id]
+        new_total_exp = current_total_exp + exp_to_add
+        new_level, new_exp = curve.level_from_total_exp(new_total_exp)
+        leveled_up = new_level > current_level
+        points_earned = curve.points_between(current_level, new_level) if leveled_up else 0
+        # 레벨이 내려가지 않는 한 기존 레벨 유지 (add_exp와 동일: 레벨업일 때만 레벨 갱신)
+        stored_level = new_level if leveled_up else current_level
+        new_points = current_points + points_earned
+        params.append((stored_level, new_exp, new_points, new_total_exp, user_id, guild_id))
+        results.append({
+            'user_id': user_id,
+            'guild_id': guild_id,
+            'leveled_up': leveled_up,
+            'old_level': current_level,
+            'new_level': new_level,
+            'new_exp': new_exp,
+            'points_earned': points_earned,
+            'new_points': new_points,
+            'old_total_exp': current_total_exp,
+            'new_total_exp': new_total_exp,
+            'required_exp': curve.required_exp(new_level)
+        })
+    
+    await cursor.executemany(
+        """UPDATE users 
+           SET level = ?, exp = ?, points = ?, total_exp = ?
+           WHERE user_id = ? AND guild_id = ?""",
+        params
+    )
+    return results
+
+
+async def _commit_exp_deltas(by_guild: dict) -> list:
+    """{guild_id: {user_id: 추가_exp}}를 쓰기 연결 하나, 한 트랜잭션으로 반영"""
+    from database import get_mysql_connection
+    
+    conn = await get_mysql_connection()
+    try:
+        cursor = await conn.cursor()
+        results = []
+        for guild_id, guild_deltas in by_guild.items():
+            results.extend(await _apply_exp_deltas(cursor, guild_id, guild_deltas))
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    finally:
+        await conn.close()
+    
+    for result in results:
+        leaderboard_index.note_user(
+            result['guild_id'], result['user_id'],
+            level=result['new_level'] if result['leveled_up'] else result['old_level'],
+            exp=result['new_exp'], points=result['new_points'], total_exp=result['new_total_exp']
+        )
+    return results
+
+
+async def flush_exp_deltas(deltas: dict) -> list:
+    """
+    {(guild_id, user_id): 추가_exp}를 하나의 트랜잭션으로 반영
+    Returns: 사용자별 결과 dict 리스트 (add_exp 결과 + user_id, guild_id)
+    """
+    by_guild = {}
+    for (guild_id, user_id), amount in deltas.items():
+        if amount:
+            by_guild.setdefault(guild_id, {})[user_id] = amount
+    if not by_guild:
+        return []
+    return await _commit_exp_deltas(by_guild)
+
+
+async def add_exp_many(guild_id: int, entries) -> list:
+    """
+    여러 사용자에게 exp 일괄 지급 (이벤트 보상, 스터디 종료 등)
+    한 번의 IN 조회 + 한 트랜잭션, 같은 사용자가 여러 번 있으면 합산
+    Args:
+        entries: [(user_id, 추가_exp), ...]
+    Returns: 레벨업한 사용자의 결과 dict 리스트 (add_exp 결과 + user_id, guild_id) - 레벨업 로그·별명·칭호 갱신용
+    """
+    deltas = {}
+    for user_id, amount in entries:
+        deltas[user_id] = deltas.get(user_id, 0) + amount
+    deltas = {user_id: amount for user_id, amount in deltas.items() if amount}
+    if not deltas:
+        return []
+    results = await _commit_exp_deltas({guild_id: deltas})
+    return [result for result in results if result['leveled_up']]
+
+
 async def set_level(user_id: int, guild_id: int, target_level: int, award_points: bool = False) -> dict:
     """
     사용자의 레벨을 직접 설정
@@ -187,10 +315,10 @@ async def set_level(user_id: int, guild_id: int, target_level: int, award_points
             'required_exp': calculate_required_exp(target_level)
         }
     
+    curve = get_level_curve()
+    
     # 목표 레벨까지 필요한 총 exp 계산
-    total_exp_needed = 0
-    for level in range(1, target_level):
-        total_exp_needed += calculate_required_exp(level)
+    total_exp_needed = curve.total_exp_for_level(target_level)
     
     # 목표 레벨의 현재 exp는 0으로 설정
     new_exp = 0
@@ -199,8 +327,7 @@ async def set_level(user_id: int, guild_id: int, target_level: int, award_points
     # 포인트: 낮은→높은 레벨일 때만 (현재+1 ~ 목표 레벨) 구간 레벨업 포인트 지급, 높은→낮은 레벨은 지급 없음
     points_earned = 0
     if award_points and target_level > old_level:
-        for level in range(old_level + 1, target_level + 1):
-            points_earned += get_points_for_level(level)
+        points_earned = curve.points_between(old_level, target_level)
     new_points = current_points + points_earned
     
     # 데이터베이스 업데이트
@@ -214,12 +341,17 @@ async def set_level(user_id: int, guild_id: int, target_level: int, award_points
         'new_points': new_points,
         'old_total_exp': old_total_exp,
         'new_total_exp': new_total_exp,
-        'required_exp': calculate_required_exp(target_level)
+        'required_exp': curve.required_exp(target_level)
     }
 
 
 async def get_user_level_info(user_id: int, guild_id: int) -> dict:
     """사용자의 레벨 정보 조회"""
+    if _level_query_hook is not None:
+        try:
+            await _level_query_hook(user_id, guild_id)
+        except Exception as e:
+            print(f"[LevelSystem] 레벨 조회 전 정산 실패: {user_id} - {e}")
     user = await get_or_create_user(user_id, guild_id)
     
     current_level = user['level']
@@ -265,27 +397,20 @@ async def set_current_exp(user_id: int, guild_id: int, target_exp: int) -> dict:
     
     # 새로운 총 경험치 = 현재 레벨까지의 총 경험치 + 설정할 경험치
     new_total_exp = total_exp_before_current_level + target_exp
-    required_exp = calculate_required_exp(old_level)
+    curve = get_level_curve()
+    required_exp = curve.required_exp(old_level)
     
     # 설정한 경험치가 필요 경험치를 넘으면 레벨업 처리
     if target_exp >= required_exp:
         # 레벨업 처리
-        new_level, new_exp = calculate_level_from_total_exp(new_total_exp)
+        new_level, new_exp = curve.level_from_total_exp(new_total_exp)
     else:
         # 레벨은 그대로, 경험치만 변경
         new_level = old_level
         new_exp = target_exp
     
-    # 레벨 변화에 따른 포인트 계산
-    points_earned = 0
-    if new_level > old_level:
-        # 레벨업한 레벨들에 대한 포인트 지급
-        for level in range(old_level + 1, new_level + 1):
-            points_earned += get_points_for_level(level)
-    elif new_level < old_level:
-        # 레벨 다운인 경우 포인트 차감 (이론적으로는 발생하지 않아야 함)
-        for level in range(new_level + 1, old_level + 1):
-            points_earned -= get_points_for_level(level)
+    # 레벨 변화에 따른 포인트 계산 (레벨 다운이면 차감 - 이론적으로는 발생하지 않아야 함)
+    points_earned = curve.points_between(old_level, new_level) - curve.points_between(new_level, old_level)
     
     new_points = current_points + points_earned
     if new_points < 0:
@@ -303,7 +428,7 @@ async def set_current_exp(user_id: int, guild_id: int, target_exp: int) -> dict:
         'new_total_exp': new_total_exp,
         'points_earned': points_earned,
         'new_points': new_points,
-        'required_exp': calculate_required_exp(new_level)
+        'required_exp': curve.required_exp(new_level)
     }
 
 
@@ -332,18 +457,11 @@ async def set_exp(user_id: int, guild_id: int, target_total_exp: int) -> dict:
     current_points = user['points']
     
     # 새로운 레벨과 exp 계산
-    new_level, new_exp = calculate_level_from_total_exp(target_total_exp)
+    curve = get_level_curve()
+    new_level, new_exp = curve.level_from_total_exp(target_total_exp)
     
-    # 레벨 변화에 따른 포인트 계산
-    points_earned = 0
-    if new_level > old_level:
-        # 레벨업한 레벨들에 대한 포인트 지급
-        for level in range(old_level + 1, new_level + 1):
-            points_earned += get_points_for_level(level)
-    elif new_level < old_level:
-        # 레벨 다운인 경우 포인트 차감
-        for level in range(new_level + 1, old_level + 1):
-            points_earned -= get_points_for_level(level)
+    # 레벨 변화에 따른 포인트 계산 (레벨업이면 지급, 레벨 다운이면 차감)
+    points_earned = curve.points_between(old_level, new_level) - curve.points_between(new_level, old_level)
     
     new_points = current_points + points_earned
     if new_points < 0:
@@ -361,7 +479,7 @@ async def set_exp(user_id: int, guild_id: int, target_total_exp: int) -> dict:
         'new_total_exp': target_total_exp,
         'points_earned': points_earned,
         'new_points': new_points,
-        'required_exp': calculate_required_exp(new_level)
+        'required_exp': curve.required_exp(new_level)
     }
 
 
@@ -387,9 +505,8 @@ async def add_level(user_id: int, guild_id: int, levels_to_add: int) -> dict:
         new_level = 1
     
     # 목표 레벨까지 필요한 총 exp 계산
-    total_exp_needed = 0
-    for level in range(1, new_level):
-        total_exp_needed += calculate_required_exp(level)
+    curve = get_level_curve()
+    total_exp_needed = curve.total_exp_for_level(new_level)
     
     # 목표 레벨의 현재 exp는 0으로 설정
     new_exp = 0
@@ -410,7 +527,7 @@ async def add_level(user_id: int, guild_id: int, levels_to_add: int) -> dict:
         'new_points': new_points,
         'old_total_exp': old_total_exp,
         'new_total_exp': new_total_exp,
-        'required_exp': calculate_required_exp(new_level)
+        'required_exp': curve.required_exp(new_level)
     }
 
 
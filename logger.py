@@ -310,3 +310,50 @@ async def send_warning_log(bot, executor: discord.Member, target_user: discord.M
         await channel.send(embed=embed)
     except Exception as e:
         print(f"[Logger] 경고 로그 전송 실패: {e}")
+
+
+async def send_warning_expired_log(bot, guild: discord.Guild, user_id: int, expired_count: int, total_warnings: int):
+    """
+    경고 만료 로그 전송
+    """
+    if LOG_WARNING_CHANNEL_ID is None:
+        return
+    
+    try:
+        channel = bot.get_channel(LOG_WARNING_CHANNEL_ID)
+        if channel is None:
+            print(f"[Logger] 경고 로그 채널을 찾을 수 없습니다. (ID: {LOG_WARNING_CHANNEL_ID})")
+            return
+        
+        embed = discord.Embed(
+            title="⌛ 경고 만료 로그",
+            color=discord.Color.green(),
+            timestamp=datetime.now()
+        )
+        
+        member = guild.get_member(user_id) if guild else None
+        if member is not None:
+            user_value = f"{member.display_name} ({member.mention})\nID: {user_id}"
+        else:
+            user_value = f"<@{user_id}>\nID: {user_id}"
+        embed.add_field(
+            name="대상 사용자",
+            value=user_value,
+            inline=False
+        )
+        
+        embed.add_field(
+            name="만료된 경고",
+            value=f"**{expired_count}개**",
+            inline=True
+        )
+        
+        embed.add_field(
+            name="남은 경고 수",
+            value=f"**{total_warnings}개**",
+            inline=True
+        )
+        
+        await channel.send(embed=embed)
+    except Exception as e:
+        print(f"[Logger] 경고 만료 로그 전송 실패: {e}")
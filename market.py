@@ -1,6 +1,18 @@
 # market.py - 마켓 구매 내역 조회 스크립트
 
-from market_manager import get_item_purchase_summary, get_all_market_items
+import asyncio
+
+from database import init_database, close_database
+from market_manager import get_item_purchase_summary, get_all_market_items, load_market_catalog
+
+
+async def _load():
+    """DB에서 마켓 카탈로그 로드"""
+    await init_database()
+    try:
+        await load_market_catalog()
+    finally:
+        await close_database()
 
 
 def show_purchase_history():
@@ -43,6 +55,7 @@ def show_purchase_history():
 
 def main():
     """메인 함수"""
+    asyncio.run(_load())
     while True:
         print("\n" + "=" * 80)
         print("마켓 관리 시스템")
@@ -0,0 +1,73 @@
+# market_draw.py - 티켓 물품 추첨 (구매자별 티켓 수 가중치, 재현 가능한 시드 + DB 기록)
+
+import heapq
+import json
+import math
+import random
+import secrets
+from typing import Dict, Hashable, List, Optional
+
+from database import insert_market_draw
+from market_manager import MarketItem, get_market_catalog
+
+# 시드 최대값 (Discord 정수 옵션으로 그대로 입력할 수 있는 범위)
+MAX_SEED = 2 ** 53
+
+
+def weighted_sample(weights: Dict[Hashable, int], k: int, rng: random.Random) -> List[Hashable]:
+    """
+    가중치 비복원 추출 (Efraimidis–Spirakis): 후보마다 log(u)/w 키를 뽑아 큰 순서로 k개
+    티켓을 한 장씩 펼치지 않으므로 O(후보 수 · log k)
+    같은 rng 상태와 같은 순서의 weights면 항상 같은 결과
+    """
+    keyed = []
+    for candidate, weight in weights.items():
+        if weight <= 0:
+            continue
+        u = 1.0 - rng.random()  # (0, 1]
+        keyed.append((math.log(u) / weight, candidate))
+    return [candidate for _, candidate in heapq.nlargest(k, keyed, key=lambda x: x[0])]
+
+
+def build_pool(item: MarketItem) -> Dict[tuple, int]:
+    """
+    추첨 후보 {('user', user_id) 또는 ('name', 이름): 티켓 수}
+    user_id 연결 전 이름만 있는 티켓도 포함, 시드 재현을 위해 항상 같은 순서로 정렬
+    """
+    pool = {('user', user_id): count for user_id, count in sorted(item.buyer_counts.items()) if count > 0}
+    pool.update((('name', name), count) for name, count in sorted(item.legacy_counts.items()) if count > 0)
+    return pool
+
+
+async def draw_item(item: MarketItem, seed: Optional[int] = None, drawn_by: Optional[int] = None) -> dict:
+    """
+    티켓 물품 추첨 (draw_count명, 한 사람은 한 번만 당첨) 후 market_draws에 기록
+    seed가 없으면 새로 생성 (같은 구매 현황 + 같은 시드 = 같은 결과)
+    Returns: {'draw_id', 'seed', 'pool_size', 'total_tickets',
+              'winners': [{'user_id': int 또는 None, 'name', 'tickets'}]}
+    """
+    if seed is None:
+        seed = secrets.randbelow(MAX_SEED)
+    pool = build_pool(item)
+    chosen = weighted_sample(pool, item.draw_count, random.Random(seed))
+
+    user_names = get_market_catalog().user_names
+    winners = []
+    for kind, key in chosen:
+        if kind == 'user':
+            winners.append({'user_id': key, 'name': user_names.get(key, str(key)), 'tickets': pool[(kind, key)]})
+        else:
+            winners.append({'user_id': None, 'name': key, 'tickets': pool[(kind, key)]})
+
+    total_tickets = sum(pool.values())
+    pool_json = json.dumps([[kind, key, count] for (kind, key), count in pool.items()], ensure_ascii=False)
+    draw_id = await insert_market_draw(
+        item.item_id, item.code, str(seed), item.draw_count, len(pool), total_tickets,
+        pool_json, json.dumps(winners, ensure_ascii=False), drawn_by
+    )
+    print(f"[MarketDraw] {item.code} 추첨 #{draw_id}: 후보 {len(pool)}명, 티켓 {total_tickets}장, "
+          f"당첨 {len(winners)}명 (seed={seed})")
+    return {
+        'draw_id': draw_id, 'seed': seed, 'pool_size': len(pool),
+        'total_tickets': total_tickets, 'winners': winners,
+    }
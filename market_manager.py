@@ -1,14 +1,26 @@
-# market_manager.py - 마켓 파일 관리
+# market_manager.py - 마켓 관리 (DB 저장 + 메모리 카탈로그, market.txt는 가져오기/내보내기 형식)
 
 import os
 import re
 import asyncio
+from collections import Counter
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
+from database import (
+    get_market_rows, insert_market_item, delete_market_item, clear_market_items,
+    import_market_items, refund_market_ticket, assign_legacy_market_tickets,
+    is_migration_applied, mark_migration_applied,
+)
+
 
 MARKET_DIR = "market"
+# 카탈로그의 물품 묶음 이름이자 가져오기 기본 파일 (시작 시 DB가 비어 있으면 한 번 DB로 옮김)
+MARKET_FILE = "market.txt"
+_MIGRATION_NAME = "market_txt"
+# 내보내기 파일 (DB 내용을 market.txt 형식으로 저장)
+MARKET_EXPORT_FILE = "market_export.txt"
 
 # 파일별 락 관리 (동시 구매 방지)
 _file_locks: Dict[str, asyncio.Lock] = {}
@@ -19,7 +31,8 @@ class MarketItem:
     """마켓 아이템 데이터 클래스"""
     def __init__(self, name: str, code: str, draw_count: int, max_purchase: int,
                  price_per_ticket: int, quantity: int, tickets_sold: int, buyers: List[str],
-                 is_role: bool = False, role_name: str = None):
+                 is_role: bool = False, role_name: str = None, item_id: Optional[int] = None):
+        self.item_id = item_id  # market_items.item_id (DB에 저장되기 전이면 None)
         self.name = name
         self.code = code
         self.draw_count = draw_count  # 뽑는 인원 수 (구매된 티켓들 중 뽑을 개수)
@@ -27,21 +40,32 @@ class MarketItem:
         self.price_per_ticket = price_per_ticket  # 티켓 당 가격 (역할의 경우 역할 가격)
         self.quantity = quantity  # 총 티켓 수량 (None이면 무제한)
         self.tickets_sold = tickets_sold  # 티켓 발행 수
-        self.buyers = buyers  # 구매한 플레이어 명단 리스트
+        self.buyer_counts: Counter = Counter()  # {user_id: 티켓 수}
+        self.legacy_counts = Counter(buyers)  # market.txt에서 가져온 이름만 있는 티켓 {구매자 이름: 티켓 수}
         self.is_role = is_role  # 역할 아이템인지 여부
         self.role_name = role_name  # 역할 이름 (역할 아이템인 경우)
 
-    def get_user_ticket_count(self, user_name: str) -> int:
+    def add_buyer(self, user_id: int, count: int = 1):
+        """구매자 티켓 추가"""
+        self.buyer_counts[user_id] += count
+
+    def remove_buyer(self, user_id: int):
+        """구매 취소 시 구매자 티켓 1장 제거"""
+        if self.buyer_counts.get(user_id, 0) <= 1:
+            self.buyer_counts.pop(user_id, None)
+        else:
+            self.buyer_counts[user_id] -= 1
+
+    def get_user_ticket_count(self, user_id: int) -> int:
         """사용자가 구매한 티켓 수 반환"""
-        return sum(1 for buyer in self.buyers if buyer == user_name)
+        return self.buyer_counts.get(user_id, 0)
 
-    def can_purchase(self, user_name: str) -> bool:
+    def can_purchase(self, user_id: int) -> bool:
         """사용자가 구매 가능한지 확인"""
         if self.is_role:
             # 역할은 이미 가지고 있으면 구매 불가
-            return user_name not in self.buyers
-        user_tickets = self.get_user_ticket_count(user_name)
-        return user_tickets < self.max_purchase
+            return user_id not in self.buyer_counts
+        return self.get_user_ticket_count(user_id) < self.max_purchase
 
     def is_available(self) -> bool:
         """아이템이 구매 가능한지 확인 (수량 체크)"""
@@ -94,7 +118,7 @@ def parse_market_file(filename: str) -> List[MarketItem]:
         if line.startswith('#'):
             # 이전 아이템 저장
             if current_item is not None:
-                current_item.buyers = current_buyers
+                current_item.legacy_counts = Counter(current_buyers)
                 items.append(current_item)
                 current_buyers = []
 
@@ -165,17 +189,16 @@ def parse_market_file(filename: str) -> List[MarketItem]:
             i += 1
 
     if current_item is not None:
-        current_item.buyers = current_buyers
+        current_item.legacy_counts = Counter(current_buyers)
         items.append(current_item)
 
     return items
 
 
-def save_market_file(filename: str, items: List[MarketItem]):
-    """마켓 파일 저장"""
+def save_market_file(filename: str, items: List[MarketItem], user_names: Dict[int, str]):
+    """마켓 아이템을 market.txt 형식으로 저장 (내보내기용, 구매자는 user_names의 이름으로 기록)"""
     ensure_market_dir()
     filepath = os.path.join(MARKET_DIR, filename)
-
     with open(filepath, 'w', encoding='utf-8') as f:
         for item in items:
             f.write(f"# {item.name} : {item.code}\n")
@@ -186,30 +209,171 @@ def save_market_file(filename: str, items: List[MarketItem]):
                 f.write(f"{item.draw_count} : {item.max_purchase}\n")
                 f.write(f"p : {item.price_per_ticket}\n")
                 f.write(f"{item.tickets_sold}\n")
-            for buyer in item.buyers:
-                f.write(f"@{buyer}\n")
+            for user_id, count in item.buyer_counts.items():
+                name = user_names.get(user_id, str(user_id))
+                f.write(f"@{name}\n" * count)
+            for name, count in item.legacy_counts.items():
+                f.write(f"@{name}\n" * count)
             f.write("\n")
 
 
+class MarketCatalog:
+    """
+    DB의 마켓 물품을 메모리에 보관하는 목록 (시작 시 한 번 로드, 이후 쓰기 함수가 DB와 함께 갱신)
+    - by_code: 대소문자 구분 없는 물품 코드 → (filename, item)
+    - by_id: DB item_id → item
+    - by_user: user_id → {item: 티켓 수} (구매 내역 역색인)
+    - user_names: user_id → 마지막 구매 시 이름 (내보내기·요약 표시용)
+    """
+
+    def __init__(self, items_by_file: Dict[str, List[MarketItem]]):
+        self.items_by_file = items_by_file
+        self.by_code: Dict[str, Tuple[str, MarketItem]] = {}
+        self.by_id: Dict[int, MarketItem] = {}
+        self.by_user: Dict[int, Dict[MarketItem, int]] = {}
+        self.user_names: Dict[int, str] = {}
+        for filename, items in items_by_file.items():
+            for item in items:
+                self.by_code.setdefault(item.code.casefold(), (filename, item))
+                self.by_id[item.item_id] = item
+                for user_id, count in item.buyer_counts.items():
+                    self.by_user.setdefault(user_id, {})[item] = count
+
+    def find(self, code: str) -> Optional[Tuple[str, MarketItem]]:
+        return self.by_code.get(code.casefold())
+
+    def add(self, filename: str, item: MarketItem):
+        self.items_by_file.setdefault(filename, []).append(item)
+        self.by_code[item.code.casefold()] = (filename, item)
+        self.by_id[item.item_id] = item
+
+    def remove(self, filename: str, item: MarketItem):
+        items = self.items_by_file.get(filename, [])
+        if item in items:
+            items.remove(item)
+        if not items:
+            self.items_by_file.pop(filename, None)
+        self.by_code.pop(item.code.casefold(), None)
+        self.by_id.pop(item.item_id, None)
+        for user_id in item.buyer_counts:
+            purchases = self.by_user.get(user_id)
+            if purchases is not None:
+                purchases.pop(item, None)
+                if not purchases:
+                    del self.by_user[user_id]
+
+    def add_ticket(self, item: MarketItem, user_id: int, user_name: str):
+        item.add_buyer(user_id)
+        self.by_user.setdefault(user_id, {})[item] = item.buyer_counts[user_id]
+        self.user_names[user_id] = user_name
+
+    def remove_ticket(self, item: MarketItem, user_id: int):
+        item.remove_buyer(user_id)
+        purchases = self.by_user.get(user_id)
+        if purchases is None:
+            return
+        count = item.get_user_ticket_count(user_id)
+        if count:
+            purchases[item] = count
+        else:
+            purchases.pop(item, None)
+            if not purchases:
+                del self.by_user[user_id]
+
+
+_catalog = MarketCatalog({})
+
+
+def _item_from_row(row: dict) -> MarketItem:
+    return MarketItem(
+        name=row['name'], code=row['code'], draw_count=row['draw_count'],
+        max_purchase=row['max_purchase'], price_per_ticket=row['price'], quantity=row['quantity'],
+        tickets_sold=row['tickets_sold'], buyers=[], is_role=bool(row['is_role']),
+        role_name=row['role_name'], item_id=row['item_id']
+    )
+
+
+def _item_to_import(item: MarketItem) -> dict:
+    return {
+        'code': item.code, 'name': item.name, 'is_role': item.is_role, 'role_name': item.role_name,
+        'draw_count': item.draw_count, 'max_purchase': item.max_purchase,
+        'price': item.price_per_ticket, 'quantity': item.quantity,
+        'tickets_sold': item.tickets_sold, 'buyers': list(item.legacy_counts.elements()),
+    }
+
+
+async def _reload_catalog():
+    global _catalog
+    rows, tickets = await get_market_rows()
+    items = {row['item_id']: _item_from_row(row) for row in rows}
+    user_names: Dict[int, str] = {}
+    for item_id, user_id, user_name in tickets:
+        item = items.get(item_id)
+        if item is None:
+            continue
+        if user_id is None:
+            item.legacy_counts[user_name] += 1
+        else:
+            item.add_buyer(user_id)
+            user_names[user_id] = user_name
+    catalog = MarketCatalog({MARKET_FILE: list(items.values())} if items else {})
+    catalog.user_names = user_names
+    _catalog = catalog
+
+
+async def _migrate_legacy_file():
+    """DB에 물품이 없고 market/market.txt가 있으면 DB로 가져옴 (완료 여부는 DB에 기록, 파일은 git에 포함되어 있으므로 그대로 둠)"""
+    filepath = os.path.join(MARKET_DIR, MARKET_FILE)
+    if not os.path.exists(filepath) or await is_migration_applied(_MIGRATION_NAME):
+        return
+    if _catalog.items_by_file or os.path.exists(filepath + ".migrated"):
+        # 이미 DB에 물품이 있거나 예전 버전이 옮긴 뒤 이름을 바꾼 경우 (관리자가 마켓을 비워도 다시 가져오지 않음)
+        await mark_migration_applied(_MIGRATION_NAME)
+        return
+    items = parse_market_file(MARKET_FILE)
+    added = await import_market_items([_item_to_import(item) for item in items])
+    await mark_migration_applied(_MIGRATION_NAME)
+    print(f"[MarketManager] {MARKET_FILE} → DB 마이그레이션 완료 (물품 {added}/{len(items)}개)")
+    await _reload_catalog()
+
+
+async def reload_market_catalog():
+    """DB에서 메모리 카탈로그 다시 로드 (호출자가 마켓 락을 잡고 있어야 함)"""
+    await _reload_catalog()
+
+
+async def load_market_catalog():
+    """시작 시 호출: DB의 마켓 물품과 구매 명단을 메모리로 로드"""
+    await _reload_catalog()
+    await _migrate_legacy_file()
+    items = _catalog.items_by_file.get(MARKET_FILE, [])
+    tickets = sum(sum(item.buyer_counts.values()) + sum(item.legacy_counts.values()) for item in items)
+    print(f"[MarketManager] 마켓 물품 {len(items)}개, 티켓 {tickets}장 로드")
+
+
+def get_market_catalog() -> MarketCatalog:
+    """메모리 마켓 카탈로그 (읽기 전용으로 사용, 변경은 쓰기 함수로)"""
+    return _catalog
+
+
+def get_market_items(filename: str = MARKET_FILE) -> List[MarketItem]:
+    """마켓 아이템 목록 (메모리 카탈로그에서 조회)"""
+    return list(get_market_catalog().items_by_file.get(filename, []))
+
+
 def get_all_market_items() -> Dict[str, List[MarketItem]]:
-    """모든 마켓 파일의 아이템을 반환 {filename: [items]}"""
-    files = get_market_files()
-    all_items = {}
-    for filename in files:
-        items = parse_market_file(filename)
-        if items:
-            all_items[filename] = items
-    return all_items
+    """모든 마켓 아이템을 반환 {filename: [items]}"""
+    return dict(get_market_catalog().items_by_file)
 
 
 def find_item_by_code(code: str) -> Optional[Tuple[str, MarketItem]]:
     """물품 코드로 아이템 찾기 (filename, item) 반환"""
-    all_items = get_all_market_items()
-    for filename, items in all_items.items():
-        for item in items:
-            if item.code.lower() == code.lower():
-                return (filename, item)
-    return None
+    return get_market_catalog().find(code)
+
+
+def find_item_by_id(item_id: int) -> Optional[MarketItem]:
+    """DB item_id로 아이템 찾기 (카탈로그가 다시 로드되면 새 객체 반환)"""
+    return get_market_catalog().by_id.get(item_id)
 
 
 async def get_file_lock(filename: str) -> asyncio.Lock:
@@ -220,65 +384,138 @@ async def get_file_lock(filename: str) -> asyncio.Lock:
         return _file_locks[filename]
 
 
-def purchase_ticket(filename: str, item_code: str, user_name: str) -> bool:
-    """티켓 구매 처리 (파일 업데이트) - 동기 함수 (락은 호출 전에 획득해야 함)"""
-    items = parse_market_file(filename)
-    item = None
-    for i in items:
-        if i.code.lower() == item_code.lower():
-            item = i
-            break
-    if item is None:
-        return False
+def record_purchase(item: MarketItem, user_id: int, user_name: str):
+    """DB에 반영된 티켓 구매를 메모리 카탈로그에 반영"""
     item.tickets_sold += 1
-    item.buyers.append(user_name)
-    save_market_file(filename, items)
-    return True
+    _catalog.add_ticket(item, user_id, user_name)
+
+
+async def refund_ticket(item: MarketItem, ticket_id: int, user_id: int) -> Optional[int]:
+    """구매 취소 (역할 지급 실패 등). Returns: 환불 후 포인트 (실패 시 None)"""
+    points = await refund_market_ticket(ticket_id)
+    if points is not None:
+        item.tickets_sold = max(item.tickets_sold - 1, 0)
+        _catalog.remove_ticket(item, user_id)
+    return points
 
 
-def get_user_purchase_history(user_name: str) -> List[Tuple[str, MarketItem, int]]:
+def get_user_purchase_history(user_id: int) -> List[Tuple[str, MarketItem, int]]:
     """특정 사용자의 구매 내역 조회. Returns: [(filename, item, ticket_count), ...]"""
-    all_items = get_all_market_items()
-    user_purchases = []
-    for filename, items in all_items.items():
+    catalog = get_market_catalog()
+    return [
+        (catalog.by_code[item.code.casefold()][0], item, count)
+        for item, count in catalog.by_user.get(user_id, {}).items()
+    ]
+
+
+def get_item_purchase_summary() -> Dict[str, Dict[str, int]]:
+    """물품별 구매자 티켓 수. Returns: {물품_코드: {구매자 이름: 티켓_수}}"""
+    catalog = get_market_catalog()
+    summary = {}
+    for items in catalog.items_by_file.values():
         for item in items:
-            ticket_count = item.get_user_ticket_count(user_name)
-            if ticket_count > 0:
-                user_purchases.append((filename, item, ticket_count))
-    return user_purchases
-
-
-def add_market_item(filename: str, item: MarketItem) -> bool:
-    """마켓에 아이템 추가"""
-    items = parse_market_file(filename)
-    for existing_item in items:
-        if existing_item.code.lower() == item.code.lower():
-            return False
-    items.append(item)
-    save_market_file(filename, items)
+            buyers = Counter()
+            for user_id, count in item.buyer_counts.items():
+                buyers[catalog.user_names.get(user_id, str(user_id))] += count
+            buyers.update(item.legacy_counts)
+            if buyers:
+                summary.setdefault(item.code, {}).update(buyers)
+    return summary
+
+
+async def resolve_legacy_buyers(bot) -> int:
+    """
+    market.txt에서 가져온 이름만 있는 티켓을 서버 멤버의 user_id로 연결
+    레벨/운영자 표시를 뗀 닉네임(또는 사용자명)이 정확히 한 명과 일치할 때만 연결하고 나머지는 이름으로 남김
+    Returns: user_id가 연결된 티켓 수
+    """
+    from nickname_manager import get_original_nickname
+
+    # 카탈로그 재로드가 구매 반영·관리자 명령과 겹치지 않도록 마켓 락 안에서 처리
+    file_lock = await get_file_lock(MARKET_FILE)
+    async with file_lock:
+        pending = [item for items in _catalog.items_by_file.values() for item in items if item.legacy_counts]
+        if not pending:
+            return 0
+
+        # 이름 → {(user_id, guild_id)}
+        candidates: Dict[str, set] = {}
+        for guild in bot.guilds:
+            for member in guild.members:
+                if member.bot:
+                    continue
+                for name in {get_original_nickname(member.display_name), member.name}:
+                    candidates.setdefault(name, set()).add((member.id, guild.id))
+
+        assignments = []
+        for item in pending:
+            for name in item.legacy_counts:
+                matches = candidates.get(get_original_nickname(name), set())
+                if len({user_id for user_id, _ in matches}) == 1:
+                    user_id, guild_id = min(matches)
+                    assignments.append((user_id, guild_id, item.item_id, name))
+        if not assignments:
+            return 0
+        resolved = await assign_legacy_market_tickets(assignments)
+        await _reload_catalog()
+        print(f"[MarketManager] 이름만 있던 티켓 {resolved}장을 사용자 ID로 연결")
+        return resolved
+
+
+async def add_market_item(filename: str, item: MarketItem) -> bool:
+    """마켓에 아이템 추가 (같은 코드가 있으면 False)"""
+    if find_item_by_code(item.code) is not None:
+        return False
+    item_id = await insert_market_item(
+        item.code, item.name, item.is_role, item.role_name, item.draw_count,
+        item.max_purchase, item.price_per_ticket, item.quantity
+    )
+    if item_id is None:
+        return False
+    item.item_id = item_id
+    item.tickets_sold = 0
+    item.buyer_counts = Counter()
+    item.legacy_counts = Counter()
+    _catalog.add(filename, item)
     return True
 
 
-def clear_market_file(filename: str) -> bool:
-    """마켓 파일 내용 모두 비우기"""
-    filepath = os.path.join(MARKET_DIR, filename)
-    if not os.path.exists(filepath):
+async def clear_market_file(filename: str) -> bool:
+    """마켓 물품과 구매 기록 모두 비우기"""
+    if not _catalog.items_by_file.get(filename):
         return False
-    with open(filepath, 'w', encoding='utf-8') as f:
-        pass
+    await clear_market_items()
+    await _reload_catalog()
     return True
 
 
-def remove_market_item(filename: str, item_code: str) -> bool:
-    """마켓에서 아이템 제거"""
-    items = parse_market_file(filename)
-    removed = False
-    for i, item in enumerate(items):
-        if item.code.lower() == item_code.lower():
-            items.pop(i)
-            removed = True
-            break
-    if not removed:
+async def remove_market_item(filename: str, item_code: str) -> bool:
+    """마켓에서 아이템 제거 (구매 기록 포함)"""
+    result = find_item_by_code(item_code)
+    if result is None or result[0] != filename:
         return False
-    save_market_file(filename, items)
+    item = result[1]
+    await delete_market_item(item.item_id)
+    _catalog.remove(filename, item)
     return True
+
+
+def export_market_file(filename: str = MARKET_EXPORT_FILE) -> int:
+    """현재 마켓을 market.txt 형식으로 내보내기. Returns: 내보낸 물품 수"""
+    items = get_market_items()
+    save_market_file(filename, items, get_market_catalog().user_names)
+    return len(items)
+
+
+async def import_market_file(filename: str = MARKET_FILE) -> Tuple[int, int]:
+    """
+    market.txt 형식 파일에서 물품 가져오기 (이미 있는 코드는 건너뜀)
+    Returns: (추가된 물품 수, 파일의 물품 수) - 파일이 없으면 (0, 0)
+    """
+    items = parse_market_file(os.path.basename(filename))
+    if not items:
+        return 0, 0
+    added = await import_market_items([_item_to_import(item) for item in items])
+    if added:
+        await _reload_catalog()
+    return added, len(items)
@@ -0,0 +1,244 @@
+# market_queue.py - 물품별 구매 대기열 (워커 하나가 모인 구매를 검증 후 한 트랜잭션으로 반영)
+
+import asyncio
+import traceback
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+
+from config import MARKET_PURCHASE_TIMEOUT, MARKET_PURCHASE_WRITE_TIMEOUT, MARKET_PURCHASE_BATCH
+from database import purchase_market_tickets
+from market_manager import (
+    MarketItem, find_item_by_code, find_item_by_id, get_file_lock, get_market_catalog, record_purchase,
+    reload_market_catalog,
+)
+
+# 구매 결과 상태
+PURCHASE_OK = "ok"
+PURCHASE_NOT_FOUND = "not_found"   # 물품이 없어짐
+PURCHASE_SOLD_OUT = "sold_out"     # 수량 소진
+PURCHASE_LIMIT = "limit"           # 1인당 구매 수 초과 (역할은 이미 보유)
+PURCHASE_POINTS = "points"         # 포인트 부족
+PURCHASE_TIMEOUT = "timeout"       # 대기 제한 시간 초과 (구매되지 않음)
+PURCHASE_PENDING = "pending"       # DB 반영이 늦어져 결과 미확인 (반영되면 티켓목록에 표시됨)
+
+
+class PurchaseResult:
+    """구매 요청 하나의 처리 결과"""
+    __slots__ = ('status', 'ticket_id', 'points', 'ticket_count')
+
+    def __init__(self, status: str, ticket_id: Optional[int] = None, points: Optional[int] = None,
+                 ticket_count: int = 0):
+        self.status = status
+        self.ticket_id = ticket_id  # 환불(refund_ticket)용
+        self.points = points  # 구매 후 포인트
+        self.ticket_count = ticket_count  # 구매 후 해당 물품 보유 티켓 수
+
+    @property
+    def ok(self) -> bool:
+        return self.status == PURCHASE_OK
+
+
+class _PurchaseRequest:
+    __slots__ = ('user_id', 'guild_id', 'user_name', 'future', 'claimed', 'abandoned')
+
+    def __init__(self, user_id: int, guild_id: int, user_name: str, future: asyncio.Future):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.user_name = user_name
+        self.future = future
+        self.claimed = False  # 워커가 DB 쓰기에 포함함 (이후에는 취소 불가)
+        self.abandoned = False  # 호출자가 제한 시간 초과로 포기함
+
+
+def _rejected_status(item: Optional[MarketItem], user_id: int) -> str:
+    """DB 조건부 INSERT가 거부한 구매의 사유 (메모리 검증 이후 다른 경로로 팔린 경우 수량·제한, 아니면 포인트 부족)"""
+    if item is None:
+        return PURCHASE_NOT_FOUND
+    if item.quantity and item.tickets_sold >= item.quantity:
+        return PURCHASE_SOLD_OUT
+    if item.get_user_ticket_count(user_id) >= (1 if item.is_role else item.max_purchase):
+        return PURCHASE_LIMIT
+    return PURCHASE_POINTS
+
+
+class _ItemQueue:
+    """물품 하나의 대기열과 워커 (대기 요청이 없으면 워커 종료 후 _queues에서 제거)"""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.pending: Deque[_PurchaseRequest] = deque()
+        self.worker: Optional[asyncio.Task] = None
+        # 이 물품의 검증 + DB 쓰기 구간 (다른 물품의 구매나 관리자 명령은 기다리지 않음)
+        self.lock = get_item_lock(code)
+
+    def submit(self, request: _PurchaseRequest):
+        self.pending.append(request)
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self.pending:
+            # 같은 순간에 들어온 요청이 함께 처리되도록 한 번 양보
+            await asyncio.sleep(0)
+            batch = []
+            while self.pending and len(batch) < MARKET_PURCHASE_BATCH:
+                request = self.pending.popleft()
+                if not request.abandoned:
+                    batch.append(request)
+            if not batch:
+                continue
+            try:
+                await self._process(batch)
+            except Exception as e:
+                print(f"[MarketQueue] {self.code} 구매 처리 실패: {e}")
+                traceback.print_exc()
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+        # 마지막 확인과 제거 사이에 await가 없으므로 새 요청이 빠지지 않음
+        if _queues.get(self.code) is self:
+            del _queues[self.code]
+
+    async def _process(self, batch: List[_PurchaseRequest]):
+        def finish(request: _PurchaseRequest, result: PurchaseResult):
+            if not request.future.done():
+                request.future.set_result(result)
+
+        async with self.lock:
+            catalog = get_market_catalog()
+            found = find_item_by_code(self.code)
+            if found is None:
+                for request in batch:
+                    finish(request, PurchaseResult(PURCHASE_NOT_FOUND))
+                return
+            _, item = found
+
+            # 메모리 상태 + 이번 묶음에서 먼저 받아들인 구매로 수량·1인당 제한 검증
+            accepted: List[_PurchaseRequest] = []
+            overflow: List[_PurchaseRequest] = []  # 남은 수량을 넘은 요청 (앞 구매가 실패하면 다시 시도)
+            in_batch = Counter()
+            for request in batch:
+                if request.abandoned:
+                    continue
+                if item.quantity and item.tickets_sold + len(accepted) >= item.quantity:
+                    overflow.append(request)
+                    continue
+                owned = item.get_user_ticket_count(request.user_id) + in_batch[request.user_id]
+                limit = 1 if item.is_role else item.max_purchase
+                if owned >= limit:
+                    finish(request, PurchaseResult(PURCHASE_LIMIT, ticket_count=owned))
+                    continue
+                request.claimed = True
+                accepted.append(request)
+                in_batch[request.user_id] += 1
+            if not accepted:
+                for request in overflow:
+                    finish(request, PurchaseResult(PURCHASE_SOLD_OUT))
+                return
+
+            results = await purchase_market_tickets(
+                item.item_id,
+                [(r.user_id, r.guild_id, r.user_name, item.price_per_ticket) for r in accepted]
+            )
+            if results is None:
+                # DB 쓰기 전에 관리자가 물품을 삭제함
+                for request in accepted + overflow:
+                    finish(request, PurchaseResult(PURCHASE_NOT_FOUND))
+                return
+
+            # 메모리 카탈로그 변경만 전체 마켓 락으로 보호 (관리자 명령·추첨과 겹치지 않도록)
+            file_lock = await get_file_lock("market.txt")
+            async with file_lock:
+                # DB 쓰기 중에는 마켓 락이 없으므로 그 사이 카탈로그가 다시 로드되었을 수 있음
+                # 새 카탈로그가 이번 티켓을 읽었는지 알 수 없으므로 커밋 이후 상태로 한 번 더 로드
+                reloaded = get_market_catalog() is not catalog
+                if reloaded:
+                    await reload_market_catalog()
+                # 쓰기 전에 찾은 객체 대신 현재 카탈로그의 물품 사용 (삭제되었으면 None)
+                item = find_item_by_id(item.item_id)
+                for request, result in zip(accepted, results):
+                    if result is None:
+                        finish(request, PurchaseResult(_rejected_status(item, request.user_id)))
+                        continue
+                    ticket_id, points = result
+                    if item is None:
+                        finish(request, PurchaseResult(PURCHASE_OK, ticket_id, points))
+                        continue
+                    if not reloaded:
+                        record_purchase(item, request.user_id, request.user_name)
+                    finish(request, PurchaseResult(PURCHASE_OK, ticket_id, points,
+                                                   item.get_user_ticket_count(request.user_id)))
+
+            if item is None:
+                for request in overflow:
+                    finish(request, PurchaseResult(PURCHASE_NOT_FOUND))
+            elif item.tickets_sold < item.quantity:
+                # 포인트 부족으로 남은 수량은 다음 묶음에서 대기 순서대로 다시 처리
+                self.pending.extendleft(reversed(overflow))
+            else:
+                for request in overflow:
+                    finish(request, PurchaseResult(PURCHASE_SOLD_OUT))
+        if len(accepted) > 1:
+            print(f"[MarketQueue] {self.code} 구매 {len(batch)}건 중 {len(accepted)}건을 한 번에 처리")
+
+
+_queues: Dict[str, _ItemQueue] = {}
+# 물품 코드(casefold) → 락 (대기열이 없어져도 유지되어 추첨 등과 구매 처리를 직렬화)
+_item_locks: Dict[str, asyncio.Lock] = {}
+
+
+def get_item_lock(item_code: str) -> asyncio.Lock:
+    """
+    물품별 구매 처리 락 (워커가 검증 + DB 쓰기 + 메모리 반영 동안 보유)
+    추첨처럼 커밋됐지만 아직 메모리에 반영되지 않은 구매와 겹치면 안 되는 작업은 이 락을 먼저 잡은 뒤 마켓 락을 잡음
+    """
+    key = item_code.casefold()
+    lock = _item_locks.get(key)
+    if lock is None:
+        lock = _item_locks[key] = asyncio.Lock()
+    return lock
+
+
+async def submit_purchase(item_code: str, user_id: int, guild_id: int, user_name: str,
+                          timeout: float = MARKET_PURCHASE_TIMEOUT) -> PurchaseResult:
+    """
+    물품 대기열에 티켓 1장 구매 요청 후 결과 대기 (포인트 차감과 티켓 기록은 워커가 한 트랜잭션으로 처리)
+    - timeout 안에 처리가 시작되지 않으면 요청을 취소하고 PURCHASE_TIMEOUT 반환 (구매되지 않음)
+    - 이미 DB 쓰기에 포함된 요청은 취소할 수 없으므로 MARKET_PURCHASE_WRITE_TIMEOUT까지 더 기다리고,
+      그래도 끝나지 않으면 PURCHASE_PENDING 반환 (쓰기가 끝나면 구매는 반영됨)
+    디스코드 상호작용에서는 호출 전에 defer()로 응답 제한 시간을 늘려야 함
+    """
+    key = item_code.casefold()
+    queue = _queues.get(key)
+    if queue is None:
+        queue = _queues[key] = _ItemQueue(key)
+    request = _PurchaseRequest(user_id, guild_id, user_name, asyncio.get_running_loop().create_future())
+    queue.submit(request)
+    try:
+        return await asyncio.wait_for(asyncio.shield(request.future), timeout)
+    except asyncio.TimeoutError:
+        if not request.claimed:
+            request.abandoned = True
+            return PurchaseResult(PURCHASE_TIMEOUT)
+    try:
+        return await asyncio.wait_for(asyncio.shield(request.future), MARKET_PURCHASE_WRITE_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"[MarketQueue] {item_code} 구매 반영 지연 (user {user_id})")
+        return PurchaseResult(PURCHASE_PENDING)
+
+
+def describe_failure(result: PurchaseResult, item) -> str:
+    """실패한 구매 결과의 사용자 안내 문구"""
+    if result.status == PURCHASE_NOT_FOUND:
+        return "❌ 물품을 찾을 수 없습니다."
+    if result.status == PURCHASE_SOLD_OUT:
+        return "❌ 품절되었습니다."
+    if result.status == PURCHASE_LIMIT:
+        if item.is_role:
+            return f"❌ 이미 {item.role_name} 역할을 보유하고 있습니다."
+        return f"❌ 최대 구매 가능 수를 초과했습니다.\n현재: {result.ticket_count}개 / 최대: {item.max_purchase}개"
+    if result.status == PURCHASE_POINTS:
+        return f"❌ 포인트가 부족합니다.\n필요: {item.price_per_ticket:,}"
+    if result.status == PURCHASE_PENDING:
+        return "⏳ 구매 처리가 지연되고 있습니다. 잠시 후 티켓 목록에서 구매 여부를 확인해주세요."
+    return "❌ 구매 요청이 많아 처리하지 못했습니다. 잠시 후 다시 시도해주세요."
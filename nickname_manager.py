@@ -2,10 +2,11 @@
 
 import asyncio
 import re
+import time
 import discord
 from config import NICKNAME_FORMAT, NICKNAME_REFRESH_INTERVAL
 from database import get_all_users_for_nickname_refresh, update_last_nickname_update, get_user
-from role_manager import update_tier_role
+from role_manager import plan_tier_roles
 from utils import has_jk_role
 
 
@@ -92,6 +93,30 @@ def format_nickname_with_level(original_nickname: str, level: int) -> str:
     return formatted
 
 
+def can_edit_nickname(member) -> bool:
+    """봇이 해당 멤버의 닉네임을 변경할 수 있는지 여부"""
+    me = member.guild.me
+    # 봇이 닉네임을 변경할 수 있는 권한이 있는지 확인
+    if not me.guild_permissions.manage_nicknames:
+        return False
+    # 서버 소유자의 닉네임은 디스코드가 봇의 변경을 허용하지 않음
+    if member == member.guild.owner:
+        return False
+    # 사용자가 봇보다 높은 권한을 가지고 있으면 변경 불가
+    if member.top_role >= me.top_role:
+        return False
+    return True
+
+
+def desired_nickname(member, level: int) -> str:
+    """레벨(JK 역할이면 운영자 아이콘)을 반영한 닉네임"""
+    # display_name은 서버별 닉네임, 없으면 전역 닉네임
+    current_nickname = member.display_name or member.name
+    if has_jk_role(member):
+        return format_nickname_with_jk(get_original_nickname(current_nickname))
+    return format_nickname_with_level(current_nickname, level)
+
+
 async def update_user_nickname(member, level: int):
     """사용자 닉네임에 레벨 표시 업데이트"""
     # 봇이 변경 중임을 표시 (무한 루프 방지)
@@ -99,41 +124,11 @@ async def update_user_nickname(member, level: int):
         member.guild.me._nickname_update_in_progress.add(member.id)
     
     try:
-        # JK 역할을 가진 사용자는 운영자 아이콘 표시
-        if has_jk_role(member):
-            # 봇이 닉네임을 변경할 수 있는 권한이 있는지 확인
-            if not member.guild.me.guild_permissions.manage_nicknames:
-                return False
-            
-            # 사용자가 봇보다 높은 권한을 가지고 있으면 변경 불가
-            if member.top_role >= member.guild.me.top_role and member != member.guild.owner:
-                return False
-            
-            # 현재 닉네임 가져오기
-            current_nickname = member.display_name or member.name
-            original_nickname = get_original_nickname(current_nickname)
-            new_nickname = format_nickname_with_jk(original_nickname)
-            
-            # 닉네임이 변경되지 않았으면 스킵
-            if new_nickname == current_nickname:
-                return True
-            
-            await member.edit(nick=new_nickname)
-            await update_last_nickname_update(member.id, member.guild.id)
-            print(f"[NicknameManager] Updated nickname for {member.name} to {new_nickname} (JK role)")
-            return True
-        
-        # 봇이 닉네임을 변경할 수 있는 권한이 있는지 확인
-        if not member.guild.me.guild_permissions.manage_nicknames:
-            return False
-        
-        # 사용자가 봇보다 높은 권한을 가지고 있으면 변경 불가
-        if member.top_role >= member.guild.me.top_role and member != member.guild.owner:
+        if not can_edit_nickname(member):
             return False
         
-        # 현재 닉네임 가져오기 (display_name은 서버별 닉네임, 없으면 전역 닉네임)
         current_nickname = member.display_name or member.name
-        new_nickname = format_nickname_with_level(current_nickname, level)
+        new_nickname = desired_nickname(member, level)
         
         # 닉네임이 변경되지 않았으면 스킵
         if new_nickname == current_nickname:
@@ -142,7 +137,8 @@ async def update_user_nickname(member, level: int):
         await member.edit(nick=new_nickname)
         await update_last_nickname_update(member.id, member.guild.id)
         
-        print(f"[NicknameManager] Updated nickname for {member.name} to {new_nickname}")
+        suffix = " (JK role)" if has_jk_role(member) else ""
+        print(f"[NicknameManager] Updated nickname for {member.name} to {new_nickname}{suffix}")
         return True
         
     except discord.Forbidden:
@@ -160,49 +156,142 @@ async def update_user_nickname(member, level: int):
             member.guild.me._nickname_update_in_progress.discard(member.id)
 
 
+def _fresh_tier_roles(member: discord.Member, level: int) -> list | None:
+    """
+    캐시의 최신 멤버 정보로 티어 반영 역할 목록을 다시 계산 (member.edit 직전에 호출)
+    전달받은 member 객체 이후에 추가된 역할(구매 보상 등)이 roles=로 덮어써져 빠지지 않도록 함
+    """
+    fresh = member.guild.get_member(member.id) or member
+    return plan_tier_roles(fresh, level, log=False)[1]
+
+
+async def reconcile_member(member: discord.Member, level: int) -> tuple[bool, str | None, str | None]:
+    """
+    닉네임(레벨 표시)과 티어 역할을 한 번에 맞춤
+    바꿀 것이 있을 때만 member.edit(nick=..., roles=...) 한 번 호출 (닉네임·역할 제거·추가를 따로 요청하지 않음)
+    Returns: (성공 여부, 이전 티어 이름, 새 티어 이름) - update_tier_role과 동일
+    """
+    current_nickname = member.display_name or member.name
+    new_nickname = None
+    if can_edit_nickname(member):
+        desired = desired_nickname(member, level)
+        if desired != current_nickname:
+            new_nickname = desired
+    roles_ok, new_roles, old_tier, new_tier = plan_tier_roles(member, level)
+    
+    if new_nickname is None and new_roles is None:
+        return (roles_ok, old_tier, new_tier)
+    
+    changes = {}
+    if new_nickname is not None:
+        changes['nick'] = new_nickname
+    if new_roles is not None:
+        # 티어가 바뀔 때만 roles=를 보내고, 목록은 요청 직전의 멤버 캐시로 다시 만듦
+        new_roles = _fresh_tier_roles(member, level)
+        if new_roles is not None:
+            changes['roles'] = new_roles
+    if not changes:
+        return (roles_ok, old_tier, new_tier)
+    
+    # 봇이 변경 중임을 표시 (무한 루프 방지)
+    if hasattr(member.guild.me, '_nickname_update_in_progress'):
+        member.guild.me._nickname_update_in_progress.add(member.id)
+    try:
+        await member.edit(**changes, reason=f"레벨 {level} 표시 동기화")
+        if new_nickname is not None:
+            await update_last_nickname_update(member.id, member.guild.id)
+        done = []
+        if new_nickname is not None:
+            done.append(f"nick → {new_nickname}")
+        if new_roles is not None:
+            done.append(f"tier {old_tier} → {new_tier}")
+        print(f"[NicknameManager] Reconciled {member.name}: {', '.join(done)}")
+        return (roles_ok, old_tier, new_tier)
+    except discord.Forbidden:
+        if new_nickname is None or new_roles is None:
+            print(f"[NicknameManager] No permission to update {member.name}")
+            return (False, old_tier, new_tier)
+        # 닉네임 변경이 거부되면 요청 전체가 실패하므로 역할만 다시 적용
+        print(f"[NicknameManager] No permission to change nickname for {member.name}, retrying roles only")
+        try:
+            new_roles = _fresh_tier_roles(member, level)
+            if new_roles is None:
+                return (roles_ok, old_tier, new_tier)
+            await member.edit(roles=new_roles, reason=f"레벨 {level} 표시 동기화")
+            print(f"[NicknameManager] Reconciled {member.name}: tier {old_tier} → {new_tier}")
+            return (roles_ok, old_tier, new_tier)
+        except discord.HTTPException as e:
+            print(f"[NicknameManager] Failed to update roles for {member.name}: {e}")
+            return (False, old_tier, new_tier)
+    except discord.HTTPException as e:
+        print(f"[NicknameManager] Failed to update {member.name}: {e}")
+        return (False, old_tier, new_tier)
+    finally:
+        if hasattr(member.guild.me, '_nickname_update_in_progress'):
+            member.guild.me._nickname_update_in_progress.discard(member.id)
+
+
+def member_needs_sync(member: discord.Member, level: int) -> bool:
+    """닉네임 또는 티어 역할이 레벨과 어긋났는지 여부 (게이트웨이 캐시만 사용, API 호출 없음)"""
+    if can_edit_nickname(member) and desired_nickname(member, level) != (member.display_name or member.name):
+        return True
+    _, new_roles, _, _ = plan_tier_roles(member, level, log=False)
+    return new_roles is not None
+
+
+def find_drifted_members(bot, users: list) -> tuple[list, int]:
+    """
+    DB 레벨과 캐시된 멤버 정보를 비교해 동기화가 필요한 멤버만 추림
+    Returns: ([(member, level), ...], 확인한 멤버 수)
+    """
+    drifted = []
+    checked = 0
+    for user_data in users:
+        guild = bot.get_guild(user_data['guild_id'])
+        if guild is None:
+            continue
+        member = guild.get_member(user_data['user_id'])
+        if member is None or member.bot:
+            continue
+        checked += 1
+        if member_needs_sync(member, user_data['level']):
+            drifted.append((member, user_data['level']))
+    return drifted, checked
+
+
 async def refresh_all_nicknames(bot):
-    """모든 사용자의 닉네임 새로고침 (1시간마다 실행)"""
+    """
+    모든 사용자의 닉네임·티어 역할 새로고침 (1시간마다 실행)
+    먼저 메모리에서 어긋난 멤버만 골라낸 뒤 그 멤버들에게만 API 요청과 딜레이를 사용
+    """
     while True:
         try:
             await asyncio.sleep(NICKNAME_REFRESH_INTERVAL)
             
             print("[NicknameManager] Starting nickname refresh cycle...")
+            started = time.monotonic()
             
-            # 모든 사용자 조회
+            # 모든 사용자 조회 후 어긋난 멤버만 추림
             users = await get_all_users_for_nickname_refresh()
+            drifted, checked = find_drifted_members(bot, users)
             
             updated_count = 0
             failed_count = 0
             
-            for user_data in users:
-                user_id = user_data['user_id']
-                guild_id = user_data['guild_id']
-                level = user_data['level']
-                
-                # 서버 조회
-                guild = bot.get_guild(guild_id)
-                if guild is None:
-                    continue
-                
-                # 멤버 조회
-                member = guild.get_member(user_id)
-                if member is None:
-                    continue
-                
-                # 닉네임 업데이트
-                success = await update_user_nickname(member, level)
+            for member, level in drifted:
+                # 닉네임·티어 역할 동기화 (한 번의 요청, 축하 메시지는 보내지 않음 - 동기화이므로)
+                success, _, _ = await reconcile_member(member, level)
                 if success:
                     updated_count += 1
                 else:
                     failed_count += 1
                 
-                # 티어 역할 동기화 (축하 메시지는 보내지 않음 - 동기화이므로)
-                await update_tier_role(member, level)
-                
                 # API 레이트 리밋 방지를 위해 약간의 딜레이
                 await asyncio.sleep(0.1)
             
-            print(f"[NicknameManager] Nickname refresh completed: {updated_count} updated, {failed_count} failed")
+            elapsed = time.monotonic() - started
+            print(f"[NicknameManager] Nickname refresh completed in {elapsed:.1f}s: "
+                  f"{checked} checked, {len(drifted)} drifted, {updated_count} updated, {failed_count} failed")
             
         except Exception as e:
             print(f"[NicknameManager] Error in nickname refresh cycle: {e}")
@@ -262,9 +351,7 @@ async def sync_level_display(member: discord.Member) -> bool:
         user = await get_user(member.id, member.guild.id)
         if not user:
             return False
-        level = user["level"]
-        await check_and_restore_nickname(member, level)
-        await update_tier_role(member, level)
+        await reconcile_member(member, user["level"])
         return True
     except Exception as e:
         print(f"[NicknameManager] sync_level_display 오류: {member.name} - {e}")
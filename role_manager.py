@@ -1,9 +1,97 @@
 # role_manager.py - 티어 역할 관리
 
-import asyncio
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
 import discord
 from config import get_tier_roles
-from database import get_all_users_for_nickname_refresh
+
+
+class TierTable:
+    """
+    tier_roles.txt 설정을 도달 레벨 오름차순으로 정리한 조회 테이블
+    레벨 → 티어는 bisect로 O(log 티어 수)
+    """
+
+    def __init__(self, tier_roles: Dict[str, Tuple[int, str]]):
+        # 도달 레벨이 같으면 기존 get_tier_for_level처럼 dict 순서상 먼저 나온 티어가 우선
+        items = sorted(tier_roles.items(), key=lambda x: x[1][0])
+        ordered: List[Tuple[int, str, str]] = []
+        for tier_name, (required_level, role_name) in items:
+            if ordered and ordered[-1][0] == required_level:
+                continue
+            ordered.append((required_level, tier_name, role_name))
+        self.thresholds = [required for required, _, _ in ordered]
+        self.tiers = [(tier_name, role_name) for _, tier_name, role_name in ordered]
+        self.role_names = frozenset(role_name for _, role_name in tier_roles.values())
+        # 역할 이름 → 티어 이름 (이전 티어 판별용)
+        self.tier_by_role_name: Dict[str, str] = {}
+        for tier_name, (_, role_name) in tier_roles.items():
+            self.tier_by_role_name.setdefault(role_name, tier_name)
+
+    def tier_for_level(self, level: int) -> Optional[Tuple[str, str]]:
+        """레벨에 해당하는 (티어_이름, 역할_이름) 또는 None"""
+        i = bisect_right(self.thresholds, level) - 1
+        return self.tiers[i] if i >= 0 else None
+
+
+_tier_table: Optional[TierTable] = None
+_tier_table_version = -1
+
+# {guild_id: {역할_이름: discord.Role}} - 역할 생성/수정/삭제 이벤트 때 무효화
+_role_index: Dict[int, Dict[str, discord.Role]] = {}
+
+
+def get_tier_table() -> TierTable:
+    """현재 티어 역할 설정의 TierTable (설정 파일 버전이 바뀌면 재생성)"""
+    global _tier_table, _tier_table_version
+    from tier_roles_manager import tier_roles_version
+    version = tier_roles_version()
+    if _tier_table is None or version != _tier_table_version:
+        _tier_table = TierTable(get_tier_roles())
+        _tier_table_version = version
+    return _tier_table
+
+
+def get_role_by_name(guild: discord.Guild, role_name: str) -> Optional[discord.Role]:
+    """역할 이름으로 역할 조회 (길드별 인덱스, discord.utils.get과 같이 같은 이름이면 먼저 나온 역할)"""
+    index = _role_index.get(guild.id)
+    if index is None:
+        index = {}
+        for role in guild.roles:
+            index.setdefault(role.name, role)
+        _role_index[guild.id] = index
+    return index.get(role_name)
+
+
+def get_guild_tier_roles(guild: discord.Guild) -> List[discord.Role]:
+    """서버에 존재하는 모든 티어 역할"""
+    roles = (get_role_by_name(guild, name) for name in get_tier_table().role_names)
+    return [role for role in roles if role is not None]
+
+
+def invalidate_role_index(guild_id: Optional[int] = None):
+    """역할 인덱스 폐기 (guild_id가 None이면 전체)"""
+    if guild_id is None:
+        _role_index.clear()
+    else:
+        _role_index.pop(guild_id, None)
+
+
+def setup_role_index_events(bot):
+    """역할 생성/수정/삭제 시 해당 서버의 역할 인덱스 무효화"""
+    @bot.event
+    async def on_guild_role_create(role: discord.Role):
+        invalidate_role_index(role.guild.id)
+
+    @bot.event
+    async def on_guild_role_update(before: discord.Role, after: discord.Role):
+        invalidate_role_index(after.guild.id)
+
+    @bot.event
+    async def on_guild_role_delete(role: discord.Role):
+        invalidate_role_index(role.guild.id)
 
 
 def get_tier_for_level(level: int) -> tuple[str, str] | None:
@@ -11,15 +99,51 @@ def get_tier_for_level(level: int) -> tuple[str, str] | None:
     레벨에 해당하는 티어 정보 반환
     Returns: (티어_이름, 역할_이름) 또는 None
     """
-    tier_roles = get_tier_roles()  # 동적으로 로드
-    # 레벨이 높은 순서대로 정렬 (가장 높은 티어부터 확인)
-    sorted_tiers = sorted(tier_roles.items(), key=lambda x: x[1][0], reverse=True)
+    return get_tier_table().tier_for_level(level)
+
+
+def plan_tier_roles(member: discord.Member, level: int, log: bool = True) -> tuple[bool, list | None, str | None, str | None]:
+    """
+    레벨에 맞는 티어 역할을 반영한 멤버 역할 목록 계산 (member.edit(roles=...)용, API 호출 없음)
+    @everyone은 제외하고, 봇보다 높은 역할을 바꿔야 하면 변경 불가로 처리
+    log=False면 변경 불가 사유를 출력하지 않음 (전체 멤버 검사용)
+    Returns: (성공 여부, 새 역할 목록 또는 None(변경 불필요/불가), 이전 티어 이름, 새 티어 이름)
+    """
+    guild = member.guild
+    table = get_tier_table()
+    tier_info = table.tier_for_level(level)
+    new_tier_name = tier_info[0] if tier_info else None
     
-    for tier_name, (required_level, role_name) in sorted_tiers:
-        if level >= required_level:
-            return (tier_name, role_name)
+    current_roles = [role for role in member.roles if not role.is_default()]
+    tier_role_ids = {role.id for role in get_guild_tier_roles(guild)}
+    user_tier_roles = [role for role in current_roles if role.id in tier_role_ids]
+    old_tier_name = table.tier_by_role_name.get(user_tier_roles[0].name) if user_tier_roles else None
     
-    return None
+    target_role = None
+    if tier_info is not None:
+        target_role = get_role_by_name(guild, tier_info[1])
+        if target_role is None:
+            if log:
+                print(f"[RoleManager] Role '{tier_info[1]}' not found in guild")
+            return (False, None, old_tier_name, new_tier_name)
+    
+    to_remove = [role for role in user_tier_roles if role != target_role]
+    to_add = [target_role] if target_role is not None and target_role not in user_tier_roles else []
+    if not to_remove and not to_add:
+        return (True, None, old_tier_name, new_tier_name)
+    
+    me = guild.me
+    if not me.guild_permissions.manage_roles:
+        if log:
+            print(f"[RoleManager] No permission to manage roles for {member.name}")
+        return (False, None, old_tier_name, new_tier_name)
+    if any(role >= me.top_role for role in to_remove + to_add):
+        if log:
+            print(f"[RoleManager] Tier role is higher than bot role, cannot update {member.name}")
+        return (False, None, old_tier_name, new_tier_name)
+    
+    new_roles = [role for role in current_roles if role not in to_remove] + to_add
+    return (True, new_roles, old_tier_name, new_tier_name)
 
 
 async def update_tier_role(member: discord.Member, level: int) -> tuple[bool, str | None, str | None]:
@@ -36,7 +160,8 @@ async def update_tier_role(member: discord.Member, level: int) -> tuple[bool, st
             return (False, None, None)
         
         # 현재 레벨에 해당하는 티어 확인
-        tier_info = get_tier_for_level(level)
+        table = get_tier_table()
+        tier_info = table.tier_for_level(level)
         if tier_info is None:
             # 티어가 없으면 모든 티어 역할 제거
             await remove_all_tier_roles(member)
@@ -45,7 +170,7 @@ async def update_tier_role(member: discord.Member, level: int) -> tuple[bool, st
         tier_name, target_role_name = tier_info
         
         # 서버에서 역할 찾기
-        target_role = discord.utils.get(member.guild.roles, name=target_role_name)
+        target_role = get_role_by_name(member.guild, target_role_name)
         if target_role is None:
             print(f"[RoleManager] Role '{target_role_name}' not found in guild")
             return (False, None, None)
@@ -53,25 +178,14 @@ async def update_tier_role(member: discord.Member, level: int) -> tuple[bool, st
         # 사용자가 이미 해당 역할을 가지고 있는지 확인
         has_target_role = target_role in member.roles
         
-        # 모든 티어 역할 목록 가져오기
-        tier_roles = get_tier_roles()  # 동적으로 로드
-        all_tier_role_names = [role_name for _, (_, role_name) in tier_roles.items()]
-        all_tier_roles = [discord.utils.get(member.guild.roles, name=role_name) 
-                         for role_name in all_tier_role_names]
-        all_tier_roles = [role for role in all_tier_roles if role is not None]
-        
         # 사용자가 가지고 있는 티어 역할 찾기
-        user_tier_roles = [role for role in all_tier_roles if role in member.roles]
+        tier_role_ids = {role.id for role in get_guild_tier_roles(member.guild)}
+        user_tier_roles = [role for role in member.roles if role.id in tier_role_ids]
         
-        # 이전 티어 이름 찾기
+        # 이전 티어 이름 찾기 (가지고 있는 티어 역할의 이름으로)
         old_tier_name = None
         if user_tier_roles:
-            # 사용자가 가지고 있는 티어 역할의 이름으로 이전 티어 찾기
-            old_role_name = user_tier_roles[0].name
-            for tier_key, (_, role_name) in tier_roles.items():
-                if role_name == old_role_name:
-                    old_tier_name = tier_key
-                    break
+            old_tier_name = table.tier_by_role_name.get(user_tier_roles[0].name)
         
         # 이미 올바른 역할만 가지고 있으면 스킵 (티어 변경 없음)
         if has_target_role and len(user_tier_roles) == 1 and user_tier_roles[0] == target_role:
@@ -117,15 +231,9 @@ async def remove_all_tier_roles(member: discord.Member) -> bool:
     사용자에게서 모든 티어 역할 제거
     """
     try:
-        # 모든 티어 역할 목록 가져오기
-        tier_roles = get_tier_roles()  # 동적으로 로드
-        all_tier_role_names = [role_name for _, (_, role_name) in tier_roles.items()]
-        all_tier_roles = [discord.utils.get(member.guild.roles, name=role_name) 
-                         for role_name in all_tier_role_names]
-        all_tier_roles = [role for role in all_tier_roles if role is not None]
-        
         # 사용자가 가지고 있는 티어 역할 찾기
-        user_tier_roles = [role for role in all_tier_roles if role in member.roles]
+        tier_role_ids = {role.id for role in get_guild_tier_roles(member.guild)}
+        user_tier_roles = [role for role in member.roles if role.id in tier_role_ids]
         
         if not user_tier_roles:
             return True
@@ -148,39 +256,10 @@ async def remove_all_tier_roles(member: discord.Member) -> bool:
 
 
 async def initial_tier_role_update(bot):
-    """봇 시작 시 모든 사용자의 티어 역할을 즉시 업데이트"""
+    """봇 시작 시 모든 사용자의 티어 역할을 즉시 업데이트 (역할별 멤버 집합 비교 후 바뀐 멤버만 요청)"""
+    from tier_reconciler import reconcile_tier_roles
     print("[RoleManager] Starting initial tier role update...")
-    
-    # 모든 사용자 조회
-    users = await get_all_users_for_nickname_refresh()
-    
-    updated_count = 0
-    failed_count = 0
-    
-    for user_data in users:
-        user_id = user_data['user_id']
-        guild_id = user_data['guild_id']
-        level = user_data['level']
-        
-        # 서버 조회
-        guild = bot.get_guild(guild_id)
-        if guild is None:
-            continue
-        
-        # 멤버 조회
-        member = guild.get_member(user_id)
-        if member is None:
-            continue
-        
-        # 티어 역할 업데이트 (축하 메시지는 보내지 않음 - 초기화이므로)
-        success, old_tier, new_tier = await update_tier_role(member, level)
-        if success:
-            updated_count += 1
-        else:
-            failed_count += 1
-        
-        # API 레이트 리밋 방지를 위해 약간의 딜레이
-        await asyncio.sleep(0.1)
-    
-    print(f"[RoleManager] Initial tier role update completed: {updated_count} updated, {failed_count} failed")
-
+    started = time.monotonic()
+    stats = await reconcile_tier_roles(bot)
+    print(f"[RoleManager] Initial tier role update completed in {time.monotonic() - started:.1f}s: "
+          f"{stats['checked']} checked, {stats['updated']} updated, {stats['failed']} failed")
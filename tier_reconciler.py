@@ -0,0 +1,183 @@
+# tier_reconciler.py - 서버 단위 티어 역할 일괄 동기화 (역할별 멤버 집합 비교)
+
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import discord
+from config import TIER_SYNC_RATE, TIER_SYNC_BURST
+from database import get_all_users_for_nickname_refresh
+from role_manager import get_guild_tier_roles, get_role_by_name, get_tier_table
+
+# 작업 우선순위 (작을수록 먼저)
+PRIORITY_IN_VOICE = 0   # 음성채널에 있는 멤버 (지금 보이는 사용자)
+PRIORITY_ADD = 1        # 받아야 할 티어 역할이 없는 멤버
+PRIORITY_REMOVE = 2     # 남은 티어 역할만 제거하면 되는 멤버
+
+
+class TokenBucket:
+    """초당 rate개, 최대 burst개까지 몰아서 허용하는 요청 속도 제한"""
+
+    def __init__(self, rate: float = TIER_SYNC_RATE, burst: int = TIER_SYNC_BURST):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TierRoleOp:
+    """한 멤버에게 필요한 역할 변경 (추가·제거를 한 번의 member.edit으로 반영)"""
+    __slots__ = ('member', 'add', 'remove', 'new_tier')
+
+    def __init__(self, member: discord.Member, add: List[discord.Role], remove: List[discord.Role],
+                 new_tier: Optional[str]):
+        self.member = member
+        self.add = add
+        self.remove = remove
+        self.new_tier = new_tier
+
+    @property
+    def priority(self) -> int:
+        if self.member.voice is not None and self.member.voice.channel is not None:
+            return PRIORITY_IN_VOICE
+        return PRIORITY_ADD if self.add else PRIORITY_REMOVE
+
+
+def plan_guild_tier_ops(guild: discord.Guild, levels: Dict[int, int]) -> List[TierRoleOp]:
+    """
+    DB 레벨로 티어 역할별 목표 멤버 집합을 만들고 role.members와 집합 차이로 비교
+    levels: {user_id: level} - DB에 있는 사용자만 대상 (없는 멤버의 역할은 건드리지 않음)
+    Returns: 역할 변경이 필요한 멤버별 작업 목록 (API 호출 없음)
+    """
+    table = get_tier_table()
+    tier_roles = get_guild_tier_roles(guild)
+    if not tier_roles:
+        return []
+
+    # 목표: {role_id: {user_id}}
+    targets: Dict[int, set] = {role.id: set() for role in tier_roles}
+    target_tier: Dict[int, str] = {}
+    # 목표 티어 역할이 서버에 없는 사용자는 기존 역할도 그대로 둠 (update_tier_role과 동일)
+    unresolved = set()
+    for user_id, level in levels.items():
+        tier_info = table.tier_for_level(level)
+        if tier_info is None:
+            continue
+        role = get_role_by_name(guild, tier_info[1])
+        if role is not None and role.id in targets:
+            targets[role.id].add(user_id)
+            target_tier[user_id] = tier_info[0]
+        else:
+            unresolved.add(user_id)
+
+    adds: Dict[int, List[discord.Role]] = {}
+    removes: Dict[int, List[discord.Role]] = {}
+    for role in tier_roles:
+        current = {member.id for member in role.members}
+        target = targets[role.id]
+        for user_id in target - current:
+            adds.setdefault(user_id, []).append(role)
+        for user_id in current - target:
+            if user_id in levels and user_id not in unresolved:
+                removes.setdefault(user_id, []).append(role)
+
+    ops = []
+    for user_id in adds.keys() | removes.keys():
+        member = guild.get_member(user_id)
+        if member is None or member.bot:
+            continue
+        ops.append(TierRoleOp(member, adds.get(user_id, []), removes.get(user_id, []), target_tier.get(user_id)))
+    return ops
+
+
+async def _apply_op(op: TierRoleOp, limiter: TokenBucket, stats: dict):
+    member = op.member
+    await limiter.acquire()
+    # 대기 중 바뀌었을 수 있으므로 적용 직전 역할 목록으로 계산
+    remove_ids = {role.id for role in op.remove}
+    new_roles = [role for role in member.roles if not role.is_default() and role.id not in remove_ids]
+    new_roles += [role for role in op.add if role not in new_roles]
+    try:
+        await member.edit(roles=new_roles, reason=f"티어 동기화 → {op.new_tier or '없음'}")
+    except discord.Forbidden:
+        print(f"[TierReconciler] No permission to update roles for {member.name}")
+        stats['failed'] += 1
+        return
+    except discord.HTTPException as e:
+        print(f"[TierReconciler] Failed to update roles for {member.name}: {e}")
+        stats['failed'] += 1
+        return
+    stats['updated'] += 1
+    stats['added'] += len(op.add)
+    stats['removed'] += len(op.remove)
+    if op.add and op.new_tier:
+        stats['tier_changes'][op.new_tier] = stats['tier_changes'].get(op.new_tier, 0) + 1
+
+
+async def apply_tier_ops(guild: discord.Guild, ops: List[TierRoleOp], limiter: TokenBucket,
+                         stats: dict, progress: Optional[Callable[[dict], Awaitable[None]]] = None):
+    """우선순위 순으로 속도 제한을 지키며 역할 변경 적용 (멤버당 요청 1회)"""
+    me = guild.me
+    if not me.guild_permissions.manage_roles:
+        print(f"[TierReconciler] No permission to manage roles in {guild.name}")
+        stats['failed'] += len(ops)
+        return
+
+    heap = [(op.priority, seq, op) for seq, op in enumerate(ops)]
+    heapq.heapify(heap)
+    while heap:
+        _, _, op = heapq.heappop(heap)
+        member = op.member
+        if any(role >= me.top_role for role in op.add + op.remove):
+            print(f"[TierReconciler] Tier role is higher than bot role, cannot update {member.name}")
+            stats['failed'] += 1
+        else:
+            await _apply_op(op, limiter, stats)
+        stats['done'] += 1
+        if progress is not None:
+            await progress(stats)
+
+
+async def reconcile_tier_roles(bot, guild_ids: Optional[List[int]] = None,
+                               progress: Optional[Callable[[dict], Awaitable[None]]] = None) -> dict:
+    """
+    모든(또는 지정한) 서버의 티어 역할을 DB 레벨에 맞춤
+    메모리에서 집합 비교로 바뀌어야 할 멤버만 골라 API 요청은 변경된 멤버 수만큼만 보냄
+    progress: 작업 하나가 끝날 때마다 통계 dict로 호출되는 코루틴 함수
+    Returns: {'checked', 'planned', 'done', 'updated', 'added', 'removed', 'failed', 'tier_changes': {티어: 명}}
+    """
+    users = await get_all_users_for_nickname_refresh()
+    levels_by_guild: Dict[int, Dict[int, int]] = {}
+    for user_data in users:
+        levels_by_guild.setdefault(user_data['guild_id'], {})[user_data['user_id']] = user_data['level']
+
+    stats = {'checked': 0, 'planned': 0, 'done': 0, 'updated': 0, 'added': 0, 'removed': 0,
+             'failed': 0, 'tier_changes': {}}
+    plans = []
+    for guild_id, levels in levels_by_guild.items():
+        if guild_ids is not None and guild_id not in guild_ids:
+            continue
+        guild = bot.get_guild(guild_id)
+        if guild is None:
+            continue
+        stats['checked'] += sum(1 for user_id in levels if guild.get_member(user_id) is not None)
+        ops = plan_guild_tier_ops(guild, levels)
+        stats['planned'] += len(ops)
+        plans.append((guild, ops))
+
+    limiter = TokenBucket()
+    for guild, ops in plans:
+        if ops:
+            await apply_tier_ops(guild, ops, limiter, stats, progress)
+    return stats
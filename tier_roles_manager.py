@@ -4,7 +4,10 @@ import os
 from typing import Dict, Tuple, Optional
 from pathlib import Path
 
+from config_registry import registry
+
 TIER_ROLES_FILE = "tier_roles.txt"
+_REGISTRY_KEY = "tier_roles"
 
 
 def ensure_file():
@@ -27,11 +30,8 @@ def ensure_file():
             print(f"[TierRolesManager] 파일 초기화 오류: {e}")
 
 
-def load_tier_roles() -> Dict[str, Tuple[int, str]]:
-    """
-    tier_roles.txt 파일에서 설정 로드
-    Returns: {티어_이름: (도달_레벨, 역할_이름)}
-    """
+def _read_tier_roles() -> Dict[str, Tuple[int, str]]:
+    """tier_roles.txt 파싱 (config_registry에서 파일이 바뀌었을 때만 호출)"""
     ensure_file()
     
     result = {}
@@ -68,6 +68,22 @@ def load_tier_roles() -> Dict[str, Tuple[int, str]]:
     return result
 
 
+registry.register(_REGISTRY_KEY, TIER_ROLES_FILE, _read_tier_roles)
+
+
+def load_tier_roles() -> Dict[str, Tuple[int, str]]:
+    """
+    tier_roles.txt 설정 조회 (메모리 캐시, 파일 변경 시 자동 재로드)
+    Returns: {티어_이름: (도달_레벨, 역할_이름)}
+    """
+    return registry.get(_REGISTRY_KEY)
+
+
+def tier_roles_version() -> int:
+    """티어 역할 설정 버전 (파일이 다시 로드될 때마다 증가)"""
+    return registry.version(_REGISTRY_KEY)
+
+
 def save_tier_roles(tier_roles: Dict[str, Tuple[int, str]]):
     """
     tier_roles.txt 파일에 설정 저장
@@ -86,6 +102,8 @@ def save_tier_roles(tier_roles: Dict[str, Tuple[int, str]]):
     except Exception as e:
         print(f"[TierRolesManager] 파일 쓰기 오류: {e}")
         raise
+    finally:
+        registry.invalidate(_REGISTRY_KEY)
 
 
 def add_tier_role(tier_name: str, required_level: int, role_name: str) -> bool:
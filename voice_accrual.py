@@ -0,0 +1,38 @@
+# voice_accrual.py - 음성 세션 EXP 계산 (경과 시간 기반)
+
+from datetime import datetime, timedelta
+
+_ONE_US = timedelta(microseconds=1)
+
+
+def count_award_ticks(join_time: datetime, since: datetime, now: datetime, exp_interval: int,
+                      start_hour: int = 6, end_hour: int = 24) -> int:
+    """
+    join_time + k*exp_interval(분) (k >= 1) 지급 시점 중 (since, now]에 있고
+    시각이 [start_hour, end_hour) 안인 시점의 개수
+    !jk디버그 참여의 분 단위 while 루프와 같은 결과를 날짜별 구간 교차로 O(일 수)에 계산
+    """
+    if exp_interval <= 0 or start_hour >= end_hour:
+        return 0
+    since = max(since, join_time)
+    if now <= since:
+        return 0
+
+    interval = timedelta(minutes=exp_interval)
+    count = 0
+    day = datetime.combine(since.date(), datetime.min.time())
+    last_day = datetime.combine(now.date(), datetime.min.time())
+    while day <= last_day:
+        # 지급 시간 [start, end) 를 (lo, hi] 형태로 바꿔 since/now와 교차
+        lo = max(since, day + timedelta(hours=start_hour) - _ONE_US)
+        hi = min(now, day + timedelta(hours=end_hour) - _ONE_US)
+        if hi > lo:
+            count += (hi - join_time) // interval - (lo - join_time) // interval
+        day += timedelta(days=1)
+    return count
+
+
+def compute_accrued_exp(join_time: datetime, since: datetime, now: datetime, exp_interval: int,
+                        exp_amount: int, start_hour: int = 6, end_hour: int = 24) -> int:
+    """(since, now] 사이에 지급됐어야 할 EXP (지급 주기 위상은 join_time 기준)"""
+    return count_award_ticks(join_time, since, now, exp_interval, start_hour, end_hour) * exp_amount
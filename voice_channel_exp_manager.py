@@ -4,7 +4,10 @@ import os
 from typing import Dict, Tuple, Optional
 from pathlib import Path
 
+from config_registry import registry
+
 VOICE_CHANNEL_EXP_FILE = "voice_channel_exp.txt"
+_REGISTRY_KEY = "voice_channel_exp"
 
 # 기본 EXP 지급 시간: 06:00 ~ 23:59 (start_hour=6, end_hour=24는 24 미만이므로 23:59까지)
 DEFAULT_START_HOUR = 6
@@ -26,12 +29,8 @@ def ensure_file():
         Path(VOICE_CHANNEL_EXP_FILE).touch()
 
 
-def load_voice_channel_exp() -> Dict[int, Tuple[int, int, int, int]]:
-    """
-    voice_channel_exp.txt 파일에서 설정 로드
-    Returns: {channel_id: (지급_주기_분, 지급_경험치, 시작_시, 종료_시)}
-    종료_시는 미포함(24면 23:59까지)
-    """
+def _read_voice_channel_exp() -> Dict[int, Tuple[int, int, int, int]]:
+    """voice_channel_exp.txt 파싱 (config_registry에서 파일이 바뀌었을 때만 호출)"""
     ensure_file()
     result = {}
     if not os.path.exists(VOICE_CHANNEL_EXP_FILE):
@@ -59,6 +58,18 @@ def load_voice_channel_exp() -> Dict[int, Tuple[int, int, int, int]]:
     return result
 
 
+registry.register(_REGISTRY_KEY, VOICE_CHANNEL_EXP_FILE, _read_voice_channel_exp)
+
+
+def load_voice_channel_exp() -> Dict[int, Tuple[int, int, int, int]]:
+    """
+    voice_channel_exp.txt 설정 조회 (메모리 캐시, 파일 변경 시 자동 재로드)
+    Returns: {channel_id: (지급_주기_분, 지급_경험치, 시작_시, 종료_시)}
+    종료_시는 미포함(24면 23:59까지)
+    """
+    return registry.get(_REGISTRY_KEY)
+
+
 def save_voice_channel_exp(exp_settings: Dict[int, Tuple[int, int, int, int]]):
     """
     voice_channel_exp.txt 파일에 설정 저장
@@ -74,6 +85,8 @@ def save_voice_channel_exp(exp_settings: Dict[int, Tuple[int, int, int, int]]):
     except Exception as e:
         print(f"[VoiceChannelExpManager] 파일 쓰기 오류: {e}")
         raise
+    finally:
+        registry.invalidate(_REGISTRY_KEY)
 
 
 def add_voice_channel_exp(
@@ -127,6 +140,5 @@ def get_voice_channel_exp(channel_id: int) -> Optional[Tuple[int, int, int, int]
     특정 채널의 EXP 설정 조회
     Returns: (지급_주기_분, 지급_경험치, 시작_시, 종료_시) 또는 None
     """
-    settings = load_voice_channel_exp()
-    val = settings.get(channel_id)
+    val = registry.peek(_REGISTRY_KEY).get(channel_id)
     return _normalize_settings(val) if val else None
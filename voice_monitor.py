@@ -1,31 +1,73 @@
 # voice_monitor.py - 음성채널 모니터링 및 exp 획득
 
 import asyncio
+import time
 from datetime import datetime, timedelta
 from typing import Dict
 import discord
 
-from config import VOICE_CHANNEL_EXP
-from voice_channel_exp_manager import load_voice_channel_exp
+from config import VOICE_CHANNEL_EXP, VOICE_EXP_ACCRUAL_MODE, VOICE_SESSION_CHECKPOINT_INTERVAL
+from voice_channel_exp_manager import get_voice_channel_exp
 from database import (
     create_voice_session, end_voice_session,
-    update_last_voice_join
+    update_last_voice_join, checkpoint_voice_sessions,
+    get_open_voice_sessions, close_dangling_voice_sessions
 )
-from level_system import add_exp
-from exp_ignore_manager import is_ignored as exp_is_ignored
+from exp_accumulator import ExpAccumulator
+from level_system import set_level_query_hook
+from voice_accrual import compute_accrued_exp
+from voice_scheduler import VoiceExpScheduler
+from exp_ignore_manager import is_ignored as exp_is_ignored, set_toggle_hook as set_exp_ignore_toggle_hook
 from nickname_manager import sync_level_display
 from role_manager import get_tier_for_level
 from logger import send_levelup_log, send_tier_upgrade_log
 from warning_system import check_warning_restrictions
 from utils import has_jk_role
 
+# setup_voice_monitor가 만든 모니터 (하나만 유지)
+_voice_monitor = None
+
 
 class VoiceMonitor:
     def __init__(self, bot):
         self.bot = bot
-        self.active_sessions: Dict[int, Dict] = {}  # {user_id: {guild_id, channel_id, session_id, join_time, task}}
-        self.exp_tasks: Dict[int, asyncio.Task] = {}  # {user_id: task}
+        self.active_sessions: Dict[int, Dict] = {}  # {user_id: {guild_id, channel_id, session_id, join_time, member, exp_*}}
         self.processing_users: set = set()  # 처리 중인 사용자 (재귀 호출 방지)
+        # 음성 EXP는 버퍼에 모았다가 주기적으로 한 트랜잭션으로 반영
+        self.exp_accumulator = ExpAccumulator(on_level_up=self._on_level_up)
+        # 사용자별 작업 대신 하나의 스케줄러가 모든 세션의 지급 시점 관리
+        self.exp_scheduler = VoiceExpScheduler(on_due=self._award_due_exp)
+        # lazy 모드면 지급 주기마다 깨어나지 않고 경과 시간으로 한 번에 계산
+        self.lazy_accrual = VOICE_EXP_ACCRUAL_MODE == "lazy"
+        self._checkpoint_task = None
+    
+    def start(self):
+        """백그라운드 작업 시작 (지급 스케줄러, 세션 체크포인트, EXP 버퍼 flush)"""
+        if not self.lazy_accrual:
+            self.exp_scheduler.start()
+        if self._checkpoint_task is None or self._checkpoint_task.done():
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+        self.exp_accumulator.start()
+        set_level_query_hook(self.checkpoint_user)
+        set_exp_ignore_toggle_hook(self._settle_before_ignore_toggle)
+    
+    async def shutdown(self):
+        """종료 시 호출: 스케줄러 중지, 세션 체크포인트 후 버퍼에 남은 EXP 강제 반영 (세션은 재시작 시 이어감)"""
+        set_level_query_hook(None)
+        set_exp_ignore_toggle_hook(None)
+        await self.exp_scheduler.close()
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+        try:
+            await self.checkpoint_sessions()
+        except Exception as e:
+            print(f"[VoiceMonitor] 종료 전 세션 체크포인트 실패: {e}")
+        await self.exp_accumulator.close()
     
     async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
         """음성채널 상태 변경 감지"""
@@ -53,9 +95,9 @@ class VoiceMonitor:
     
     def _get_channel_exp_settings(self, channel_id: int) -> tuple:
         """채널의 EXP 설정 반환 (지급_주기_분, 지급_경험치, 시작_시, 종료_시)"""
-        file_settings = load_voice_channel_exp()
-        if channel_id in file_settings:
-            return file_settings[channel_id]
+        file_settings = get_voice_channel_exp(channel_id)
+        if file_settings is not None:
+            return file_settings
         if channel_id in VOICE_CHANNEL_EXP:
             v = VOICE_CHANNEL_EXP[channel_id]
             return (v[0], v[1], v[2] if len(v) > 2 else 6, v[3] if len(v) > 3 else 24)
@@ -137,10 +179,12 @@ class VoiceMonitor:
                 'exp_amount': exp_settings[1],
                 'exp_start_hour': exp_settings[2],
                 'exp_end_hour': exp_settings[3],
+                'accrued_until': None,  # lazy 모드 마지막 정산 시각 (None이면 입장 시각)
+                'exp_earned': 0,  # 이번 세션에서 지급된 EXP
             }
             
-            task = asyncio.create_task(self._accumulate_exp(user_id, guild_id, member))
-            self.exp_tasks[user_id] = task
+            if not self.lazy_accrual:
+                self.exp_scheduler.schedule(user_id, exp_settings[0] * 60)
             
             if not silent:
                 print(f"[VoiceMonitor] {member.name} joined voice channel {channel.name} in {member.guild.name} (EXP 설정: {exp_settings[0]}분마다 {exp_settings[1]} exp, {exp_settings[2]:02d}:00~{exp_settings[3]:02d}:00)")
@@ -159,19 +203,13 @@ class VoiceMonitor:
         session_info = self.active_sessions[user_id]
         session_id = session_info['session_id']
         
-        # exp 누적 작업 중지 (취소 후 완료 대기)
-        if user_id in self.exp_tasks:
-            task = self.exp_tasks[user_id]
-            task.cancel()
-            # 작업이 완전히 취소될 때까지 대기 (중복 EXP 지급 방지)
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
-            del self.exp_tasks[user_id]
+        # exp 지급 예약 해제 (lazy 모드는 퇴장 시점까지 정산)
+        self.exp_scheduler.unschedule(user_id)
+        if self.lazy_accrual:
+            self._settle_session(user_id)
         
-        # 세션 종료 (보정 지급 없음 - 지급 주기를 채우지 않고 퇴장하면 0exp)
-        exp_earned = 0
+        # 세션 종료 (보정 지급 없음 - 지급 주기를 채우지 않은 마지막 구간은 0exp)
+        exp_earned = session_info['exp_earned']
         
         # 세션 종료 기록
         await end_voice_session(session_id, exp_earned)
@@ -184,91 +222,183 @@ class VoiceMonitor:
         
         print(f"[VoiceMonitor] {member.name} left voice channel {channel.name} in {member.guild.name} (earned {exp_earned} exp)")
     
-    async def _accumulate_exp(self, user_id: int, guild_id: int, member: discord.Member):
-        """음성채널에 있는 동안 exp 누적 (06:00 ~ 23:59 사이만 지급)"""
-        try:
-            # 세션 정보에서 EXP 설정 가져오기
-            if user_id not in self.active_sessions:
-                return
+    def _award_due_exp(self, user_ids: list):
+        """지급 시점이 된 사용자들 일괄 처리 (스케줄러에서 호출, 06:00 ~ 23:59 등 채널별 시간에만 지급)"""
+        current_hour = datetime.now().hour
+        for user_id in user_ids:
+            session_info = self.active_sessions.get(user_id)
+            if session_info is None:
+                self.exp_scheduler.unschedule(user_id)
+                continue
+            member = session_info['member']
+            # 채널을 벗어났으면 지급 중지
+            if member.voice is None or member.voice.channel is None or member.voice.channel.id != session_info['channel_id']:
+                self.exp_scheduler.unschedule(user_id)
+                continue
             
-            session_info = self.active_sessions[user_id]
-            exp_interval = session_info.get('exp_interval', 1)
-            exp_amount = session_info.get('exp_amount', 1)
-            start_hour = session_info.get('exp_start_hour', 6)
-            end_hour = session_info.get('exp_end_hour', 24)
+            # 채널별 지급 시간: start_hour <= current_hour < end_hour
+            if not (session_info.get('exp_start_hour', 6) <= current_hour < session_info.get('exp_end_hour', 24)):
+                continue
             
-            check_interval = exp_interval * 60
+            guild_id = session_info['guild_id']
+            # EXP 지급 제외 사용자는 스킵
+            if exp_is_ignored(guild_id, user_id):
+                continue
             
-            while True:
-                await asyncio.sleep(check_interval)
-                
-                if user_id not in self.active_sessions:
-                    break
-                if member.voice is None or member.voice.channel is None:
-                    break
-                current_channel_id = member.voice.channel.id
-                if current_channel_id != session_info['channel_id']:
-                    break
-                
-                # 채널별 지급 시간: start_hour <= current_hour < end_hour
-                current_time = datetime.now()
-                current_hour = current_time.hour
-                if not (start_hour <= current_hour < end_hour):
-                    continue
-                
-                # EXP 지급 제외 사용자는 스킵
-                if exp_is_ignored(guild_id, user_id):
-                    continue
-                
-                # exp 추가 (트랜잭션 모드)
-                result = await add_exp(user_id, guild_id, exp_amount, use_transaction=True)
-                db = result.get('db')
-                
-                # exp는 항상 먼저 커밋 (Discord API 실패해도 지급분은 유지)
-                if db:
-                    await db.commit()
-                    await db.close()
-                
-                # 레벨업 시 로그만 전송. 닉네임/역할은 음성 입장·채팅 등 상호작용 시 sync_level_display로 반영
-                if result['leveled_up']:
-                    try:
-                        old_t = get_tier_for_level(result['old_level'])
-                        new_t = get_tier_for_level(result['new_level'])
-                        old_tier = old_t[0] if old_t else None
-                        new_tier = new_t[0] if new_t else None
-                        if old_tier != new_tier:
-                            await send_tier_upgrade_log(self.bot, member, old_tier or "", new_tier or "", result['new_level'])
-                        channel_name = "알 수 없음"
-                        if member.voice and member.voice.channel:
-                            channel_name = member.voice.channel.name
-                        await send_levelup_log(
-                            self.bot,
-                            member,
-                            result['old_level'],
-                            result['new_level'],
-                            result['points_earned'],
-                            result['new_points'],
-                            f"🎤 {channel_name}"
-                        )
-                        print(f"[VoiceMonitor] {member.name} leveled up to {result['new_level']}!")
-                        # 레벨업 시 별명·칭호 즉시 반영
-                        try:
-                            await sync_level_display(member)
-                        except Exception as sync_err:
-                            print(f"[VoiceMonitor] 레벨업 후 별명/칭호 갱신 실패: {member.name} - {sync_err}")
-                    except Exception as e:
-                        print(f"[VoiceMonitor] 레벨업 로그 전송 실패: {member.name} - {e}")
-                
-        except asyncio.CancelledError:
-            # 작업이 취소되었을 때 (퇴장 시)
-            pass
+            # exp 버퍼에 추가 (EXP_FLUSH_INTERVAL마다 일괄 커밋, 레벨업 처리는 커밋 후 _on_level_up)
+            exp_amount = session_info.get('exp_amount', 1)
+            self.exp_accumulator.add(guild_id, user_id, exp_amount, member)
+            session_info['exp_earned'] += exp_amount
+    
+    def _settle_session(self, user_id: int, now: datetime = None) -> int:
+        """
+        lazy 모드: 마지막 정산 이후 경과 시간만큼의 EXP를 버퍼에 추가
+        Returns: 이번에 정산된 EXP
+        """
+        session_info = self.active_sessions.get(user_id)
+        if session_info is None:
+            return 0
+        if now is None:
+            now = datetime.now()
+        join_time = session_info['join_time']
+        since = session_info['accrued_until'] or join_time
+        exp = compute_accrued_exp(
+            join_time, since, now,
+            session_info['exp_interval'],
+            session_info['exp_amount'],
+            session_info.get('exp_start_hour', 6),
+            session_info.get('exp_end_hour', 24),
+        )
+        session_info['accrued_until'] = now
+        if exp <= 0:
+            return 0
+        guild_id = session_info['guild_id']
+        # EXP 지급 제외 사용자는 정산 시각만 갱신
+        if exp_is_ignored(guild_id, user_id):
+            return 0
+        self.exp_accumulator.add(guild_id, user_id, exp, session_info['member'])
+        session_info['exp_earned'] += exp
+        return exp
+    
+    def _settle_before_ignore_toggle(self, guild_id: int, user_id: int):
+        """EXP 지급 제외 토글 직전 호출: lazy 모드면 바뀌기 전 상태로 지금까지 정산 (이후 구간만 새 상태 적용)"""
+        session_info = self.active_sessions.get(user_id)
+        if self.lazy_accrual and session_info is not None and session_info['guild_id'] == guild_id:
+            self._settle_session(user_id)
+    
+    def _settle_all(self):
+        """lazy 모드: 모든 활성 세션 정산"""
+        now = datetime.now()
+        for user_id in list(self.active_sessions.keys()):
+            self._settle_session(user_id, now)
+    
+    async def checkpoint_sessions(self):
+        """활성 세션 체크포인트: (lazy 모드 정산) → EXP 버퍼 반영 → 세션별 exp_earned를 DB에 일괄 저장"""
+        if self.lazy_accrual:
+            self._settle_all()
+        await self.exp_accumulator.flush()
+        await checkpoint_voice_sessions([
+            (session_info['session_id'], session_info['exp_earned'])
+            for session_info in self.active_sessions.values()
+        ])
+    
+    async def _checkpoint_loop(self):
+        """주기적 세션 체크포인트 (재시작 복구용, lazy 모드는 레벨업이 너무 늦지 않도록 정산 겸용)"""
+        while True:
+            await asyncio.sleep(VOICE_SESSION_CHECKPOINT_INTERVAL)
+            try:
+                await self.checkpoint_sessions()
+            except Exception as e:
+                print(f"[VoiceMonitor] 세션 체크포인트 오류: {e}")
+    
+    async def checkpoint_user(self, user_id: int, guild_id: int):
+        """레벨 조회 전 호출: 해당 사용자의 세션을 정산하고 버퍼에 남은 EXP를 DB에 반영"""
+        session_info = self.active_sessions.get(user_id)
+        if self.lazy_accrual and session_info is not None and session_info['guild_id'] == guild_id:
+            self._settle_session(user_id)
+        if self.exp_accumulator.pending_exp(guild_id, user_id) > 0:
+            await self.exp_accumulator.flush()
+    
+    async def _on_level_up(self, result: dict, member: discord.Member):
+        """EXP 버퍼 반영 후 레벨업한 사용자 처리 (로그 전송 + 별명·칭호 갱신)"""
+        if member is None:
+            return
+        try:
+            old_t = get_tier_for_level(result['old_level'])
+            new_t = get_tier_for_level(result['new_level'])
+            old_tier = old_t[0] if old_t else None
+            new_tier = new_t[0] if new_t else None
+            if old_tier != new_tier:
+                await send_tier_upgrade_log(self.bot, member, old_tier or "", new_tier or "", result['new_level'])
+            channel_name = "알 수 없음"
+            if member.voice and member.voice.channel:
+                channel_name = member.voice.channel.name
+            await send_levelup_log(
+                self.bot,
+                member,
+                result['old_level'],
+                result['new_level'],
+                result['points_earned'],
+                result['new_points'],
+                f"🎤 {channel_name}"
+            )
+            print(f"[VoiceMonitor] {member.name} leveled up to {result['new_level']}!")
+            # 레벨업 시 별명·칭호 즉시 반영
+            try:
+                await sync_level_display(member)
+            except Exception as sync_err:
+                print(f"[VoiceMonitor] 레벨업 후 별명/칭호 갱신 실패: {member.name} - {sync_err}")
         except Exception as e:
-            print(f"[VoiceMonitor] Error in exp accumulation for {member.name}: {e}")
+            print(f"[VoiceMonitor] 레벨업 로그 전송 실패: {member.name} - {e}")
+    
+    def _resume_session(self, member: discord.Member, channel: discord.VoiceChannel, row: dict, exp_settings: tuple, now: datetime):
+        """재시작 전 세션 이어가기 (DB 기록 재사용, 지급 주기 위상은 원래 입장 시각 기준 유지)"""
+        join_time = datetime.fromisoformat(row['join_time'])
+        self.active_sessions[member.id] = {
+            'guild_id': member.guild.id,
+            'channel_id': channel.id,
+            'session_id': row['session_id'],
+            'join_time': join_time,
+            'member': member,
+            'exp_interval': exp_settings[0],
+            'exp_amount': exp_settings[1],
+            'exp_start_hour': exp_settings[2],
+            'exp_end_hour': exp_settings[3],
+            'accrued_until': now,  # 봇이 꺼져 있던 시간은 지급하지 않음
+            'exp_earned': row['exp_earned'] or 0,
+        }
+        if not self.lazy_accrual:
+            # 진행 중이던 주기의 남은 시간만큼 뒤에 첫 지급
+            interval = timedelta(minutes=exp_settings[0])
+            next_award = join_time + ((now - join_time) // interval + 1) * interval
+            self.exp_scheduler.schedule(
+                member.id,
+                interval.total_seconds(),
+                time.monotonic() + (next_award - now).total_seconds()
+            )
     
     async def initialize_existing_voice_users(self):
-        """봇 시작 시 이미 음성채널에 있는 사용자들을 초기화"""
-        initialized_count = 0
-        initialized_users = []
+        """
+        봇 시작 시 이미 음성채널에 있는 사용자들을 초기화
+        같은 채널에 남아 있는 사용자는 미종료 세션을 이어가고, 나머지 미종료 세션은 한 번에 종료
+        """
+        open_sessions = {}
+        try:
+            for row in await get_open_voice_sessions():
+                key = (row['guild_id'], row['user_id'])
+                if key not in open_sessions or row['session_id'] > open_sessions[key]['session_id']:
+                    open_sessions[key] = row
+        except Exception as e:
+            print(f"[VoiceMonitor] 미종료 세션 조회 실패: {e}")
+        
+        now = datetime.now()
+        # 재연결로 다시 호출된 경우 이미 진행 중인 세션 행은 종료 처리하지 않음
+        resumed_ids = [
+            session['session_id'] for session in self.active_sessions.values()
+            if session.get('session_id') is not None
+        ]
+        resumed_users = []
+        to_join = []
         
         for guild in self.bot.guilds:
             # 서버의 모든 음성채널 확인
@@ -288,19 +418,41 @@ class VoiceMonitor:
                     if member.id in self.active_sessions:
                         continue
                     
-                    # 사용자 초기화
-                    try:
-                        await self._handle_voice_join(member, channel, guild.id, member.id, silent=True)
-                        initialized_count += 1
-                        initialized_users.append(member.name)
-                    except Exception as e:
-                        print(f"[VoiceMonitor] 초기화 실패: {member.name} - {e}")
+                    row = open_sessions.get((guild.id, member.id))
+                    if row is not None and row['channel_id'] == channel.id:
+                        try:
+                            self._resume_session(member, channel, row, exp_settings, now)
+                            resumed_ids.append(row['session_id'])
+                            resumed_users.append(member.name)
+                            continue
+                        except Exception as e:
+                            print(f"[VoiceMonitor] 세션 복구 실패: {member.name} - {e}")
+                    to_join.append((member, channel))
+        
+        # 이어가지 않는 미종료 세션은 UPDATE 한 번으로 종료 (새 세션 생성 전에 처리)
+        try:
+            closed_count = await close_dangling_voice_sessions(resumed_ids)
+            if closed_count:
+                print(f"[VoiceMonitor] 미종료 세션 {closed_count}개 종료 처리")
+        except Exception as e:
+            print(f"[VoiceMonitor] 미종료 세션 종료 실패: {e}")
+        
+        initialized_users = []
+        for member, channel in to_join:
+            # 사용자 초기화
+            try:
+                await self._handle_voice_join(member, channel, member.guild.id, member.id, silent=True)
+                initialized_users.append(member.name)
+            except Exception as e:
+                print(f"[VoiceMonitor] 초기화 실패: {member.name} - {e}")
         
         # 이미 이용중인 사용자 목록 출력
+        if resumed_users:
+            print(f"[VoiceMonitor] 세션 이어감: {', '.join(resumed_users)}")
         if initialized_users:
             print(f"[VoiceMonitor] 이미 이용중인 사용자 확인: {', '.join(initialized_users)}")
         
-        print(f"[VoiceMonitor] 초기화 완료. {initialized_count}명의 새로운 사용자 세션 시작.")
+        print(f"[VoiceMonitor] 초기화 완료. {len(resumed_users)}명 세션 복구, {len(initialized_users)}명의 새로운 사용자 세션 시작.")
     
     async def ensure_sessions_for_guild(self, guild: discord.Guild):
         """특정 길드의 EXP 채널에 있는 멤버가 누락됐을 때 세션 보정 (참여 현황 표시 전 호출)"""
@@ -323,12 +475,16 @@ class VoiceMonitor:
         return list(self.active_sessions.keys())
 
 
-def setup_voice_monitor(bot):
-    """음성 모니터 설정"""
-    monitor = VoiceMonitor(bot)
-    
-    @bot.event
-    async def on_voice_state_update(member, before, after):
-        await monitor.on_voice_state_update(member, before, after)
+def setup_voice_monitor(bot) -> VoiceMonitor:
+    """음성 모니터 설정 (재연결로 on_ready가 다시 호출되어도 프로세스당 하나만 생성)"""
+    global _voice_monitor
+    if _voice_monitor is None:
+        _voice_monitor = VoiceMonitor(bot)
+        monitor = _voice_monitor
+        
+        @bot.event
+        async def on_voice_state_update(member, before, after):
+            await monitor.on_voice_state_update(member, before, after)
     
-    return monitor
+    _voice_monitor.start()
+    return _voice_monitor
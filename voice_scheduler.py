@@ -0,0 +1,118 @@
+# voice_scheduler.py - 음성 EXP 지급 시점 스케줄러 (타이머 휠)
+
+import asyncio
+import heapq
+import math
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from config import VOICE_SCHEDULER_RESOLUTION
+
+
+class VoiceExpScheduler:
+    """
+    모든 음성 세션의 다음 지급 시점을 하나의 작업이 관리하는 해시 타이머 휠
+    - 지급 시점을 resolution(초) 단위 슬롯으로 묶어 같은 슬롯 사용자를 한 번에 on_due로 전달
+    - schedule/unschedule은 O(1) (슬롯 set 추가/삭제), 빈 슬롯은 힙에서 지연 삭제
+    - 다음 지급 시점은 (이전 지급 시점 + 주기)로 계산하므로 슬롯 지연이 누적되지 않음
+    """
+
+    def __init__(self, on_due: Callable[[List[int]], None], resolution: float = VOICE_SCHEDULER_RESOLUTION):
+        self.on_due = on_due
+        self.resolution = resolution
+        self._slots: Dict[int, Set[int]] = {}  # {슬롯 번호: {user_id}}
+        self._entries: Dict[int, list] = {}  # {user_id: [다음 지급 시각(monotonic), 주기(초), 슬롯 번호]}
+        self._ticks: List[int] = []  # 슬롯 번호 최소 힙 (중복/빈 슬롯 허용)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _tick_for(self, deadline: float) -> int:
+        return math.ceil(deadline / self.resolution)
+
+    def _insert(self, user_id: int, deadline: float, interval: float):
+        tick = self._tick_for(deadline)
+        self._entries[user_id] = [deadline, interval, tick]
+        slot = self._slots.get(tick)
+        if slot is None:
+            self._slots[tick] = slot = set()
+            earliest = self._ticks[0] if self._ticks else None
+            heapq.heappush(self._ticks, tick)
+            if earliest is None or tick < earliest:
+                self._wakeup.set()
+        slot.add(user_id)
+
+    def schedule(self, user_id: int, interval: float, first_deadline: Optional[float] = None):
+        """user_id를 interval(초)마다 지급 대상으로 등록 (기존 등록은 대체)"""
+        self.unschedule(user_id)
+        if first_deadline is None:
+            first_deadline = time.monotonic() + interval
+        self._insert(user_id, first_deadline, interval)
+
+    def unschedule(self, user_id: int):
+        """등록 해제 (없으면 무시)"""
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        slot = self._slots.get(entry[2])
+        if slot is not None:
+            slot.discard(user_id)
+            if not slot:
+                del self._slots[entry[2]]
+
+    def next_deadline(self, user_id: int) -> Optional[float]:
+        """다음 지급 시각 (time.monotonic 기준, 없으면 None)"""
+        entry = self._entries.get(user_id)
+        return entry[0] if entry else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def start(self):
+        """스케줄러 작업 시작"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """스케줄러 작업 중지"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            # 비어 버린 슬롯 번호는 여기서 버림
+            while self._ticks and self._ticks[0] not in self._slots:
+                heapq.heappop(self._ticks)
+            if not self._ticks:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._ticks[0] * self.resolution - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            tick = heapq.heappop(self._ticks)
+            due = self._slots.pop(tick, None)
+            if not due:
+                continue
+            now = time.monotonic()
+            for user_id in due:
+                deadline, interval, _ = self._entries[user_id]
+                deadline += interval
+                # 이벤트 루프가 오래 멈췄던 경우 놓친 주기는 건너뜀 (기존 sleep 루프와 동일)
+                while deadline <= now:
+                    deadline += interval
+                self._insert(user_id, deadline, interval)
+            try:
+                self.on_due(list(due))
+            except Exception as e:
+                print(f"[VoiceScheduler] 지급 처리 오류: {e}")
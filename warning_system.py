@@ -1,12 +1,69 @@
 # warning_system.py - 경고 시스템
 
+import asyncio
 import discord
+import heapq
 from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
 from database import (
     add_warning, get_active_warning_count, get_all_warnings,
-    remove_warnings
+    remove_warnings, get_active_warning_expiries,
+    get_next_warning_expiry, pop_expired_warnings
 )
 from level_system import add_points
+from logger import send_warning_expired_log
+
+# 활성 경고 캐시: {(guild_id, user_id): 만료 시각 최소 힙}
+# 경고가 없는 사용자는 키 자체가 없으므로 메시지마다 dict 조회 한 번으로 끝남
+_warning_cache: Dict[Tuple[int, int], List[datetime]] = {}
+_cache_loaded = False
+# 만료 서비스 (setup_warning_expiry에서 생성)
+_expiry_service = None
+
+
+async def load_warning_cache():
+    """시작 시 호출: 활성 경고 만료 시각을 한 번에 로드"""
+    global _cache_loaded
+    _warning_cache.clear()
+    for guild_id, user_id, expires_at in await get_active_warning_expiries():
+        _warning_cache.setdefault((guild_id, user_id), []).append(expires_at)
+    for heap in _warning_cache.values():
+        heapq.heapify(heap)
+    _cache_loaded = True
+    print(f"[WarningSystem] 활성 경고 {sum(len(h) for h in _warning_cache.values())}개 로드 ({len(_warning_cache)}명)")
+
+
+async def refresh_user_warnings(user_id: int, guild_id: int):
+    """한 사용자의 캐시를 DB 기준으로 다시 로드 (경고 해제·만료 처리 후)"""
+    expiries = [row[2] for row in await get_active_warning_expiries(user_id, guild_id)]
+    key = (guild_id, user_id)
+    if expiries:
+        heapq.heapify(expiries)
+        _warning_cache[key] = expiries
+    else:
+        _warning_cache.pop(key, None)
+
+
+def _cached_count(user_id: int, guild_id: int) -> int:
+    """캐시 기준 활성 경고 수 (만료된 항목은 조회 시점에 힙에서 제거)"""
+    key = (guild_id, user_id)
+    heap = _warning_cache.get(key)
+    if heap is None:
+        return 0
+    now = datetime.now()
+    while heap and heap[0] <= now:
+        heapq.heappop(heap)
+    if not heap:
+        del _warning_cache[key]
+        return 0
+    return len(heap)
+
+
+async def get_warning_count(user_id: int, guild_id: int) -> int:
+    """활성 경고 수 (캐시 로드 전이면 DB 조회)"""
+    if _cache_loaded:
+        return _cached_count(user_id, guild_id)
+    return await get_active_warning_count(user_id, guild_id)
 
 
 async def issue_warning(user_id: int, guild_id: int, reason: str, issued_by: int, warning_count: int = 1) -> dict:
@@ -19,11 +76,17 @@ async def issue_warning(user_id: int, guild_id: int, reason: str, issued_by: int
         'new_points': int  # 차감 후 포인트
     }
     """
-    # 경고 추가
-    await add_warning(user_id, guild_id, reason, issued_by, warning_count)
+    # 경고 추가 (캐시에도 바로 반영)
+    expires_at = await add_warning(user_id, guild_id, reason, issued_by, warning_count)
+    if _cache_loaded:
+        heap = _warning_cache.setdefault((guild_id, user_id), [])
+        for _ in range(warning_count):
+            heapq.heappush(heap, expires_at)
+    if _expiry_service is not None:
+        _expiry_service.wake()
     
     # 총 경고 수 조회
-    total_warnings = await get_active_warning_count(user_id, guild_id)
+    total_warnings = await get_warning_count(user_id, guild_id)
     
     # 포인트 차감 (경고 1개당 100포인트)
     points_deducted = warning_count * 100
@@ -51,7 +114,7 @@ async def remove_warning(user_id: int, guild_id: int, count: int) -> dict:
     }
     """
     # 현재 경고 수 확인
-    current_warnings = await get_active_warning_count(user_id, guild_id)
+    current_warnings = await get_warning_count(user_id, guild_id)
     
     # 해제할 수 있는 경고 수 제한
     actual_remove_count = min(count, current_warnings)
@@ -64,11 +127,13 @@ async def remove_warning(user_id: int, guild_id: int, count: int) -> dict:
             'new_points': 0
         }
     
-    # 경고 삭제
+    # 경고 삭제 후 해당 사용자 캐시 갱신
     removed = await remove_warnings(user_id, guild_id, actual_remove_count)
+    if _cache_loaded:
+        await refresh_user_warnings(user_id, guild_id)
     
     # 총 경고 수 조회
-    total_warnings = await get_active_warning_count(user_id, guild_id)
+    total_warnings = await get_warning_count(user_id, guild_id)
     
     # 포인트 복구 (경고 1개당 100포인트)
     points_restored = removed * 100
@@ -96,7 +161,7 @@ async def check_warning_restrictions(user_id: int, guild_id: int) -> dict:
         'warning_count': int  # 현재 경고 수
     }
     """
-    warning_count = await get_active_warning_count(user_id, guild_id)
+    warning_count = await get_warning_count(user_id, guild_id)
     
     return {
         'can_send_messages': warning_count < 3,
@@ -106,3 +171,86 @@ async def check_warning_restrictions(user_id: int, guild_id: int) -> dict:
         'warning_count': warning_count
     }
 
+
+class WarningExpiryService:
+    """
+    가장 이른 expires_at까지 잠들었다가 만료된 경고를 한 번에 삭제
+    삭제 후 사용자별 캐시 갱신, 'warning_expired' 이벤트 발생, 경고 로그 채널에 기록
+    이벤트: on_warning_expired(guild_id, user_id, expired_count, total_warnings)
+    """
+
+    # 시계 변경 등에 대비해 한 번에 자는 최대 시간 (초)
+    MAX_SLEEP = 6 * 3600
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        """새 경고가 추가됐을 때 호출 (다음 만료 시각 다시 계산)"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                next_expiry = await get_next_warning_expiry()
+            except Exception as e:
+                print(f"[WarningSystem] 다음 만료 시각 조회 실패: {e}")
+                next_expiry = None
+                delay = 60
+            else:
+                delay = None if next_expiry is None else (next_expiry - datetime.now()).total_seconds()
+
+            if delay is None:
+                await self._wakeup.wait()
+                continue
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, self.MAX_SLEEP))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.expire_due()
+            except Exception as e:
+                print(f"[WarningSystem] 경고 만료 처리 오류: {e}")
+                await asyncio.sleep(60)
+
+    async def expire_due(self) -> int:
+        """만료된 경고 일괄 삭제 및 후처리. Returns: 삭제된 경고 수"""
+        expired = await pop_expired_warnings()
+        if not expired:
+            return 0
+        per_user: Dict[Tuple[int, int], int] = {}
+        for key in expired:
+            per_user[key] = per_user.get(key, 0) + 1
+
+        # 행은 이미 삭제됐으므로 한 사용자 처리가 실패해도 나머지 사용자는 계속 처리
+        for (guild_id, user_id), expired_count in per_user.items():
+            try:
+                if _cache_loaded:
+                    await refresh_user_warnings(user_id, guild_id)
+                total_warnings = await get_warning_count(user_id, guild_id)
+                self.bot.dispatch('warning_expired', guild_id, user_id, expired_count, total_warnings)
+                await send_warning_expired_log(self.bot, self.bot.get_guild(guild_id), user_id, expired_count, total_warnings)
+            except Exception as e:
+                print(f"[WarningSystem] 경고 만료 후처리 실패: guild {guild_id}, user {user_id} - {e}")
+
+        print(f"[WarningSystem] 만료된 경고 {len(expired)}개 삭제 ({len(per_user)}명)")
+        return len(expired)
+
+
+def setup_warning_expiry(bot) -> WarningExpiryService:
+    """경고 만료 서비스 시작"""
+    global _expiry_service
+    if _expiry_service is None:
+        _expiry_service = WarningExpiryService(bot)
+    _expiry_service.start()
+    return _expiry_service